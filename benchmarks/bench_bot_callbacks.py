@@ -0,0 +1,167 @@
+"""
+Load test: latency of /alertas button taps under concurrent load and scraper writes.
+Run from the project root:
+    python benchmarks/bench_bot_callbacks.py [--users 500] [--rounds 10] [--writer-hold-ms 50] [--api-latency-ms 30]
+
+Hundreds of simultaneous sub:* taps and open_alertas reads are fed straight to
+the bot's handlers with stub Update objects (no network), while a background
+thread repeatedly holds SQLite's write lock the way a catalog sync does.
+Reports p50/p99 latency for the async handlers and for a baseline that calls
+Database synchronously on the event loop, and how long the scraper thread
+waited for the write lock meanwhile.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+sys.path.insert(0, "src")
+import bot
+from database import TelegramUser
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+API_LATENCY = 0.0
+
+
+def fake_update(telegram_id: int, data: str) -> SimpleNamespace:
+    async def _noop(*args, **kwargs) -> None:
+        # Stands in for the Bot API round trip of answer()/edit_message_*().
+        await asyncio.sleep(API_LATENCY)
+
+    query = SimpleNamespace(data=data, answer=_noop, edit_message_reply_markup=_noop, edit_message_text=_noop)
+    return SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=telegram_id))
+
+
+async def sync_subscription_callback(update, context) -> None:
+    """Baseline: the pre-async handler body, blocking the loop on every DB call."""
+    query = update.callback_query
+    _, filter_type, filter_value = query.data.split(":", 2)
+    bot.get_store().db.toggle_filter(update.effective_user.id, filter_type, filter_value)
+    await query.answer()
+    bot._build_alerts_keyboard(bot.get_store().db.get_user_filters(update.effective_user.id))
+    await query.edit_message_reply_markup()
+
+
+async def sync_open_alertas_callback(update, context) -> None:
+    query = update.callback_query
+    await query.answer()
+    bot._build_alerts_keyboard(bot.get_store().db.get_user_filters(update.effective_user.id))
+    await query.edit_message_text()
+
+
+def hold_write_lock(db_path: str, hold: float, stop: threading.Event, waits: list[float], held: threading.Event) -> None:
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        waits.append(time.perf_counter() - start)
+        held.set()
+        conn.execute("UPDATE fetch_state SET updated_at = CURRENT_TIMESTAMP")
+        time.sleep(hold)
+        conn.execute("COMMIT")
+        held.clear()
+        time.sleep(hold / 2)
+    conn.close()
+
+
+def align_to_scraper(held: threading.Event, offset: float) -> None:
+    """Return ``offset`` seconds after the scraper next takes the write lock."""
+    while held.is_set():
+        time.sleep(0.001)
+    held.wait()
+    time.sleep(offset)
+
+
+async def run_round(users: int, tap_handler, open_handler, rng: random.Random) -> tuple[list[float], list[float]]:
+    taps: list[float] = []
+    opens: list[float] = []
+    # Every update arrives at once, so latency is measured from the round start:
+    # time spent waiting behind other handlers counts, as it does for users.
+    start = time.perf_counter()
+
+    async def one(telegram_id: int) -> None:
+        if rng.random() < 0.8:
+            value = rng.choice(bot.GENRE_OPTIONS)
+            handler, update, sink = tap_handler, fake_update(telegram_id, f"sub:genre:{value}"), taps
+        else:
+            handler, update, sink = open_handler, fake_update(telegram_id, "open_alertas"), opens
+        await handler(update, None)
+        sink.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(telegram_id) for telegram_id in range(1, users + 1)))
+    return taps, opens
+
+
+def report(name: str, samples: list[float]) -> None:
+    if samples:
+        print(
+            f"  {name:<14} n={len(samples):<5} p50={percentile(samples, 50) * 1000:8.1f} ms "
+            f"p99={percentile(samples, 99) * 1000:8.1f} ms max={max(samples) * 1000:8.1f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--writer-hold-ms", type=float, default=50)
+    parser.add_argument("--api-latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    global API_LATENCY
+    API_LATENCY = args.api_latency_ms / 1000
+
+    for telegram_id in range(1, args.users + 1):
+        bot.get_store().db.upsert_user(TelegramUser(telegram_id, f"user{telegram_id}", None))
+
+    stop = threading.Event()
+    # The scraper's waits for the write lock: a handler that hogs the lock shows up here.
+    scraper_waits: list[float] = []
+    held = threading.Event()
+    writer = threading.Thread(
+        target=hold_write_lock,
+        args=(bot.get_store().db.db_path, args.writer_hold_ms / 1000, stop, scraper_waits, held),
+        daemon=True,
+    )
+    writer.start()
+
+    modes = [
+        ("async store", bot.subscription_callback, bot.open_alertas_callback),
+        ("sync baseline", sync_subscription_callback, sync_open_alertas_callback),
+    ]
+    try:
+        for name, tap_handler, open_handler in modes:
+            rng = random.Random(7)
+            # The same round starts within the scraper's hold/release cycle for every mode.
+            phase = random.Random(11)
+            taps: list[float] = []
+            opens: list[float] = []
+            scraper_waits.clear()
+            for _ in range(args.rounds):
+                align_to_scraper(held, phase.uniform(0, 1.5 * args.writer_hold_ms / 1000))
+                round_taps, round_opens = asyncio.run(run_round(args.users, tap_handler, open_handler, rng))
+                taps += round_taps
+                opens += round_opens
+            print(f"{name} ({args.users} simultaneous updates x {args.rounds} rounds):")
+            report("sub: taps", taps)
+            report("open_alertas", opens)
+            report("scraper lock", list(scraper_waits))
+    finally:
+        stop.set()
+        writer.join()
+
+
+if __name__ == "__main__":
+    main()
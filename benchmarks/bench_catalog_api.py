@@ -0,0 +1,156 @@
+"""
+Benchmark: catalog API from the in-memory snapshot vs a handler that queries SQLite per request.
+Run from the project root:
+    python benchmarks/bench_catalog_api.py [--movies 200] [--clients 4] [--requests 5000]
+
+``--clients`` processes each send ``--requests`` GETs over one keep-alive
+connection, cycling through /movies, /movies/recent and /movies/<id>.
+Measured for:
+
+  snapshot       CatalogAPI (pre-serialised bodies), full 200 responses
+  snapshot 304   the same with If-None-Match, as revalidating clients send
+  per-request    http.server handler running the catalog query and json.dumps on
+                 every request (a tenth of the requests; it is that much slower)
+
+A writer thread syncs a changed catalog and republishes it every second
+throughout, as the scraper would.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, "src")
+from catalog_api import CatalogAPI
+from database import Database, Movie
+
+
+def catalog(count: int, offset: int = 0) -> list[Movie]:
+    return [
+        Movie(
+            100_000 + i, f"PELÍCULA {i + offset}", "Drama", "VOSE",
+            f"https://example.com/posters/{i}.jpg", f"https://example.com/tickets/{i}", "illa",
+        )
+        for i in range(count)
+    ]
+
+
+def client(args: tuple[str, int, list[str], int, bool]) -> tuple[int, int]:
+    host, port, paths, requests, revalidate = args
+    conn = http.client.HTTPConnection(host, port)
+    etags: dict[str, str] = {}
+    ok = not_modified = 0
+    for i in range(requests):
+        path = paths[i % len(paths)]
+        headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            ok += 1
+            etag = response.getheader("ETag")
+            if etag:
+                etags[path] = etag
+        elif response.status == 304:
+            not_modified += 1
+    conn.close()
+    return ok, not_modified
+
+
+def load(host: str, port: int, paths: list[str], clients: int, requests: int, revalidate: bool = False):
+    with multiprocessing.Pool(clients) as pool:
+        start = time.perf_counter()
+        results = pool.map(client, [(host, port, paths, requests, revalidate)] * clients)
+        elapsed = time.perf_counter() - start
+    return elapsed, sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def start_per_request_server(db: Database):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            rows = [
+                {
+                    "id": m.id, "title": m.title, "genre": m.genre, "format": m.format,
+                    "poster_url": m.poster_url, "ticket_url": m.ticket_url, "source": m.source, "added_at": added,
+                }
+                for m, added in db.get_catalog()
+            ]
+            if self.path == "/movies":
+                payload = {"count": len(rows), "movies": rows}
+            elif self.path == "/movies/recent":
+                payload = {"count": min(len(rows), 20), "movies": rows[:20]}
+            else:
+                payload = next((r for r in rows if f"/movies/{r['id']}" == self.path), None)
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(200 if payload is not None else 404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per client")
+    args = parser.parse_args()
+
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    db.sync_catalog(catalog(args.movies))
+    paths = ["/movies", "/movies/recent"] + [f"/movies/{100_000 + i}" for i in range(0, args.movies, 7)]
+
+    api = CatalogAPI("127.0.0.1", 0)
+    api.refresh(db)
+    api.start()
+    size = len(api.snapshot.resources["/movies"].body)
+    print(f"{args.movies} movies (/movies is {size / 1024:.0f} KiB), {args.clients} clients x {args.requests} requests")
+
+    # The scraper keeps syncing while readers are served.
+    stop = threading.Event()
+
+    def scraper() -> None:
+        writer = Database(db.db_path)
+        cycle = 0
+        while not stop.is_set():
+            cycle += 1
+            writer.sync_catalog(catalog(args.movies, offset=cycle % 2))
+            api.refresh(writer)
+            stop.wait(1.0)
+
+    threading.Thread(target=scraper, daemon=True).start()
+
+    print(f"{'':<14} {'time s':>8} {'req/s':>9} {'200':>8} {'304':>8}")
+    runs = [
+        ("snapshot", api.port, False, args.requests),
+        ("snapshot 304", api.port, True, args.requests),
+        ("per-request", start_per_request_server(db).server_address[1], False, max(1, args.requests // 10)),
+    ]
+    for label, port, revalidate, requests in runs:
+        elapsed, ok, not_modified = load("127.0.0.1", port, paths, args.clients, requests, revalidate)
+        print(f"{label:<14} {elapsed:>8.2f} {(ok + not_modified) / elapsed:>9.0f} {ok:>8} {not_modified:>8}")
+    stop.set()
+    api.stop()
+
+
+if __name__ == "__main__":
+    main()
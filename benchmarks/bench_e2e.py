@@ -0,0 +1,196 @@
+"""
+End-to-end benchmark of one scrape cycle against synthetic data and a local Telegram stub.
+Run from the project root:
+    python benchmarks/bench_e2e.py [--movies 200] [--new-movies 10] [--users 10000]
+                                   [--latency-ms 50] [--rate-limit 30] [--global-rate 1000]
+                                   [--digest-share 0.5]
+                                   [--out benchmarks/results] [--compare previous.json]
+
+The catalog is first synced with ``--movies`` synthetic movies (untimed). The
+measured cycle then sees a page where ``--new-movies`` of them were replaced
+by new releases, and goes through the same stages as production:
+
+  parse     extract the billboard from the page and normalise it to movies
+  diff      sync_catalog, minus the time spent matching subscribers
+  match     subscriber matching for the new movies (inside sync_catalog)
+  dispatch  draining the outbox through Notifier/TelegramDispatcher to the stub
+
+With ``--digest-share``, that share of users is in per-cycle digest mode and
+gets one message for all of their matching new movies (see the stub's
+sendMessage/sendPhoto counts).
+
+Results are printed and saved as JSON (named after the current commit) so
+runs can be compared across commits with ``--compare``.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import populate, synthetic_movies, synthetic_page, template_movies
+from telegram_stub import TelegramStub
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args: argparse.Namespace) -> dict:
+    stub = TelegramStub(
+        latency_ms=args.latency_ms, rate_limit=args.rate_limit, retry_after=args.retry_after,
+        error_rate=args.error_rate,
+    ).start()
+    # Configure the app before importing it: these are read at import time.
+    os.environ["TELEGRAM_TOKEN"] = "123456:STUB"
+    os.environ["TELEGRAM_CHAT_ID"] = "-100123"
+    os.environ["TELEGRAM_API_BASE"] = stub.base_url
+    os.environ["TELEGRAM_GLOBAL_RATE"] = str(args.global_rate)
+    os.environ["TELEGRAM_PER_CHAT_INTERVAL"] = "0"
+    from database import Database
+    from extractor import extract_billboard
+    from notifier import Notifier
+    from outbox import OutboxWorker
+    from sources import CinemesIllaSource
+
+    with open(args.html, encoding="utf-8") as f:
+        template_html = f.read()
+    template = template_movies(template_html)
+    poster_base = f"{stub.base_url}/posters/"
+    before = synthetic_movies(args.movies, template, seed=args.seed)
+    released = synthetic_movies(args.new_movies, template, seed=args.seed + 1, first_id=900_000)
+    after = released + before[args.new_movies:]
+    page = synthetic_page(template_html, after, poster_base)
+
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    filter_rows = populate(db, args.users, seed=args.seed)
+    with db._get_connection() as conn:
+        conn.execute(
+            "UPDATE users SET digest_minutes = 0 WHERE telegram_id % 1000 < ?", (round(args.digest_share * 1000),),
+        )
+    source = CinemesIllaSource("bench", url="https://cinemesilla.invalid/")
+    notifier = Notifier(db)
+
+    db.sync_catalog(source.to_movies(extract_billboard(synthetic_page(template_html, before, poster_base))))
+    with db._get_connection() as conn:
+        conn.execute("DELETE FROM outbox")
+
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    movies = source.to_movies(extract_billboard(page))
+    timings["parse"] = time.perf_counter() - start
+
+    index = db.subscriptions
+    match_many = index.match_many
+    match_time = 0.0
+
+    def timed_match_many(*a, **kw):
+        nonlocal match_time
+        t = time.perf_counter()
+        try:
+            return match_many(*a, **kw)
+        finally:
+            match_time += time.perf_counter() - t
+
+    index.match_many = timed_match_many
+    start = time.perf_counter()
+    sync = db.sync_catalog(movies, channel_chat_id=notifier.chat_id)
+    sync_time = time.perf_counter() - start
+    del index.match_many
+    timings["diff"] = sync_time - match_time
+    timings["match"] = match_time
+
+    worker = OutboxWorker(db, notifier, batch_size=args.batch_size)
+    start = time.perf_counter()
+    while worker.drain_once():
+        pass
+    timings["dispatch"] = time.perf_counter() - start
+    stub.stop()
+
+    with db._get_connection() as conn:
+        statuses = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    delivered = statuses.get("sent", 0)
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "population": {"users": args.users, "filters": filter_rows},
+        "cycle": {
+            "new_movies": len(sync.new),
+            "retired": len(sync.retired),
+            "enqueued": sync.enqueued,
+            "delivered": delivered,
+            "pending": statuses.get("pending", 0),
+            "dead": statuses.get("dead", 0),
+        },
+        "timings_s": {**timings, "total": sum(timings.values())},
+        "messages_per_s": delivered / timings["dispatch"] if timings["dispatch"] else 0.0,
+        "stub": dict(stub.stats),
+    }
+
+
+def report(result: dict, previous: dict | None = None) -> None:
+    cycle = result["cycle"]
+    print(
+        f"commit {result['commit']}: {cycle['new_movies']} new movies, {cycle['enqueued']} notifications, "
+        f"{cycle['delivered']} delivered ({cycle['dead']} dead, {cycle['pending']} pending)"
+    )
+    for stage, seconds in result["timings_s"].items():
+        line = f"  {stage:<9} {seconds * 1000:10.1f} ms"
+        if previous is not None and stage in previous.get("timings_s", {}):
+            before = previous["timings_s"][stage]
+            change = (seconds - before) / before * 100 if before else 0.0
+            line += f"   (was {before * 1000:10.1f} ms, {change:+6.1f}%)"
+        print(line)
+    line = f"  {'msgs/s':<9} {result['messages_per_s']:10.1f}"
+    if previous is not None:
+        line += f"   (was {previous.get('messages_per_s', 0.0):10.1f})"
+    print(line)
+    print(f"  stub: {result['stub']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movies", type=int, default=200)
+    parser.add_argument("--new-movies", type=int, default=10)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--rate-limit", type=float, default=None, help="stub requests/s before 429s")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--global-rate", type=float, default=1000, help="dispatcher messages/s cap")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--digest-share", type=float, default=0.0, help="share of users in digest mode (0-1)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--html", default="debug.html")
+    parser.add_argument("--out", default="benchmarks/results", help="directory for the JSON result ('' to skip)")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    result = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    report(result, previous)
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        stamp = result["timestamp"].replace(":", "").replace("-", "")
+        path = os.path.join(args.out, f"e2e-{result['commit']}-{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
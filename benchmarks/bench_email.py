@@ -0,0 +1,81 @@
+"""
+Benchmark: email fan-out through EmailNotifier vs one SMTP session per recipient.
+Run from the project root:
+    python benchmarks/bench_email.py [--recipients 500] [--latency-ms 10] [--pool-size 4] [--batch-size 50]
+
+Sends one movie alert to ``--recipients`` addresses through the local SMTP
+stand-in (``benchmarks/smtp_stub.py``), which waits ``--latency-ms`` per round
+trip. Compared: a session per recipient (connect, EHLO, MAIL, RCPT, DATA,
+QUIT, as a plain ``smtplib.SMTP().sendmail()`` loop does), and the pooled
+sender with and without PIPELINING offered by the server. No rate limit is
+applied.
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+
+sys.path.insert(0, "src")
+from emailer import EmailNotifier, SMTPConfig, render_email
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from smtp_stub import SMTPStub
+
+SENDER = "alertas@example.com"
+MOVIE = ("GREENLAND 2", "Thriller", "CASTELLÀ", "https://example.com/poster.jpg", "https://example.com/tickets")
+
+
+def per_recipient(stub: SMTPStub, addresses: list[str]) -> int:
+    data = render_email(*MOVIE).as_bytes(SENDER)
+    delivered = 0
+    for address in addresses:
+        with smtplib.SMTP(*stub.address) as conn:
+            conn.sendmail(SENDER, [address], data)
+            delivered += 1
+    return delivered
+
+
+def pooled(stub: SMTPStub, addresses: list[str], pool_size: int, batch_size: int) -> int:
+    config = SMTPConfig(
+        host=stub.address[0], port=stub.address[1], sender=SENDER, security="none",
+        pool_size=pool_size, batch_size=batch_size, rate=0,
+    )
+    emailer = EmailNotifier(config)
+    try:
+        results = emailer.send_emails([(i, address) for i, address in enumerate(addresses)], *MOVIE)
+    finally:
+        emailer.close()
+    return sum(result.ok for result in results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recipients", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=10)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+    addresses = [f"user{i}@example.com" for i in range(args.recipients)]
+
+    runs = [
+        ("session per recipient", True, lambda stub: per_recipient(stub, addresses)),
+        ("pooled, no pipelining", False, lambda stub: pooled(stub, addresses, args.pool_size, args.batch_size)),
+        ("pooled + pipelining", True, lambda stub: pooled(stub, addresses, args.pool_size, args.batch_size)),
+    ]
+    print(f"{args.recipients} recipients, {args.latency_ms:.0f} ms per round trip")
+    print(f"{'':<24} {'time s':>8} {'msgs/s':>8} {'sessions':>9} {'round trips':>12} {'delivered':>10}")
+    for label, pipelining, run in runs:
+        stub = SMTPStub(latency_ms=args.latency_ms, pipelining=pipelining).start()
+        start = time.perf_counter()
+        delivered = run(stub)
+        elapsed = time.perf_counter() - start
+        stub.stop()
+        print(
+            f"{label:<24} {elapsed:>8.2f} {delivered / elapsed:>8.0f} {stub.stats['sessions']:>9} "
+            f"{stub.stats['round_trips']:>12} {delivered:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
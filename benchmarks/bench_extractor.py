@@ -0,0 +1,68 @@
+"""
+Micro-benchmark: targeted <cinemaindexpage> scan vs. full BeautifulSoup parse.
+Run from the project root:
+    python benchmarks/bench_extractor.py [--rounds N]
+"""
+import argparse
+import html
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, "src")
+from extractor import extract_billboard
+
+PAGE = Path(__file__).resolve().parent.parent / "debug.html"
+
+
+def soup_extract(text: str) -> tuple[str, list[dict]]:
+    """The original main.py extraction path."""
+    soup = BeautifulSoup(text, "html.parser")
+    vue_component = soup.find("cinemaindexpage")
+    base_poster_url = json.loads(html.unescape(vue_component.get(":postersurl", '""')))
+    movies_list = json.loads(html.unescape(vue_component.get(":onlytitlesinfo", "[]")))
+    return base_poster_url, movies_list
+
+
+def fast_extract(text: str) -> tuple[str, list[dict]]:
+    payload = extract_billboard(text)
+    return payload.poster_base_url, payload.movies
+
+
+def measure(name: str, func, text: str, rounds: int) -> float:
+    func(text)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(text)
+    per_call = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<14} {per_call * 1000:9.2f} ms/call   peak {peak / 1024:9.0f} KiB")
+    return per_call
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    text = PAGE.read_text(encoding="utf-8")
+    if soup_extract(text) != fast_extract(text):
+        raise SystemExit("Extractors disagree on debug.html")
+
+    print(f"{PAGE.name}: {len(text) / 1024:.0f} KiB, {args.rounds} rounds")
+    soup_time = measure("BeautifulSoup", soup_extract, text, args.rounds)
+    fast_time = measure("targeted scan", fast_extract, text, args.rounds)
+    print(f"speed-up: {soup_time / fast_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmark: matching new titles against every user's keyword watchlist.
+Run from the project root:
+    python benchmarks/bench_keywords.py [--users 1000 10000 100000] [--keywords 5] [--titles 20] [--sql-max 10000]
+
+Compared per cycle of ``--titles`` new movies:
+
+  automaton  SubscriptionIndex: one Aho-Corasick pass per title over all keywords
+  loop       a Python loop testing every distinct keyword against every title
+  SQL LIKE   one scan of the user's keyword rows per movie with LIKE (only up to --sql-max users)
+
+Also reported: loading the index, and the cost of one keyword edit (the
+relink on the next match) against rebuilding the automaton from scratch.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, "src")
+from database import Database, Movie
+from keyword_matcher import KeywordMatcher, normalize_keyword
+from subscription_index import KEYWORD_FILTER, SubscriptionIndex
+
+WORDS = [
+    "dune", "pixar", "star", "wars", "batman", "spider", "man", "toy", "story", "mision", "imposible",
+    "avatar", "frozen", "matrix", "alien", "jurassic", "world", "harry", "potter", "rocky", "shrek",
+    "minions", "gladiator", "joker", "barbie", "oppenheimer", "godzilla", "kong", "superman", "wicked",
+]
+
+
+def synthetic_keywords(users: int, per_user: int, seed: int = 42) -> list[tuple[int, str, str]]:
+    rng = random.Random(seed)
+    rows = set()
+    for telegram_id in range(1, users + 1):
+        for _ in range(rng.randint(1, per_user)):
+            # Mostly known franchises, plus a long tail of unique keywords.
+            if rng.random() < 0.7:
+                keyword = " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+            else:
+                keyword = f"{rng.choice(WORDS)} {rng.randrange(users * per_user)}"
+            rows.add((telegram_id, KEYWORD_FILTER, keyword))
+    return sorted(rows)
+
+
+def synthetic_titles(count: int, seed: int = 7) -> list[Movie]:
+    rng = random.Random(seed)
+    return [
+        Movie(500_000 + i, " ".join(rng.sample(WORDS, 3)).upper() + ": PARTE II", "Drama", "VOSE", None)
+        for i in range(count)
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def loop_match(rows: list[tuple[int, str, str]], movies: list[Movie]) -> int:
+    by_keyword: dict[str, set[int]] = {}
+    for telegram_id, _, keyword in rows:
+        by_keyword.setdefault(keyword, set()).add(telegram_id)
+    total = 0
+    for movie in movies:
+        title = f" {normalize_keyword(movie.title)} "
+        users: set[int] = set()
+        for keyword, subscribers in by_keyword.items():
+            if f" {keyword} " in title:
+                users |= subscribers
+        total += len(users)
+    return total
+
+
+def sql_match(rows: list[tuple[int, str, str]], users: int, movies: list[Movie]) -> tuple[float, int]:
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    with db._get_connection() as conn:
+        conn.executemany("INSERT INTO users (telegram_id, first_name) VALUES (?, 'bench')", [(i,) for i in range(1, users + 1)])
+        conn.executemany("INSERT INTO subscription_filters (telegram_id, filter_type, filter_value) VALUES (?, ?, ?)", rows)
+    start = time.perf_counter()
+    total = 0
+    with db._get_connection() as conn:
+        for movie in movies:
+            total += conn.execute("""
+                SELECT COUNT(DISTINCT telegram_id) FROM subscription_filters
+                WHERE filter_type = ? AND ? LIKE '% ' || filter_value || ' %'
+            """, (KEYWORD_FILTER, f" {normalize_keyword(movie.title)} ")).fetchone()[0]
+    elapsed = time.perf_counter() - start
+    db.pool.close_all()
+    return elapsed, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--keywords", type=int, default=5, help="max keywords per user")
+    parser.add_argument("--titles", type=int, default=20, help="new movies per cycle")
+    parser.add_argument("--sql-max", type=int, default=10_000)
+    args = parser.parse_args()
+    movies = synthetic_titles(args.titles)
+
+    print(f"{args.titles} new titles per cycle, up to {args.keywords} keywords per user")
+    print(
+        f"{'users':>8} {'keywords':>9} {'distinct':>9} {'load':>10} {'automaton':>10} {'loop':>10} "
+        f"{'SQL LIKE':>10} {'edit':>9} {'rebuild':>9} {'matches':>8}"
+    )
+    for users in args.users:
+        rows = synthetic_keywords(users, args.keywords)
+        distinct = {keyword for _, _, keyword in rows}
+
+        index = SubscriptionIndex()
+        load_time, _ = timed(index.load, rows)
+        index.match_many(movies[:1])  # first relink happens here
+        match_time, matches = timed(index.match_many, movies)
+        matched = sum(len(u) for u in matches.values())
+
+        loop_time, loop_matched = timed(loop_match, rows, movies)
+        if loop_matched != matched:
+            raise SystemExit(f"Automaton and loop disagree at {users} users: {matched} vs {loop_matched}")
+
+        sql = "-"
+        if users <= args.sql_max:
+            sql_time, sql_matched = sql_match(rows, users, movies)
+            if sql_matched != matched:
+                raise SystemExit(f"Automaton and SQL disagree at {users} users: {matched} vs {sql_matched}")
+            sql = f"{sql_time * 1000:.1f} ms"
+
+        # One user adds a new keyword: insert + relink on the next match, vs a fresh automaton.
+        start = time.perf_counter()
+        index.add(1, KEYWORD_FILTER, ["brand new keyword"])
+        index.match(movies[0])
+        edit_time = time.perf_counter() - start
+        rebuild_time, fresh = timed(KeywordMatcher, distinct | {"brand new keyword"})
+        rebuild_time += timed(fresh.find, movies[0].title)[0]
+
+        print(
+            f"{users:>8} {len(rows):>9} {len(distinct):>9} {load_time * 1000:>7.1f} ms "
+            f"{match_time * 1000:>7.2f} ms {loop_time * 1000:>7.1f} ms {sql:>10} "
+            f"{edit_time * 1000:>6.1f} ms {rebuild_time * 1000:>6.1f} ms {matched:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark: database growth and query time over simulated months, with and without retention.
+Run from the project root:
+    python benchmarks/bench_retention.py [--weeks 52] [--users 2000] [--churn 8] [--billboard 40]
+
+Every simulated week ``--churn`` movies leave the billboard and as many new
+ones arrive. All their DMs are delivered (marked sent in the outbox and
+notification_log) without any network. With retention, ``RetentionWorker``
+runs once a week on a virtual clock. Reported per quarter: database size,
+table sizes, the time of one catalog sync and of the legacy
+``get_matching_subscribers`` query.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, "src")
+import database
+from database import Database, Movie
+from retention import DAY, RetentionWorker
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic import FORMAT_OPTIONS, GENRE_OPTIONS, populate
+
+WEEK = 7 * DAY
+
+
+class VirtualClock:
+    def __init__(self) -> None:
+        self.now = time.time()
+
+    def time(self) -> float:
+        return self.now
+
+
+def movie(movie_id: int) -> Movie:
+    return Movie(
+        movie_id, f"Movie {movie_id}", GENRE_OPTIONS[movie_id % len(GENRE_OPTIONS)],
+        FORMAT_OPTIONS[movie_id % len(FORMAT_OPTIONS)], None, None, "bench",
+    )
+
+
+def simulate(weeks: int, users: int, churn: int, billboard: int, retention: bool) -> list[tuple]:
+    clock = VirtualClock()
+    # Retirement times come from database.time.time(); run them on the virtual clock.
+    database.time = types.SimpleNamespace(time=clock.time, perf_counter=time.perf_counter, monotonic=time.monotonic)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = Database(path)
+    populate(db, users)
+    worker = RetentionWorker(db, clock=clock.time)
+    conn = db._get_connection()
+
+    rows = []
+    next_id = 1
+    current = [movie(i) for i in range(next_id, next_id + billboard)]
+    next_id += billboard
+    for week in range(1, weeks + 1):
+        current = current[churn:] + [movie(i) for i in range(next_id, next_id + churn)]
+        next_id += churn
+        start = time.perf_counter()
+        db.sync_catalog(current, channel_chat_id="-100")
+        sync_time = time.perf_counter() - start
+        while items := db.lease_outbox(50_000, 60):
+            db.complete_outbox(items)
+            # Outbox rows are stamped by SQLite's clock; move this week's onto the virtual one.
+            with conn:
+                conn.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?", [(clock.now, i.id) for i in items])
+        if retention:
+            worker.run_once()
+        clock.now += WEEK
+
+        if week % 13 == 0 or week == weeks:
+            probe = current[-1]
+            start = time.perf_counter()
+            db.get_matching_subscribers(probe.id, probe.format, probe.genre)
+            query_time = time.perf_counter() - start
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            count = lambda table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            rows.append((
+                week, os.path.getsize(path) / 2 ** 20, count("movies"), count("notification_log"),
+                count("outbox"), sync_time * 1000, query_time * 1000,
+            ))
+    db.pool.close_all()
+    database.time = time
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--churn", type=int, default=8, help="movies replaced per week")
+    parser.add_argument("--billboard", type=int, default=40, help="movies showing at once")
+    args = parser.parse_args()
+
+    for retention in (False, True):
+        print(f"\n{'with' if retention else 'without'} retention")
+        print(f"{'week':>5} {'size MiB':>9} {'movies':>7} {'log rows':>9} {'outbox':>8} {'sync ms':>8} {'query ms':>9}")
+        for week, size, movies, log, outbox, sync_ms, query_ms in simulate(
+            args.weeks, args.users, args.churn, args.billboard, retention,
+        ):
+            print(f"{week:>5} {size:>9.1f} {movies:>7} {log:>9} {outbox:>8} {sync_ms:>8.1f} {query_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Simulation: alert latency and request volume of the adaptive scheduler vs. a fixed hourly check.
+Run from the project root:
+    python benchmarks/bench_scheduler.py [--weeks 12] [--changes-per-week 3] [--seed 7]
+
+Billboard changes are drawn from a synthetic weekly pattern (most on
+Wednesday/Thursday mornings when the new schedule is published, a few on
+Friday afternoons and the rest at random daytime hours). Both schedules run
+over the same changes; the adaptive one learns its profile online from the
+changes it detects, starting from no history.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, "src")
+from database import Database
+from scheduler import AdaptiveScheduler
+
+TZ = "Europe/Andorra"
+START = datetime(2025, 1, 6, tzinfo=ZoneInfo(TZ)).timestamp()  # a Monday
+
+
+def synthetic_changes(weeks: int, per_week: float, rng: random.Random) -> list[float]:
+    tz = ZoneInfo(TZ)
+    changes = []
+    for week in range(weeks):
+        monday = datetime(2025, 1, 6, tzinfo=tz) + timedelta(weeks=week)
+        for _ in range(rng.randint(max(1, int(per_week) - 1), int(per_week) + 1)):
+            pick = rng.random()
+            if pick < 0.7:
+                day, hour = rng.choice([2, 3]), rng.uniform(9, 13)
+            elif pick < 0.9:
+                day, hour = 4, rng.uniform(15, 18)
+            else:
+                day, hour = rng.randrange(7), rng.uniform(8, 22)
+            changes.append((monday + timedelta(days=day, hours=hour)).timestamp())
+    return sorted(changes)
+
+
+def simulate(changes: list[float], end: float, next_check, on_check) -> tuple[list[float], int]:
+    """Walk the check times; returns detection delays (s) and the number of checks."""
+    delays, checks, pending, t = [], 0, 0, START
+    while t < end:
+        checks += 1
+        detected = []
+        while pending < len(changes) and changes[pending] <= t:
+            detected.append(changes[pending])
+            pending += 1
+        delays += [t - c for c in detected]
+        on_check(t, bool(detected))
+        t = next_check(t)
+    return delays, checks
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(name: str, delays: list[float], checks: int, hours: float) -> None:
+    print(
+        f"  {name:<10} checks/hour={checks / hours:5.2f}  mean delay={sum(delays) / len(delays) / 60:6.1f} min  "
+        f"p95={percentile(delays, 95) / 60:6.1f} min  max={max(delays) / 60:6.1f} min"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--changes-per-week", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    end = START + args.weeks * 7 * 86400
+    hours = args.weeks * 7 * 24
+    changes = synthetic_changes(args.weeks, args.changes_per_week, rng)
+
+    fixed_delays, fixed_checks = simulate(changes, end, lambda t: t + 3600, lambda t, changed: None)
+
+    db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+    scheduler = AdaptiveScheduler(db, timezone=TZ, rng=random.Random(args.seed))
+    scheduler.refresh(START)
+    next_at = {}
+
+    def on_check(t: float, changed: bool) -> None:
+        next_at[t] = scheduler.on_success(t, changed)
+
+    adaptive_delays, adaptive_checks = simulate(changes, end, lambda t: next_at.pop(t), on_check)
+
+    print(f"{len(changes)} billboard changes over {args.weeks} weeks:")
+    report("fixed 1h", fixed_delays, fixed_checks, hours)
+    report("adaptive", adaptive_delays, adaptive_checks, hours)
+
+
+if __name__ == "__main__":
+    main()
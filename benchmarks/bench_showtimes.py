@@ -0,0 +1,124 @@
+"""
+Benchmark: showtime ingestion cost per cycle, sequential vs. concurrent, cold vs. incremental.
+Run from the project root:
+    python benchmarks/bench_showtimes.py [--movies 40] [--latency-ms 200] [--concurrency 1 4 8]
+
+A local server stands in for the cinema site and serves one FilmTheaterPage
+per movie (the sessions of ``debug.html`` spread over the movies) after
+``--latency-ms``, answering ``If-None-Match`` with 304. For each concurrency
+three cycles are timed on a fresh database:
+
+  cold      every page is new: fetched, extracted and stored
+  forced    every page requested again (as for changed movies): all 304s
+  steady    nothing due: no requests at all
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, "src")
+from database import Database, Movie
+from extractor import extract_sessions
+from showtimes import ingest_showtimes
+from sources import make_session
+
+
+def film_pages(template_html: str, movies: int) -> dict[str, bytes]:
+    """One page per movie id, each embedding that movie's share of the template's sessions."""
+    sessions = [s for s in extract_sessions(template_html) if "HoraCine" in s]
+    pages = {}
+    for movie_id in range(1, movies + 1):
+        own = [dict(s, ID_Espectaculo=movie_id, ID_Pase=movie_id * 1000 + i) for i, s in enumerate(sessions[:8])]
+        prop = html.escape(json.dumps(own, ensure_ascii=False), quote=True)
+        pages[f"/FilmTheaterPage/{movie_id}"] = (
+            f"<html><body><filmtheaterpage :sessions='{prop}'></filmtheaterpage></body></html>".encode()
+        )
+    return pages
+
+
+def serve(pages: dict[str, bytes], latency: float) -> tuple[ThreadingHTTPServer, dict]:
+    stats = {"200": 0, "304": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self) -> None:
+            time.sleep(latency)
+            body = pages[self.path]
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                stats["304"] += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            stats["200"] += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--movies", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--html", default="debug.html")
+    args = parser.parse_args()
+
+    with open(args.html, encoding="utf-8") as f:
+        pages = film_pages(f.read(), args.movies)
+    server, stats = serve(pages, args.latency_ms / 1000)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    movies = [
+        Movie(i, f"Movie {i}", "Drama", "VOSE", None, f"{base}/FilmTheaterPage/{i}", "bench")
+        for i in range(1, args.movies + 1)
+    ]
+
+    print(f"{'workers':>7} {'cold':>10} {'forced':>10} {'steady':>10} {'sessions':>9} {'200s':>5} {'304s':>5}")
+    for concurrency in args.concurrency:
+        db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+        db.sync_catalog(movies)
+        session = make_session(pool_size=concurrency)
+        stats.update({"200": 0, "304": 0})
+        ids = [m.id for m in movies]
+        timings = []
+        for forced in ((), ids, ()):
+            start = time.perf_counter()
+            result = ingest_showtimes(db, session, forced, concurrency=concurrency, max_pages=len(movies))
+            timings.append(time.perf_counter() - start)
+            if not timings[1:]:
+                sessions = result.showtimes
+        cold, forced_time, steady = (t * 1000 for t in timings)
+        print(
+            f"{concurrency:>7} {cold:>8.0f}ms {forced_time:>8.0f}ms {steady:>8.1f}ms {sessions:>9} "
+            f"{stats['200']:>5} {stats['304']:>5}"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: cycle time vs. number of billboard sources, sequential vs. concurrent fetch.
+Run from the project root:
+    python benchmarks/bench_sources.py [--sources 1 2 4 8 16] [--latency-ms 300] [--html debug.html]
+
+A local HTTP server serves the saved homepage under one path per cinema and
+waits ``--latency-ms`` before answering, standing in for a remote site. Every
+run uses a fresh database, so each source is fetched and extracted in full.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, "src")
+from database import Database
+from sources import CinemesIllaSource, fetch_all, make_session
+
+
+def serve(page: bytes, latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(page)))
+            self.end_headers()
+            self.wfile.write(page)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+
+        def handle_error(self, request, client_address) -> None:
+            # The extractor stops reading once it has the billboard and drops the connection.
+            pass
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sources", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--html", default="debug.html")
+    args = parser.parse_args()
+
+    with open(args.html, "rb") as f:
+        page = f.read()
+    server = serve(page, args.latency_ms / 1000)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    print(f"{'sources':>7} {'sequential':>12} {'concurrent':>12} {'movies':>7}")
+    for count in args.sources:
+        sources = [CinemesIllaSource(f"cinema{i}", f"{base}/cinema{i}/") for i in range(count)]
+        session = make_session(pool_size=count)
+
+        db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+        start = time.perf_counter()
+        for source in sources:
+            result = source.fetcher(db, session).fetch()
+            source.to_movies(result.payload)
+        sequential = time.perf_counter() - start
+
+        db = Database(os.path.join(tempfile.mkdtemp(), "bench.db"))
+        start = time.perf_counter()
+        outcomes = fetch_all(sources, db, session)
+        concurrent = time.perf_counter() - start
+        assert all(outcome.changed for outcome in outcomes), [o.error for o in outcomes]
+
+        movies = sum(len(outcome.movies) for outcome in outcomes)
+        print(f"{count:>7} {sequential * 1000:>10.0f}ms {concurrent * 1000:>10.0f}ms {movies:>7}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
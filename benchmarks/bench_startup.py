@@ -0,0 +1,92 @@
+"""
+Benchmark: cold-start cost of each entry point, as reported by ``python -X importtime``.
+Run from the project root:
+    python benchmarks/bench_startup.py [--runs 5] [--top 8]
+
+For each entry point a fresh interpreter imports it (without running it) with
+``-X importtime``; the cumulative time of the top-level import is reported as
+the median of ``--runs`` runs, with the modules of the last run that took the
+longest themselves.
+Then ``Database()`` construction is timed on a new file (schema created), on
+an up-to-date file in a fresh process (one pragma read) and again in the same
+process.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ENTRY_POINTS = {
+    "main (scrape-once)": "import main; main.scrape_context()",
+    "main (all)": "import main, bot, outbox, retention, scheduler, profiling",
+    "bot": "import bot",
+    "notifier": "import notifier",
+    "database": "import database",
+}
+
+# Runs in a fresh interpreter: prints the construction time of Database() in ms.
+DATABASE_PROBE = """
+import sys, time
+sys.path.insert(0, "src")
+from database import Database
+start = time.perf_counter()
+Database(sys.argv[1])
+first = time.perf_counter() - start
+start = time.perf_counter()
+Database(sys.argv[1])
+print(first * 1000, (time.perf_counter() - start) * 1000)
+"""
+
+
+def importtime(statement: str) -> list[tuple[str, int, int]]:
+    """(module, self us, cumulative us) for every module imported by ``statement``."""
+    env = dict(os.environ, PYTHONPATH="src", PYTHONDONTWRITEBYTECODE="")
+    # Keep the Database() probes of main/bot away from a real notifier.db.
+    env["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "bench.db")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, env=env, check=True,
+    )
+    rows = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level after the separator's one.
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest modules listed per entry point")
+    args = parser.parse_args()
+
+    for label, statement in ENTRY_POINTS.items():
+        importtime(statement)  # warm the bytecode cache
+        totals = []
+        for _ in range(args.runs):
+            rows = importtime(statement)
+            # Top-level imports are the unindented names; their cumulative times add up to the total.
+            totals.append(sum(cumulative for name, _, cumulative in rows if not name.startswith(" ")))
+        print(f"\n{label}: {statistics.median(totals) / 1000:.1f} ms imports ({len(rows)} modules)")
+        for name, self_us, cumulative in sorted(rows, key=lambda row: -row[1])[:args.top]:
+            print(f"  {self_us / 1000:>7.1f} ms self {cumulative / 1000:>7.1f} ms total  {name.strip()}")
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    print("\nDatabase() construction")
+    for label in ("new file", "existing file"):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", DATABASE_PROBE, path], capture_output=True, text=True, check=True,
+        ).stdout
+        elapsed = time.perf_counter() - start
+        first, again = (float(value) for value in output.split())
+        print(f"  {label:<14} first {first:>7.2f} ms, again in-process {again:.3f} ms  (process {elapsed * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
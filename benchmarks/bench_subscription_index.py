@@ -0,0 +1,93 @@
+"""
+Benchmark: subscriber matching with the in-memory index vs. the per-movie SQL query.
+Run from the project root:
+    python benchmarks/bench_subscription_index.py [--sizes 1000 10000 100000 1000000] [--sql-max 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, "src")
+from database import Database, Movie
+from subscription_index import SubscriptionIndex
+
+# Same values the bot offers in /alertas.
+FORMAT_OPTIONS = ["VOSE", "CASTELLÀ", "CATALÀ"]
+GENRE_OPTIONS = ["Thriller", "Comedia", "Drama", "Terror", "Animació", "Aventura"]
+
+NEW_MOVIES = [
+    Movie(100 + i, f"Movie {i}", GENRE_OPTIONS[i % len(GENRE_OPTIONS)], FORMAT_OPTIONS[i % len(FORMAT_OPTIONS)], None)
+    for i in range(5)
+]
+
+
+def synthetic_filters(users: int, seed: int = 42) -> list[tuple[int, str, str]]:
+    rng = random.Random(seed)
+    rows = []
+    for telegram_id in range(1, users + 1):
+        for value in rng.sample(FORMAT_OPTIONS, rng.randint(0, 2)):
+            rows.append((telegram_id, "format_type", value))
+        for value in rng.sample(GENRE_OPTIONS, rng.randint(0, 3)):
+            rows.append((telegram_id, "genre", value))
+    return rows
+
+
+def bench_index(rows: list[tuple[int, str, str]]) -> tuple[float, float, int]:
+    index = SubscriptionIndex()
+    start = time.perf_counter()
+    index.load(rows)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = index.match_many(NEW_MOVIES)
+    match_time = time.perf_counter() - start
+    return load_time, match_time, sum(len(users) for users in matches.values())
+
+
+def bench_sql(rows: list[tuple[int, str, str]], users: int) -> tuple[float, int]:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db = Database(path)
+    with db._get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, first_name) VALUES (?, 'bench')",
+            [(i,) for i in range(1, users + 1)],
+        )
+        conn.executemany(
+            "INSERT INTO subscription_filters (telegram_id, filter_type, filter_value) VALUES (?, ?, ?)",
+            rows,
+        )
+    start = time.perf_counter()
+    total = sum(len(db.get_matching_subscribers(m.id, m.format, m.genre)) for m in NEW_MOVIES)
+    elapsed = time.perf_counter() - start
+    db.pool.close_all()
+    return elapsed, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--sql-max", type=int, default=100_000, help="largest population also measured with SQL")
+    args = parser.parse_args()
+
+    print(f"{len(NEW_MOVIES)} new movies per cycle")
+    print(f"{'users':>10} {'filters':>10} {'index load':>12} {'index match':>12} {'SQL match':>12} {'matches':>9}")
+    for users in args.sizes:
+        rows = synthetic_filters(users)
+        load_time, match_time, matched = bench_index(rows)
+        sql = "-"
+        if users <= args.sql_max:
+            sql_time, sql_matched = bench_sql(rows, users)
+            if sql_matched != matched:
+                raise SystemExit(f"Index and SQL disagree at {users} users: {matched} vs {sql_matched}")
+            sql = f"{sql_time * 1000:.1f} ms"
+        print(
+            f"{users:>10} {len(rows):>10} {load_time * 1000:>9.1f} ms {match_time * 1000:>9.2f} ms "
+            f"{sql:>12} {matched:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Local stand-in for an SMTP relay, for benchmarks and manual testing.
+Run from the project root:
+    python benchmarks/smtp_stub.py [--port 2525] [--latency-ms 20] [--no-pipelining]
+
+Speaks enough ESMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT) and advertises PIPELINING unless told not to. Every reply waits
+``latency_ms`` once per round trip: commands that arrive together (pipelined)
+are answered together after a single delay, so the cost of each round trip is
+visible. Recipients whose local part starts with ``bounce`` are refused with
+550 and those starting with ``defer`` with 451. Accepted messages are counted
+per recipient in ``delivered``.
+
+Point the sender at it with ``SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_SECURITY=none``.
+"""
+import argparse
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter
+
+MAX_RECIPIENTS = 100
+
+
+class SMTPStub:
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 20, pipelining: bool = True,
+    ) -> None:
+        self.latency = latency_ms / 1000
+        self.pipelining = pipelining
+        self.stats: Counter[str] = Counter()
+        self.delivered: Counter[str] = Counter()
+        self.messages: list[bytes] = []
+        self._lock = threading.Lock()
+        self._server = self._make_server(host, port)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += amount
+
+    def _make_server(self, host: str, port: int) -> socketserver.ThreadingTCPServer:
+        stub = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def setup(self) -> None:
+                self.buffer = b""
+                self.replies: list[str] = []
+                self.sender: str | None = None
+                self.recipients: list[str] = []
+                self.in_data = False
+                self.closing = False
+
+            def flush(self) -> None:
+                # One simulated network round trip per batch of replies.
+                if self.replies:
+                    time.sleep(stub.latency)
+                    stub.count("round_trips")
+                    self.request.sendall("".join(f"{reply}\r\n" for reply in self.replies).encode())
+                    self.replies = []
+
+            def reset(self) -> None:
+                self.sender, self.recipients, self.in_data = None, [], False
+
+            def command(self, line: str) -> None:
+                verb, _, argument = line.partition(" ")
+                verb = verb.upper()
+                stub.count(f"cmd_{verb.lower()}")
+                if verb == "EHLO":
+                    extensions = ["PIPELINING"] if stub.pipelining else []
+                    lines = ["stub.local", *extensions, "8BITMIME", "SIZE 10485760"]
+                    self.replies += [f"250-{text}" for text in lines[:-1]] + [f"250 {lines[-1]}"]
+                elif verb == "HELO":
+                    self.replies.append("250 stub.local")
+                elif verb == "MAIL":
+                    self.reset()
+                    self.sender = argument.partition(":")[2].strip().strip("<>")
+                    self.replies.append("250 2.1.0 OK")
+                elif verb == "RCPT":
+                    address = argument.partition(":")[2].strip().strip("<>")
+                    local = address.partition("@")[0].lower()
+                    if self.sender is None:
+                        self.replies.append("503 5.5.1 MAIL first")
+                    elif len(self.recipients) >= MAX_RECIPIENTS:
+                        self.replies.append("452 4.5.3 Too many recipients")
+                    elif local.startswith("bounce"):
+                        stub.count("refused")
+                        self.replies.append("550 5.1.1 No such user")
+                    elif local.startswith("defer"):
+                        stub.count("deferred")
+                        self.replies.append("451 4.3.0 Try again later")
+                    else:
+                        self.recipients.append(address)
+                        self.replies.append("250 2.1.5 OK")
+                elif verb == "DATA":
+                    if not self.recipients:
+                        self.replies.append("554 5.5.1 No valid recipients")
+                        self.reset()
+                    else:
+                        self.in_data = True
+                        self.replies.append("354 End data with <CR><LF>.<CR><LF>")
+                elif verb == "RSET":
+                    self.reset()
+                    self.replies.append("250 2.0.0 OK")
+                elif verb == "NOOP":
+                    self.replies.append("250 2.0.0 OK")
+                elif verb == "QUIT":
+                    self.replies.append("221 2.0.0 Bye")
+                    self.closing = True
+                else:
+                    self.replies.append("502 5.5.2 Command not implemented")
+
+            def message(self, data: bytes) -> None:
+                body = data.replace(b"\r\n..", b"\r\n.")
+                with stub._lock:
+                    stub.stats["transactions"] += 1
+                    stub.delivered.update(self.recipients)
+                    stub.messages.append(body)
+                    del stub.messages[:-100]
+                self.replies.append("250 2.0.0 Queued")
+                self.reset()
+
+            def handle(self) -> None:
+                stub.count("sessions")
+                self.replies.append("220 stub.local ESMTP ready")
+                self.flush()
+                while not self.closing:
+                    try:
+                        chunk = self.request.recv(65536)
+                    except OSError:
+                        return
+                    if not chunk:
+                        return
+                    self.buffer += chunk
+                    while not self.closing:
+                        if self.in_data:
+                            end = self.buffer.find(b"\r\n.\r\n")
+                            if end < 0:
+                                break
+                            data, self.buffer = self.buffer[:end + 2], self.buffer[end + 5:]
+                            self.message(data)
+                            continue
+                        line, sep, rest = self.buffer.partition(b"\r\n")
+                        if not sep:
+                            break
+                        self.buffer = rest
+                        self.command(line.decode("utf-8", "replace"))
+                    self.flush()
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+            address_family = socket.AF_INET
+
+        return Server((host, port), Handler)
+
+    def start(self) -> "SMTPStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats.clear()
+            self.delivered.clear()
+            self.messages.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--no-pipelining", action="store_true")
+    args = parser.parse_args()
+    stub = SMTPStub(args.host, args.port, args.latency_ms, pipelining=not args.no_pipelining)
+    print(f"SMTP stub listening on {args.host}:{stub.address[1]}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(stub.stats))
+
+
+if __name__ == "__main__":
+    main()
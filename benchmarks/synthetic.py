@@ -0,0 +1,86 @@
+"""
+Synthetic inputs for the benchmarks: billboard pages and user/filter populations.
+
+Pages are built from a saved homepage (``debug.html``) by replacing the
+``:onlytitlesinfo`` and ``:postersurl`` attributes of the ``<cinemaindexpage>``
+component, so everything around the billboard stays realistic.
+"""
+import html
+import json
+import random
+import re
+import sys
+
+sys.path.insert(0, "src")
+from database import Database
+from extractor import extract_billboard
+
+# Same values the bot offers in /alertas.
+FORMAT_OPTIONS = ["VOSE", "CASTELLÀ", "CATALÀ"]
+GENRE_OPTIONS = ["Thriller", "Comedia", "Drama", "Terror", "Animació", "Aventura"]
+
+_ATTR_RE_TEMPLATE = r"""({name}\s*=\s*)('[^']*'|"[^"]*")"""
+
+
+def _replace_attr(page: str, name: str, value: str) -> str:
+    pattern = re.compile(_ATTR_RE_TEMPLATE.format(name=re.escape(name)), re.IGNORECASE)
+    escaped = html.escape(value, quote=True)
+    page, count = pattern.subn(lambda m: f"{m.group(1)}'{escaped}'", page, count=1)
+    if count != 1:
+        raise ValueError(f"Attribute {name} not found in the template page")
+    return page
+
+
+def synthetic_movies(count: int, template: list[dict], seed: int = 42, first_id: int = 100_000) -> list[dict]:
+    """``count`` billboard records cloned from ``template`` with unique ids, titles, genres and formats."""
+    rng = random.Random(seed)
+    movies = []
+    for i in range(count):
+        record = dict(template[i % len(template)])
+        record["ID_Espectaculo"] = first_id + i
+        record["Titulo"] = f"{record.get('Titulo', 'MOVIE')} #{first_id + i}"
+        record["NombreGenero"] = rng.choice(GENRE_OPTIONS)
+        record["NombreFormato"] = rng.choice(FORMAT_OPTIONS)
+        record["Cartel"] = f"poster{first_id + i}.jpg"
+        movies.append(record)
+    return movies
+
+
+def synthetic_page(template_html: str, movies: list[dict], poster_base_url: str | None = None) -> str:
+    """Render ``movies`` into a copy of the template homepage."""
+    page = _replace_attr(template_html, ":onlytitlesinfo", json.dumps(movies, ensure_ascii=False))
+    if poster_base_url is not None:
+        page = _replace_attr(page, ":postersurl", json.dumps(poster_base_url))
+    return page
+
+
+def template_movies(template_html: str) -> list[dict]:
+    return extract_billboard(template_html).movies
+
+
+def synthetic_filters(users: int, seed: int = 42) -> list[tuple[int, str, str]]:
+    """Filter rows for ``users`` users: each picks 0-3 formats and 0-4 genres."""
+    rng = random.Random(seed)
+    rows = []
+    for telegram_id in range(1, users + 1):
+        for value in rng.sample(FORMAT_OPTIONS, rng.randint(0, len(FORMAT_OPTIONS))):
+            rows.append((telegram_id, "format_type", value))
+        for value in rng.sample(GENRE_OPTIONS, rng.randint(0, 4)):
+            rows.append((telegram_id, "genre", value))
+    return rows
+
+
+def populate(db: Database, users: int, seed: int = 42) -> int:
+    """Insert ``users`` users with synthetic filters; returns the number of filter rows."""
+    rows = synthetic_filters(users, seed)
+    with db._get_connection() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (telegram_id, first_name, username) VALUES (?, ?, ?)",
+            [(tg_id, f"user{tg_id}", None) for tg_id in range(1, users + 1)],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO subscription_filters (telegram_id, filter_type, filter_value) VALUES (?, ?, ?)",
+            rows,
+        )
+    # An index loaded before the bulk insert reloads on its next use (subscription_version moved).
+    return len(rows)
@@ -0,0 +1,202 @@
+"""
+Local stand-in for the Telegram Bot API, for benchmarks and manual testing.
+Run from the project root:
+    python benchmarks/telegram_stub.py [--port 8081] [--latency-ms 50] [--rate-limit 30] [--retry-after 1]
+
+Answers ``/bot<token>/<method>`` like the real API after ``latency_ms``
+(plus jitter). With ``rate_limit`` set, requests beyond that many per second
+get ``429 Too Many Requests`` with ``retry_after``; ``error_rate`` answers a
+random share of requests with 429 regardless. ``sendPhoto`` returns a
+``file_id`` that later sends may reuse, and ``GET /posters/<name>`` serves a
+small image so poster downloads can be pointed here too.
+
+Point the bot at it with ``TELEGRAM_API_BASE=http://127.0.0.1:8081``.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# A tiny but valid JPEG header followed by padding, enough for a poster download.
+POSTER_BYTES = b"\xff\xd8\xff\xe0" + b"\0" * 20_000 + b"\xff\xd9"
+
+
+class TelegramStub:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 50,
+        jitter_ms: float = 10,
+        rate_limit: float | None = None,
+        retry_after: int = 1,
+        error_rate: float = 0.0,
+        seed: int = 42,
+    ) -> None:
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats: Counter[str] = Counter()
+        # Arrival time (monotonic) of every request, by chat_id, to check pacing.
+        self.chat_times: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+        self._recent: deque[float] = deque()
+        self._message_id = 0
+        self._in_flight = 0
+        self._server = self._make_server(host, port)
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def api_url(self, token: str = "123456:STUB") -> str:
+        return f"{self.base_url}/bot{token}/"
+
+    def start(self) -> "TelegramStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="telegram-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _throttled(self) -> bool:
+        """Record a request and decide whether to answer it with 429."""
+        now = time.monotonic()
+        with self._lock:
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return True
+            if self.rate_limit is None:
+                return False
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                return True
+            self._recent.append(now)
+            return False
+
+    def _answer(self, method: str, fields: dict[str, str], multipart: bool) -> tuple[int, dict]:
+        if "chat_id" in fields:
+            with self._lock:
+                self.chat_times.setdefault(fields["chat_id"], []).append(time.monotonic())
+        time.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+        if self._throttled():
+            self.stats["429"] += 1
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        self.stats[method] += 1
+        with self._lock:
+            self._message_id += 1
+            message_id = self._message_id
+        result: dict = {"message_id": message_id, "date": int(time.time())}
+        if "chat_id" in fields:
+            result["chat"] = {"id": fields["chat_id"]}
+        if method == "sendPhoto":
+            photo = fields.get("photo", "")
+            if photo.startswith("stub-"):
+                file_id = photo
+            else:
+                self.stats["photo_uploads" if multipart else "photo_urls"] += 1
+                file_id = "stub-" + hashlib.sha1(f"{photo}{message_id}".encode()).hexdigest()
+            result["photo"] = [{"file_id": file_id, "file_unique_id": file_id[-12:], "width": 600, "height": 900}]
+        elif method == "sendMessage":
+            result["text"] = fields.get("text", "")
+        elif method in ("getMe",):
+            result = {"id": 123456, "is_bot": True, "first_name": "Stub", "username": "stub_bot"}
+        else:
+            result = True
+        return 200, {"ok": True, "result": result}
+
+    def _make_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, Nagle's
+            # algorithm plus delayed ACKs add ~40 ms to every response.
+            disable_nagle_algorithm = True
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                if self.path.startswith("/posters/"):
+                    stub.stats["poster_downloads"] += 1
+                    self._send(200, POSTER_BYTES, "image/jpeg")
+                else:
+                    self._send(404, b'{"ok": false, "error_code": 404, "description": "Not Found"}')
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                parts = self.path.split("/")
+                if len(parts) != 3 or not parts[1].startswith("bot"):
+                    self._send(404, b'{"ok": false, "error_code": 404, "description": "Not Found"}')
+                    return
+                content_type = self.headers.get("Content-Type", "")
+                multipart = content_type.startswith("multipart/")
+                fields = {}
+                if not multipart:
+                    fields = {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+                with stub._lock:
+                    stub._in_flight += 1
+                    stub.stats["max_in_flight"] = max(stub.stats["max_in_flight"], stub._in_flight)
+                try:
+                    status, payload = stub._answer(parts[2], fields, multipart)
+                finally:
+                    with stub._lock:
+                        stub._in_flight -= 1
+                self._send(status, json.dumps(payload).encode())
+
+            def log_message(self, *args) -> None:
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        return Server((host, port), Handler)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests/s before answering 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    args = parser.parse_args()
+
+    stub = TelegramStub(
+        port=args.port, latency_ms=args.latency_ms, rate_limit=args.rate_limit,
+        retry_after=args.retry_after, error_rate=args.error_rate,
+    ).start()
+    print(f"Telegram stub listening on {stub.base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            print(dict(stub.stats))
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,30 +6,110 @@ Run alongside the scraping loop; handles direct user interactions.
 import asyncio
 import logging
 import os
+import re
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from collections.abc import Set as AbstractSet
 from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache, partial, wraps
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from dotenv import load_dotenv
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
 
-from database import Database, TelegramUser
+from bot_store import AsyncBotStore
+from database import Database, Movie, Showtime, TelegramUser
+from emailer import EmailNotifier
+from keyword_matcher import normalize_keyword
+from metrics import histogram
+from profiling import HANDLER_PROFILER
+from scheduler import DEFAULT_TIMEZONE
+from subscription_index import KEYWORD_FILTER
+from webhook import WebhookServer
 
 load_dotenv()
 
 logger = logging.getLogger("illa_notifier.bot")
-db = Database()
+
+
+@lru_cache(maxsize=None)
+def get_store() -> AsyncBotStore:
+    """The handlers' data access, created on first use so that importing this module opens no database.
+
+    Handlers must only reach the database through the store.
+    """
+    return AsyncBotStore(Database())
+
+
+@lru_cache(maxsize=None)
+def get_emailer() -> EmailNotifier | None:
+    """Sender of address confirmation codes; None when email is not configured (``SMTP_HOST``)."""
+    return EmailNotifier.from_env()
+
+
+BOT_MODES = ("polling", "webhook")
+# Characters Telegram accepts in a webhook secret_token.
+_SECRET_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{1,256}$")
+
+HANDLER_SECONDS = histogram(
+    "illa_bot_handler_seconds", "Bot handler latency by handler and outcome (ok, error).", ["handler", "outcome"],
+)
 
 
 @dataclass(frozen=True)
 class BotConfig:
     token: str
+    mode: str = "polling"
+    # Public HTTPS URL registered with Telegram (webhook mode only).
+    webhook_url: str = ""
+    webhook_secret: str = ""
+    webhook_listen: str = "0.0.0.0"
+    webhook_port: int = 8443
+    # Local path the server accepts updates on; defaults to the path of webhook_url.
+    webhook_path: str = ""
+
+    def __post_init__(self) -> None:
+        if self.mode not in BOT_MODES:
+            raise ValueError(f"BOT_MODE must be one of {', '.join(BOT_MODES)}, got {self.mode!r}")
+        if self.mode == "webhook":
+            if not self.webhook_url.startswith("https://"):
+                raise ValueError("WEBHOOK_URL must be an https:// URL in webhook mode")
+            if not _SECRET_TOKEN_RE.match(self.webhook_secret):
+                raise ValueError("WEBHOOK_SECRET must be 1-256 characters of A-Z, a-z, 0-9, _ or -")
+            if not self.webhook_path:
+                object.__setattr__(self, "webhook_path", urlparse(self.webhook_url).path or "/")
 
     @classmethod
     def from_env(cls) -> "BotConfig":
         token = os.environ.get("TELEGRAM_TOKEN", "")
         if not token:
             raise ValueError("TELEGRAM_TOKEN is required but not set")
-        return cls(token=token)
+        return cls(
+            token=token,
+            mode=os.environ.get("BOT_MODE", "polling").lower(),
+            webhook_url=os.environ.get("WEBHOOK_URL", ""),
+            webhook_secret=os.environ.get("WEBHOOK_SECRET", ""),
+            webhook_listen=os.environ.get("WEBHOOK_LISTEN", "0.0.0.0"),
+            webhook_port=int(os.environ.get("WEBHOOK_PORT", "8443")),
+            webhook_path=os.environ.get("WEBHOOK_PATH", ""),
+        )
+
+
+async def _ensure_user(update: Update) -> TelegramUser:
+    """Register (or refresh) the sender of ``update`` and return it.
+
+    Filters, emails and digest settings reference users (foreign keys are
+    enforced), and people can reach any command without sending /start, so
+    every handler that stores something for the user calls this first.
+    """
+    tg_user = update.effective_user
+    user = TelegramUser(telegram_id=tg_user.id, first_name=tg_user.first_name, username=tg_user.username)
+    await get_store().upsert_user(user)
+    return user
 
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -38,12 +118,7 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
 
     tg_user = update.effective_user
-    user = TelegramUser(
-        telegram_id=tg_user.id,
-        first_name=tg_user.first_name,
-        username=tg_user.username,
-    )
-    db.upsert_user(user)
+    user = await _ensure_user(update)
     logger.info("Upserted user id=%s (%s)", user.telegram_id, user.first_name)
 
     first_name = tg_user.first_name
@@ -76,15 +151,28 @@ FORMAT_OPTIONS: list[str] = ["VOSE", "CASTELLÀ", "CATALÀ"]
 GENRE_OPTIONS: list[str] = ["Thriller", "Comedia", "Drama", "Terror", "Animació", "Aventura"]
 
 
-def _build_alerts_keyboard(active_filters: set[tuple[str, str]] | None = None) -> InlineKeyboardMarkup:
-    """Build the inline keyboard for /alertas with format and genre toggles.
+_KEYBOARD_FILTERS: frozenset[tuple[str, str]] = frozenset(
+    [("format_type", v) for v in FORMAT_OPTIONS] + [("genre", v) for v in GENRE_OPTIONS]
+)
+
+
+def _build_alerts_keyboard(active_filters: AbstractSet[tuple[str, str]] | None = None) -> InlineKeyboardMarkup:
+    """Return the inline keyboard for /alertas with format and genre toggles.
+
+    Only the keyboard's own options affect its layout, so there are at most
+    2^9 distinct keyboards; each is built once and reused.
+    """
+    return _render_alerts_keyboard(frozenset(active_filters or ()) & _KEYBOARD_FILTERS)
+
+
+@lru_cache(maxsize=2 ** len(_KEYBOARD_FILTERS))
+def _render_alerts_keyboard(filters: frozenset[tuple[str, str]]) -> InlineKeyboardMarkup:
+    """Build the keyboard for one filter state.
 
     Active filters are shown with a ✅ prefix.
     Header buttons act as 'select all' toggles and show ✅ when every option in
     their category is active.
     """
-    filters = active_filters or set()
-
     def _btn(filter_type: str, label: str) -> InlineKeyboardButton:
         prefix = "✅ " if (filter_type, label) in filters else ""
         return InlineKeyboardButton(f"{prefix}{label}", callback_data=f"sub:{filter_type}:{label}")
@@ -111,7 +199,8 @@ ALERTS_TEXT = (
     "🔔 *Mis alertas personalizadas*\n\n"
     "Selecciona lo que te interesa y te avisaré "
     "cuando llegue una película que encaje.\n\n"
-    "_Toca un botón para activar/desactivar._"
+    "_Toca un botón para activar/desactivar._\n\n"
+    "¿Esperas un título concreto? Usa /vigilar."
 )
 
 
@@ -120,7 +209,8 @@ async def alertas_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if update.message is None or update.effective_user is None:
         return
 
-    active = db.get_user_filters(update.effective_user.id)
+    await _ensure_user(update)
+    active = await get_store().get_filters(update.effective_user.id)
     keyboard = _build_alerts_keyboard(active)
     await update.message.reply_text(
         ALERTS_TEXT,
@@ -137,7 +227,7 @@ async def open_alertas_callback(update: Update, context: ContextTypes.DEFAULT_TY
         return
     await query.answer()
 
-    active = db.get_user_filters(update.effective_user.id)
+    active = await get_store().get_filters(update.effective_user.id)
     keyboard = _build_alerts_keyboard(active)
     await query.edit_message_text(
         ALERTS_TEXT,
@@ -162,12 +252,11 @@ async def subscription_callback(update: Update, context: ContextTypes.DEFAULT_TY
     _, filter_type, filter_value = parts
     telegram_id = update.effective_user.id
 
-    now_active = db.toggle_filter(telegram_id, filter_type, filter_value)
+    now_active, active = await get_store().toggle_filter(telegram_id, filter_type, filter_value)
     status = "activada" if now_active else "desactivada"
     await query.answer(f"{filter_value} {status}")
 
     # Re-render the keyboard with updated checks
-    active = db.get_user_filters(telegram_id)
     keyboard = _build_alerts_keyboard(active)
     await query.edit_message_reply_markup(reply_markup=keyboard)
     logger.info(
@@ -203,51 +292,394 @@ async def toggle_all_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         await query.answer("Error: tipo de filtro desconocido")
         return
 
-    active = db.get_user_filters(telegram_id)
-    all_active = all((filter_type, v) in active for v in values)
-
-    if all_active:
-        db.remove_all_filters(telegram_id, filter_type)
-        await query.answer("Todos los idiomas desactivados")
-    else:
-        db.set_all_filters(telegram_id, filter_type, values)
+    now_active, active = await get_store().toggle_all_filters(telegram_id, filter_type, values)
+    if now_active:
         await query.answer("Todos los idiomas activados")
+    else:
+        await query.answer("Todos los idiomas desactivados")
 
-    active = db.get_user_filters(telegram_id)
     keyboard = _build_alerts_keyboard(active)
     await query.edit_message_reply_markup(reply_markup=keyboard)
-    logger.info("User id=%s toggled all %s -> %s", telegram_id, filter_type, "off" if all_active else "on")
+    logger.info("User id=%s toggled all %s -> %s", telegram_id, filter_type, "on" if now_active else "off")
+
+
+# Deliberately loose: the SMTP server has the final word, and rejected
+# addresses stop receiving alerts after a few attempts.
+_EMAIL_RE = re.compile(r"^[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}$")
+EMAIL_OFF_WORDS = {"off", "no", "borrar"}
+_EMAIL_CODE_RE = re.compile(r"^\d{6}$")
+
+
+async def email_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /email [address|code|off]: show, remove or change the address for email alerts.
+
+    A new address only gets alerts once the user sends back the code emailed
+    to it, so nobody can sign up someone else's mailbox.
+    """
+    if update.message is None or update.effective_user is None:
+        return
+    emailer = get_emailer()
+    if emailer is None:
+        await update.message.reply_text("📭 Las alertas por correo no están disponibles por ahora.")
+        return
+
+    tg_user = update.effective_user
+    store = get_store()
+    args = context.args or []
+    if not args:
+        email, pending = await asyncio.gather(store.get_email(tg_user.id), store.get_pending_email(tg_user.id))
+        if email:
+            text = f"📧 Recibes las alertas también en {email}.\nPara dejar de recibirlas, envía /email off."
+        else:
+            text = "📧 Envía /email tu@correo.com para recibir tus alertas también por correo."
+        if pending:
+            text += (
+                f"\n\n⏳ {pending} está pendiente de confirmar: envía /email seguido del código que te mandé. "
+                f"Si no lo encuentras, envía /email {pending} para recibir otro."
+            )
+        await update.message.reply_text(text)
+        return
+
+    await _ensure_user(update)
+    value = args[0].strip()
+    if value.lower() in EMAIL_OFF_WORDS:
+        await store.set_email(tg_user.id, None)
+        await update.message.reply_text("📭 Ya no recibirás alertas por correo.")
+        logger.info("User id=%s removed their email", tg_user.id)
+        return
+    if _EMAIL_CODE_RE.match(value):
+        email = await store.confirm_email(tg_user.id, value)
+        if email is None:
+            await update.message.reply_text(
+                "⚠️ Ese código no es válido o ha caducado. Envía /email tu@correo.com para recibir uno nuevo."
+            )
+            return
+        await update.message.reply_text(f"✅ Confirmado. Recibirás tus alertas también en {email}.")
+        logger.info("User id=%s confirmed an email address", tg_user.id)
+        return
+    if len(value) > 254 or not _EMAIL_RE.match(value):
+        await update.message.reply_text("⚠️ Esa dirección no parece válida. Ejemplo: /email tu@correo.com")
+        return
+
+    code = await store.start_email_verification(tg_user.id, value)
+    if code is None:
+        await update.message.reply_text(
+            "⏳ Te envié un código hace poco. Espera unos minutos antes de pedir otro."
+        )
+        return
+    result = await asyncio.get_running_loop().run_in_executor(
+        None, partial(emailer.send_confirmation, tg_user.id, value, code),
+    )
+    if not result.ok:
+        # Nothing was sent, so the user may try again (e.g. with a corrected address) right away.
+        await store.cancel_email_verification(tg_user.id)
+        await update.message.reply_text(f"⚠️ No he podido enviar el correo a {value}. Revisa la dirección.")
+        logger.warning("Confirmation email for user id=%s failed: %s", tg_user.id, result.error)
+        return
+    await update.message.reply_text(
+        f"📨 Te he enviado un código a {value}.\nEnvíalo aquí con /email seguido del código para confirmar la dirección."
+    )
+    logger.info("User id=%s asked to confirm an email address", tg_user.id)
+
+
+# (callback value, label, digest_minutes); None sends one DM per movie.
+DIGEST_OPTIONS: list[tuple[str, str, int | None]] = [
+    ("off", "🔔 Al momento, una por película", None),
+    ("0", "📋 Un resumen por revisión de cartelera", 0),
+    ("180", "🕒 Un resumen cada 3 horas", 180),
+    ("1440", "📅 Un resumen al día", 1440),
+]
+_DIGEST_MINUTES = {value: minutes for value, _, minutes in DIGEST_OPTIONS}
+
+DIGEST_TEXT = (
+    "📋 *Resumen de novedades*\n\n"
+    "Cuando llegan varias películas a la vez, puedo mandártelas juntas "
+    "en un solo mensaje en lugar de una por una.\n\n"
+    "_Elige cómo quieres recibir tus alertas._"
+)
+
+
+@lru_cache(maxsize=len(DIGEST_OPTIONS))
+def _build_digest_keyboard(minutes: int | None) -> InlineKeyboardMarkup:
+    """Return the /resumen keyboard with the user's current delivery mode checked."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"{'✅ ' if option == minutes else ''}{label}", callback_data=f"digest:{value}")]
+        for value, label, option in DIGEST_OPTIONS
+    ])
+
+
+async def digest_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /resumen command: show the delivery mode keyboard (one DM per movie or digests)."""
+    if update.message is None or update.effective_user is None:
+        return
+
+    tg_user = update.effective_user
+    await _ensure_user(update)
+    minutes = await get_store().get_digest(tg_user.id)
+    await update.message.reply_text(DIGEST_TEXT, parse_mode="Markdown", reply_markup=_build_digest_keyboard(minutes))
+    logger.info("Sent /resumen keyboard to user id=%s", tg_user.id)
+
+
+async def digest_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle digest:* buttons: store the chosen delivery mode and refresh the keyboard."""
+    query = update.callback_query
+    if query is None or query.data is None or update.effective_user is None:
+        return
+
+    # callback_data format: "digest:{off|minutes}"
+    value = query.data.split(":", 1)[1]
+    if value not in _DIGEST_MINUTES:
+        await query.answer("Error: opción desconocida")
+        return
+
+    minutes = _DIGEST_MINUTES[value]
+    await get_store().set_digest(update.effective_user.id, minutes)
+    await query.answer("Recibirás un resumen" if minutes is not None else "Recibirás cada película al momento")
+    await query.edit_message_reply_markup(reply_markup=_build_digest_keyboard(minutes))
+    logger.info("User id=%s set digest mode -> %s", update.effective_user.id, value)
+
+
+MAX_KEYWORDS = int(os.environ.get("BOT_MAX_KEYWORDS", "20"))
+KEYWORD_MIN_LENGTH = 2
+KEYWORD_MAX_LENGTH = 60
+KEYWORDS_CLEAR_WORDS = {"todo", "todas", "all"}
+
+
+def _user_keywords(filters: AbstractSet[tuple[str, str]]) -> list[str]:
+    return sorted(value for filter_type, value in filters if filter_type == KEYWORD_FILTER)
+
+
+def _keywords_text(keywords: list[str]) -> str:
+    if not keywords:
+        return "👀 No vigilas ningún título.\nEnvía /vigilar dune para que te avise cuando llegue."
+    listed = "\n".join(f"• {keyword}" for keyword in keywords)
+    return f"👀 Vigilo estos títulos para ti:\n{listed}\n\nPara dejar de vigilar uno, envía /olvidar {keywords[0]}."
+
+
+def _parse_keywords(args: list[str]) -> list[str]:
+    """Normalised keywords from a command's arguments; several can be given separated by commas."""
+    return list(dict.fromkeys(
+        keyword for keyword in (normalize_keyword(part) for part in " ".join(args).split(",")) if keyword
+    ))
+
+
+async def watch_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /vigilar [keywords]: list the user's title keywords or add some (comma-separated)."""
+    if update.message is None or update.effective_user is None:
+        return
+
+    tg_user = update.effective_user
+    store = get_store()
+    keywords = _parse_keywords(context.args or [])
+    current = _user_keywords(await store.get_filters(tg_user.id))
+    if not keywords:
+        await update.message.reply_text(_keywords_text(current))
+        return
+
+    invalid = [k for k in keywords if not KEYWORD_MIN_LENGTH <= len(k) <= KEYWORD_MAX_LENGTH]
+    if invalid:
+        await update.message.reply_text(
+            f"⚠️ Cada título debe tener entre {KEYWORD_MIN_LENGTH} y {KEYWORD_MAX_LENGTH} caracteres."
+        )
+        return
+    added = [k for k in keywords if k not in current]
+    if len(current) + len(added) > MAX_KEYWORDS:
+        await update.message.reply_text(
+            f"⚠️ Puedes vigilar hasta {MAX_KEYWORDS} títulos. Usa /olvidar para liberar alguno."
+        )
+        return
+
+    await _ensure_user(update)
+    filters = await store.set_all_filters(tg_user.id, KEYWORD_FILTER, added)
+    await update.message.reply_text(
+        "✅ Te avisaré cuando llegue una película con "
+        + ", ".join(f"«{k}»" for k in keywords) + " en el título.\n\n"
+        + _keywords_text(_user_keywords(filters))
+    )
+    logger.info("User id=%s added %d keyword(s)", tg_user.id, len(added))
+
+
+async def unwatch_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /olvidar keywords|todo: stop watching some title keywords, or all of them."""
+    if update.message is None or update.effective_user is None:
+        return
+
+    telegram_id = update.effective_user.id
+    store = get_store()
+    args = context.args or []
+    current = _user_keywords(await store.get_filters(telegram_id))
+    if len(args) == 1 and args[0].lower() in KEYWORDS_CLEAR_WORDS:
+        await store.remove_all_filters(telegram_id, KEYWORD_FILTER)
+        await update.message.reply_text("🗑️ Ya no vigilo ningún título para ti.")
+        logger.info("User id=%s cleared their keywords", telegram_id)
+        return
+
+    keywords = [k for k in _parse_keywords(args) if k in current]
+    if not keywords:
+        await update.message.reply_text(
+            "Envía /olvidar seguido de un título que vigiles, o /olvidar todo.\n\n" + _keywords_text(current)
+        )
+        return
+    filters = await store.remove_filters(telegram_id, KEYWORD_FILTER, keywords)
+    await update.message.reply_text(
+        "🗑️ Dejo de vigilar " + ", ".join(f"«{k}»" for k in keywords) + ".\n\n"
+        + _keywords_text(_user_keywords(filters))
+    )
+    logger.info("User id=%s removed %d keyword(s)", telegram_id, len(keywords))
+
+
+# Movies and sessions per movie listed by /sesiones.
+SHOWTIMES_MAX_MOVIES = 3
+SHOWTIMES_PER_MOVIE = 8
+WEEKDAYS = ["lun", "mar", "mié", "jue", "vie", "sáb", "dom"]
+
+
+def _cinema_now() -> str:
+    """The cinema's local time in the format showtimes are stored in ("YYYY-MM-DD HH:MM")."""
+    try:
+        now = datetime.now(ZoneInfo(DEFAULT_TIMEZONE))
+    except ZoneInfoNotFoundError:
+        now = datetime.now()
+    return now.strftime("%Y-%m-%d %H:%M")
+
+
+def _showtime_line(showtime: Showtime) -> str:
+    starts = datetime.strptime(showtime.starts_at, "%Y-%m-%d %H:%M")
+    parts = [f"{WEEKDAYS[starts.weekday()]} {starts:%d/%m %H:%M}"]
+    parts += [part for part in (showtime.format, showtime.room) if part]
+    return "• " + " · ".join(parts)
+
+
+def _showtimes_text(movie: Movie, showtimes: list[Showtime]) -> str:
+    lines = [f"🎬 {movie.title}"]
+    if showtimes:
+        lines += [_showtime_line(showtime) for showtime in showtimes]
+    else:
+        lines.append("Todavía no hay sesiones publicadas.")
+    if movie.ticket_url:
+        lines.append(f"🎟️ {movie.ticket_url}")
+    return "\n".join(lines)
+
+
+async def showtimes_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /sesiones title: list the upcoming sessions of the movies on the billboard matching it."""
+    if update.message is None:
+        return
+
+    query = normalize_keyword(" ".join(context.args or []))
+    if not query:
+        await update.message.reply_text("Envía /sesiones seguido del título, por ejemplo /sesiones dune.")
+        return
+
+    store = get_store()
+    movies = [movie for movie, _ in await store.get_catalog() if query in normalize_keyword(movie.title)]
+    if not movies:
+        await update.message.reply_text(f"🤷 No hay ninguna película en cartelera con «{query}» en el título.")
+        return
+
+    now = _cinema_now()
+    shown = movies[:SHOWTIMES_MAX_MOVIES]
+    showtimes = await asyncio.gather(
+        *(store.get_upcoming_showtimes(movie.id, now, SHOWTIMES_PER_MOVIE) for movie in shown)
+    )
+    text = "\n\n".join(_showtimes_text(movie, sessions) for movie, sessions in zip(shown, showtimes))
+    if len(movies) > len(shown):
+        text += f"\n\n…y {len(movies) - len(shown)} más. Escribe un título más concreto para verlas."
+    await update.message.reply_text(text)
+
+
+HandlerCallback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+
+def _timed(handler: HandlerCallback) -> HandlerCallback:
+    """Record the handler's latency in ``illa_bot_handler_seconds``, profiling it when armed."""
+    @wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with HANDLER_PROFILER.profile(handler.__name__):
+                await handler(update, context)
+            outcome = "ok"
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, handler=handler.__name__, outcome=outcome)
+    return wrapper
 
 
 def build_application(config: BotConfig) -> Application:
     """Build and configure the Telegram Application with all registered handlers."""
-    app = Application.builder().token(config.token).build()
-    app.add_handler(CommandHandler("start", start_handler))
-    app.add_handler(CommandHandler("alertas", alertas_handler))
-    app.add_handler(CallbackQueryHandler(open_alertas_callback, pattern="^open_alertas$"))
-    app.add_handler(CallbackQueryHandler(toggle_all_callback, pattern=r"^all:"))
-    app.add_handler(CallbackQueryHandler(subscription_callback, pattern=r"^sub:"))
-    app.add_handler(CallbackQueryHandler(noop_callback, pattern="^noop$"))
+    # Updates are processed concurrently; database work runs off the event loop
+    # in AsyncBotStore, so one slow write no longer blocks other users.
+    app = Application.builder().token(config.token).concurrent_updates(True).build()
+    app.add_handler(CommandHandler("start", _timed(start_handler)))
+    app.add_handler(CommandHandler("alertas", _timed(alertas_handler)))
+    app.add_handler(CommandHandler("email", _timed(email_handler)))
+    app.add_handler(CommandHandler("resumen", _timed(digest_handler)))
+    app.add_handler(CommandHandler("vigilar", _timed(watch_handler)))
+    app.add_handler(CommandHandler("olvidar", _timed(unwatch_handler)))
+    app.add_handler(CommandHandler("sesiones", _timed(showtimes_handler)))
+    app.add_handler(CallbackQueryHandler(_timed(open_alertas_callback), pattern="^open_alertas$"))
+    app.add_handler(CallbackQueryHandler(_timed(toggle_all_callback), pattern=r"^all:"))
+    app.add_handler(CallbackQueryHandler(_timed(subscription_callback), pattern=r"^sub:"))
+    app.add_handler(CallbackQueryHandler(_timed(digest_callback), pattern=r"^digest:"))
+    app.add_handler(CallbackQueryHandler(_timed(noop_callback), pattern="^noop$"))
     return app
 
 
-async def _run_bot_async(app: Application) -> None:
-    """Low-level async polling that avoids registering UNIX signal handlers.
+async def _enqueue_update(app: Application, data: dict) -> None:
+    await app.update_queue.put(Update.de_json(data, app.bot))
+
+
+def build_webhook_server(app: Application, config: BotConfig) -> WebhookServer:
+    """Create the HTTP server that feeds webhook updates into the application's queue."""
+    return WebhookServer(
+        partial(_enqueue_update, app),
+        secret_token=config.webhook_secret,
+        path=config.webhook_path,
+        host=config.webhook_listen,
+        port=config.webhook_port,
+    )
+
+
+async def _run_bot_async(app: Application, config: BotConfig, stop: threading.Event | None = None) -> None:
+    """Low-level async startup that avoids registering UNIX signal handlers.
 
-    app.run_polling() calls loop.add_signal_handler() which only works in the
-    main thread. Using the underlying primitives directly sidesteps that.
+    app.run_polling()/run_webhook() call loop.add_signal_handler() which only
+    works in the main thread. Using the underlying primitives directly
+    sidesteps that.
     """
     async with app:
-        await app.updater.start_polling(drop_pending_updates=True)  # type: ignore[union-attr]
         await app.start()
-        logger.info("Bot ready and polling for updates")
-        # Block until the daemon thread is killed on main process exit.
-        await asyncio.Event().wait()
-
-
-def run_bot() -> None:
-    """Entry point for the bot listener. Runs blocking polling in its own thread."""
+        server = None
+        if config.mode == "webhook":
+            server = build_webhook_server(app, config)
+            await server.start()
+            await app.bot.set_webhook(
+                url=config.webhook_url,
+                secret_token=config.webhook_secret,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,
+            )
+            logger.info("Bot ready and receiving updates by webhook at %s", config.webhook_url)
+        else:
+            # start_polling() also deletes any webhook left over from webhook mode.
+            await app.updater.start_polling(drop_pending_updates=True)  # type: ignore[union-attr]
+            logger.info("Bot ready and polling for updates")
+        if stop is None:
+            # Block until the daemon thread is killed on main process exit.
+            await asyncio.Event().wait()
+        await asyncio.get_running_loop().run_in_executor(None, stop.wait)
+        logger.info("Bot stopping")
+        if server is not None:
+            await server.stop()
+        else:
+            await app.updater.stop()  # type: ignore[union-attr]
+        await app.stop()
+
+
+def run_bot(stop: threading.Event | None = None) -> None:
+    """Entry point for the bot listener. Runs blocking polling or the webhook server until ``stop`` is set."""
     config = BotConfig.from_env()
     app = build_application(config)
-    logger.info("Bot polling started")
-    asyncio.run(_run_bot_async(app))
+    logger.info("Bot started in %s mode", config.mode)
+    asyncio.run(_run_bot_async(app, config, stop))
@@ -0,0 +1,136 @@
+"""
+Async data access for the bot's handlers.
+
+``Database`` is synchronous; calling it from a handler blocks the event loop,
+so one slow write (e.g. while the scraper holds the write lock) would stall
+every other user's update. ``AsyncBotStore`` runs the blocking calls off the
+loop: writes go through a single writer thread (SQLite admits one writer at a
+time, so more threads would only contend on the busy handler) and reads use a
+small reader pool that WAL lets proceed alongside writes. Cached filter reads
+never leave the loop.
+
+Filter edits are group-committed: taps that arrive while a write is in flight
+are queued and applied together, in arrival order, in one transaction, so a
+burst of taps costs one commit (and one thread hop) instead of one each.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from database import Database, FilterChange, Movie, Showtime, TelegramUser
+from filter_cache import UserFilterCache
+
+DEFAULT_READ_WORKERS = int(os.environ.get("BOT_DB_READ_WORKERS", "3"))
+MAX_WRITE_BATCH = int(os.environ.get("BOT_DB_WRITE_BATCH", "500"))
+
+
+class AsyncBotStore:
+    def __init__(self, db: Database, cache: UserFilterCache | None = None, read_workers: int = DEFAULT_READ_WORKERS) -> None:
+        self.db = db
+        self.cache = cache or UserFilterCache(db)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bot-db-write")
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="bot-db-read")
+        self._pending: list[tuple[FilterChange, asyncio.Future]] = []
+        # Held here: the loop only keeps weak references to tasks, and callers wait on this one's futures.
+        self._flush_task: asyncio.Task | None = None
+        # Open the writer's connection now: opening runs PRAGMAs that wait on
+        # the write lock, which the first burst of taps would otherwise queue behind.
+        self._writer.submit(db.pool.acquire)
+
+    async def _write(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._writer, partial(func, *args))
+
+    async def _read(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._readers, partial(func, *args))
+
+    async def _submit(self, change: FilterChange) -> tuple[bool, frozenset[tuple[str, str]]]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((change, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+        return await future
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending:
+                batch, self._pending = self._pending[:MAX_WRITE_BATCH], self._pending[MAX_WRITE_BATCH:]
+                try:
+                    results = await self._write(self.cache.apply, [change for change, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._flush_task = None
+
+    async def upsert_user(self, user: TelegramUser) -> None:
+        await self._write(self.db.upsert_user, user)
+
+    async def set_email(self, telegram_id: int, email: str | None) -> None:
+        await self._write(self.db.set_user_email, telegram_id, email)
+
+    async def get_email(self, telegram_id: int) -> str | None:
+        return await self._read(self.db.get_user_email, telegram_id)
+
+    async def get_pending_email(self, telegram_id: int) -> str | None:
+        return await self._read(self.db.get_pending_email, telegram_id)
+
+    async def start_email_verification(self, telegram_id: int, email: str) -> str | None:
+        return await self._write(self.db.start_email_verification, telegram_id, email)
+
+    async def confirm_email(self, telegram_id: int, code: str) -> str | None:
+        return await self._write(self.db.confirm_email, telegram_id, code)
+
+    async def cancel_email_verification(self, telegram_id: int) -> None:
+        await self._write(self.db.cancel_email_verification, telegram_id)
+
+    async def set_digest(self, telegram_id: int, minutes: int | None) -> None:
+        await self._write(self.db.set_user_digest, telegram_id, minutes)
+
+    async def get_digest(self, telegram_id: int) -> int | None:
+        return await self._read(self.db.get_user_digest, telegram_id)
+
+    async def get_catalog(self) -> list[tuple[Movie, str]]:
+        return await self._read(self.db.get_catalog)
+
+    async def get_upcoming_showtimes(self, movie_id: int, after: str, limit: int) -> list[Showtime]:
+        return await self._read(self.db.get_upcoming_showtimes, movie_id, after, limit)
+
+    async def get_filters(self, telegram_id: int) -> frozenset[tuple[str, str]]:
+        cached = self.cache.peek(telegram_id)
+        if cached is not None:
+            return cached
+        return await self._read(self.cache.get, telegram_id)
+
+    async def toggle_filter(self, telegram_id: int, filter_type: str, filter_value: str) -> tuple[bool, frozenset[tuple[str, str]]]:
+        return await self._submit(FilterChange("toggle", telegram_id, filter_type, (filter_value,)))
+
+    async def set_all_filters(self, telegram_id: int, filter_type: str, values: list[str]) -> frozenset[tuple[str, str]]:
+        _, filters = await self._submit(FilterChange("add", telegram_id, filter_type, tuple(values)))
+        return filters
+
+    async def remove_all_filters(self, telegram_id: int, filter_type: str) -> frozenset[tuple[str, str]]:
+        _, filters = await self._submit(FilterChange("remove", telegram_id, filter_type))
+        return filters
+
+    async def remove_filters(self, telegram_id: int, filter_type: str, values: list[str]) -> frozenset[tuple[str, str]]:
+        _, filters = await self._submit(FilterChange("remove", telegram_id, filter_type, tuple(values)))
+        return filters
+
+    async def toggle_all_filters(self, telegram_id: int, filter_type: str, values: list[str]) -> tuple[bool, frozenset[tuple[str, str]]]:
+        """Select every value of ``filter_type``, or clear them if all are already active.
+
+        Returns whether the values are now active and the updated filter set.
+        The decision is taken in the writer against the state the preceding
+        queued changes leave behind.
+        """
+        return await self._submit(FilterChange("toggle_all", telegram_id, filter_type, tuple(values)))
+
+    def close(self) -> None:
+        self._writer.shutdown(wait=False)
+        self._readers.shutdown(wait=False)
@@ -0,0 +1,284 @@
+"""
+Read-only HTTP API over the current billboard, for other services.
+
+    GET /movies          every movie on the billboard, newest first
+    GET /movies/recent   the CATALOG_API_RECENT (20) most recently added movies
+    GET /movies/<id>     one movie
+    GET /healthz         liveness
+
+Requests are served from an immutable :class:`CatalogSnapshot` built by the
+scraper right after each catalog sync: every response body is serialised
+once, with a strong ETag, when the snapshot is built. Publishing a new
+snapshot is a single reference swap, so a request sees either the old
+catalog or the new one, and readers never touch SQLite or wait on the
+scraper's writes. ``If-None-Match`` answers 304 without a body.
+
+The server runs on its own event loop in a daemon thread and, like the
+webhook server, implements only what clients and proxies need: GET/HEAD and
+keep-alive connections.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from http import HTTPStatus
+from types import MappingProxyType
+
+from database import Database, Movie
+from metrics import counter
+
+logger = logging.getLogger("illa_notifier.catalog_api")
+
+DEFAULT_CATALOG_API_LISTEN = os.environ.get("CATALOG_API_LISTEN", "127.0.0.1")
+# 0 disables the API.
+DEFAULT_CATALOG_API_PORT = int(os.environ.get("CATALOG_API_PORT", "8089"))
+RECENT_MOVIES = int(os.environ.get("CATALOG_API_RECENT", "20"))
+MAX_HEADER_BYTES = 16 * 1024
+# Idle keep-alive connections are closed after this many seconds.
+IDLE_TIMEOUT = 75
+
+HEALTH_PATH = "/healthz"
+# Clients revalidate with If-None-Match on every use; unchanged resources cost a 304.
+CACHE_CONTROL = "no-cache"
+
+REQUESTS = counter(
+    "illa_catalog_api_requests_total", "Catalog API requests by route and status code.", ["route", "status"],
+)
+
+
+@dataclass(frozen=True)
+class Resource:
+    """A pre-serialised 200 response: body, strong ETag and the status line and headers but Connection."""
+    body: bytes
+    etag: str
+    head: bytes
+
+    @classmethod
+    def json(cls, payload: object) -> "Resource":
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"ETag: {etag}\r\n"
+            f"Cache-Control: {CACHE_CONTROL}\r\n"
+        ).encode("latin-1")
+        return cls(body, etag, head)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    version: int
+    movies: int
+    # Request path -> response.
+    resources: Mapping[str, Resource]
+
+    @classmethod
+    def build(cls, catalog: list[tuple[Movie, str]], version: int = 0) -> "CatalogSnapshot":
+        """Serialise ``Database.get_catalog()`` rows (newest first) into every response the API serves."""
+        documents = [
+            {
+                "id": movie.id,
+                "title": movie.title,
+                "genre": movie.genre,
+                "format": movie.format,
+                "poster_url": movie.poster_url,
+                "ticket_url": movie.ticket_url,
+                "source": movie.source,
+                "added_at": added_at.replace(" ", "T") + "Z" if added_at else None,
+            }
+            for movie, added_at in catalog
+        ]
+        resources = {f"/movies/{document['id']}": Resource.json(document) for document in documents}
+        resources["/movies"] = Resource.json({"count": len(documents), "movies": documents})
+        recent = documents[:RECENT_MOVIES]
+        resources["/movies/recent"] = Resource.json({"count": len(recent), "movies": recent})
+        resources[HEALTH_PATH] = Resource.json({"ok": True})
+        return cls(version, len(documents), MappingProxyType(resources))
+
+
+def _route(path: str) -> str:
+    """Metric label for a path, so per-movie paths don't each get a series."""
+    if path in ("/movies", "/movies/recent", HEALTH_PATH):
+        return path
+    return "/movies/{id}" if path.startswith("/movies/") else "other"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match uses: ``W/`` prefixes are ignored."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _error(status: HTTPStatus, extra_headers: str = "") -> tuple[bytes, bytes]:
+    body = json.dumps({"error": status.phrase}).encode()
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"{extra_headers}"
+    ).encode("latin-1")
+    return head, body
+
+
+_NOT_FOUND = _error(HTTPStatus.NOT_FOUND)
+_METHOD_NOT_ALLOWED = _error(HTTPStatus.METHOD_NOT_ALLOWED, "Allow: GET, HEAD\r\n")
+_BAD_REQUEST = _error(HTTPStatus.BAD_REQUEST)
+_HEADERS_TOO_LARGE = _error(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+_KEEP_ALIVE = b"Connection: keep-alive\r\n\r\n"
+_CLOSE = b"Connection: close\r\n\r\n"
+
+
+class CatalogAPI:
+    def __init__(self, host: str = DEFAULT_CATALOG_API_LISTEN, port: int = DEFAULT_CATALOG_API_PORT) -> None:
+        self.host = host
+        self.port = port
+        # Replaced, never mutated: each request reads this reference once.
+        self.snapshot = CatalogSnapshot.build([])
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server: asyncio.Server | None = None
+        self._listen_error: OSError | None = None
+        self._started = threading.Event()
+
+    def publish(self, snapshot: CatalogSnapshot) -> None:
+        self.snapshot = snapshot
+
+    def refresh(self, db: Database) -> CatalogSnapshot:
+        """Build a snapshot of the current catalog and publish it."""
+        snapshot = CatalogSnapshot.build(db.get_catalog(), self.snapshot.version + 1)
+        self.publish(snapshot)
+        return snapshot
+
+    def start(self) -> bool:
+        """Serve from a daemon thread. With ``port=0`` a free port is bound and written back to ``self.port``.
+
+        Returns False if the server could not listen; the error is logged.
+        """
+        thread = threading.Thread(target=self._serve, name="catalog-api", daemon=True)
+        thread.start()
+        self._started.wait()
+        if self._server is None:
+            logger.error("Catalog API could not listen on %s:%d: %s", self.host, self.port, self._listen_error)
+            return False
+        logger.info("Catalog API listening on http://%s:%d/movies", self.host, self.port)
+        return True
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    def _serve(self) -> None:
+        async def serve() -> None:
+            try:
+                self._server = await asyncio.start_server(
+                    self._handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES,
+                )
+                self.port = self._server.sockets[0].getsockname()[1]
+            except OSError as e:
+                self._listen_error = e
+                return
+            finally:
+                self._started.set()
+            async with self._server:
+                try:
+                    await self._server.serve_forever()
+                except asyncio.CancelledError:
+                    pass
+
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(serve())
+        finally:
+            self._loop.close()
+
+    def _respond(self, method: str, path: str, headers: dict[str, str]) -> tuple[bytes, bytes]:
+        if method not in ("GET", "HEAD"):
+            return _METHOD_NOT_ALLOWED
+        resource = self.snapshot.resources.get(path)
+        if resource is None:
+            return _NOT_FOUND
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, resource.etag):
+            return (
+                f"HTTP/1.1 304 Not Modified\r\nETag: {resource.etag}\r\nCache-Control: {CACHE_CONTROL}\r\n"
+            ).encode("latin-1"), b""
+        return resource.head, b"" if method == "HEAD" else resource.body
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    head, body = _HEADERS_TOO_LARGE
+                    writer.write(head + _CLOSE + body)
+                    return
+
+                request_line, *header_lines = request.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    head, body = _BAD_REQUEST
+                    writer.write(head + _CLOSE + body)
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                path = target.split("?", 1)[0]
+                head, body = self._respond(method, path, headers)
+                # Read-only API: requests with a body are answered, then the connection is closed.
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                    and "content-length" not in headers
+                    and "transfer-encoding" not in headers
+                )
+                writer.write(head + (_KEEP_ALIVE if keep_alive else _CLOSE) + body)
+                REQUESTS.inc(route=_route(path), status=head[9:12].decode())
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+# The API of this process, if started; the scrape cycle publishes to it.
+_API: CatalogAPI | None = None
+
+
+def start_catalog_api(
+    db: Database, host: str = DEFAULT_CATALOG_API_LISTEN, port: int = DEFAULT_CATALOG_API_PORT,
+) -> CatalogAPI | None:
+    """Publish the current catalog and serve it.
+
+    Returns None when ``port`` is 0 (disabled) or the server cannot listen:
+    the API is optional, so the scraper carries on without it.
+    """
+    global _API
+    if not port:
+        return None
+    api = CatalogAPI(host, port)
+    api.refresh(db)
+    if not api.start():
+        return None
+    _API = api
+    return api
+
+
+def refresh_catalog_api(db: Database) -> None:
+    """Publish a new snapshot after a catalog sync, if this process serves the API."""
+    if _API is not None:
+        _API.refresh(db)
@@ -1,6 +1,145 @@
+import hashlib
+import hmac
 import os
+import random
+import secrets
 import sqlite3
-from dataclasses import dataclass
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+
+from metrics import histogram
+from subscription_index import SubscriptionIndex, read_version
+
+DEFAULT_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DEFAULT_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+# Stored in PRAGMA user_version. Bump it whenever _create_tables gains a
+# table, index or migration, or existing files will not pick the change up.
+SCHEMA_VERSION = 6
+# Consecutive permanent rejections (SMTP 5xx) after which a user's address gets no more alerts.
+EMAIL_MAX_FAILURES = int(os.environ.get("EMAIL_MAX_FAILURES", "3"))
+# Address confirmation: a code is valid this many seconds and for this many
+# tries, and a user can have a new code sent at most once per interval.
+EMAIL_CODE_TTL = int(os.environ.get("EMAIL_CODE_TTL", str(24 * 3600)))
+EMAIL_CODE_MAX_ATTEMPTS = 5
+EMAIL_CODE_INTERVAL = int(os.environ.get("EMAIL_CODE_INTERVAL", "600"))
+
+# Outbox delivery channels
+CHANNEL_POST = "telegram_channel"
+CHANNEL_DM = "telegram_dm"
+CHANNEL_EMAIL = "email"
+# Subscriber DMs of users in digest mode, coalesced into one message per recipient.
+CHANNEL_DIGEST = "telegram_digest"
+
+CATALOG_SYNC_SECONDS = histogram(
+    "illa_catalog_sync_seconds", "Duration of a catalog sync transaction, subscriber matching included.",
+)
+MATCH_SECONDS = histogram(
+    "illa_subscriber_match_seconds", "Time spent matching a cycle's new movies against the subscription index.",
+)
+
+
+def _hash_code(code: str) -> str:
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+class ConnectionPool:
+    """Bounded set of persistent SQLite connections, one per thread.
+
+    Each thread keeps its own connection for its lifetime, so queries no longer
+    pay the open/close cost. Connections run in WAL mode, which lets the bot
+    keep reading while the scraper writes. At most ``max_connections`` are
+    open at once; connections owned by threads that have exited are reclaimed
+    before a new thread has to wait for a free slot.
+    """
+
+    _registry: dict[str, "ConnectionPool"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        db_path: str,
+        max_connections: int = DEFAULT_POOL_SIZE,
+        busy_timeout_ms: int = DEFAULT_BUSY_TIMEOUT_MS,
+    ) -> None:
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connections: dict[threading.Thread, sqlite3.Connection] = {}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def for_path(cls, db_path: str) -> "ConnectionPool":
+        """Return the process-wide pool for a database file, creating it on first use."""
+        key = os.path.abspath(db_path)
+        with cls._registry_lock:
+            pool = cls._registry.get(key)
+            if pool is None:
+                pool = cls._registry[key] = cls(db_path)
+            return pool
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread is off only so close_all() can run from any thread;
+        # each connection is still used by its owning thread alone.
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        # Must precede anything that writes the header; existing files are
+        # converted by the VACUUM in Database.compact().
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def _reap_dead_threads(self) -> None:
+        for thread in [t for t in self._connections if not t.is_alive()]:
+            self._connections.pop(thread).close()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening one if the pool has room.
+
+        Blocks for up to the busy timeout when the pool is full and raises
+        ``sqlite3.OperationalError`` if no slot frees up.
+        """
+        thread = threading.current_thread()
+        with self._cond:
+            conn = self._connections.get(thread)
+            if conn is not None:
+                return conn
+            deadline = time.monotonic() + self.busy_timeout_ms / 1000
+            while len(self._connections) >= self.max_connections:
+                self._reap_dead_threads()
+                if len(self._connections) < self.max_connections:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError(
+                        f"connection pool exhausted ({self.max_connections} connections in use)"
+                    )
+                self._cond.wait(min(remaining, 0.1))
+            conn = self._connections[thread] = self._open()
+            return conn
+
+    def release(self) -> None:
+        """Close the calling thread's connection and free its slot."""
+        with self._cond:
+            conn = self._connections.pop(threading.current_thread(), None)
+            if conn is not None:
+                conn.close()
+                self._cond.notify()
+
+    def close_all(self) -> None:
+        with self._cond:
+            for conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+            self._cond.notify_all()
+
 
 @dataclass(frozen=True)
 class TelegramUser:
@@ -9,16 +148,154 @@ class TelegramUser:
     username: str | None
 
 
+@dataclass(frozen=True)
+class Movie:
+    id: int
+    title: str
+    genre: str | None
+    format: str | None
+    poster_url: str | None
+    ticket_url: str | None = None
+    # Name of the billboard source the movie was scraped from.
+    source: str | None = None
+
+
+@dataclass(frozen=True)
+class CatalogSyncResult:
+    """Movie ids touched by a catalog sync, in billboard order where applicable."""
+    new: list[int] = field(default_factory=list)
+    reappeared: list[int] = field(default_factory=list)
+    changed: list[int] = field(default_factory=list)
+    retired: list[int] = field(default_factory=list)
+    enqueued: int = 0
+
+
+@dataclass(frozen=True)
+class PruneResult:
+    """Rows deleted by one ``Database.prune_retired_movies`` call."""
+    movies: int = 0
+    notifications: int = 0
+    outbox: int = 0
+
+
+@dataclass(frozen=True)
+class CompactResult:
+    freed_pages: int
+    size_bytes: int
+    # True if the call converted the file to incremental auto-vacuum with a full VACUUM.
+    converted: bool = False
+
+
+@dataclass(frozen=True)
+class OutboxItem:
+    id: int
+    recipient: str
+    channel: str
+    attempts: int
+    movie: Movie
+
+
+@dataclass(frozen=True)
+class FilterChange:
+    """One subscription filter edit, see ``Database.apply_filter_changes``.
+
+    ``action`` is "toggle" (exactly one value), "add", or "remove"; a "remove"
+    without values clears every value of ``filter_type``.
+    """
+    action: str
+    telegram_id: int
+    filter_type: str
+    values: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class FetchState:
+    url: str
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
+
+
+@dataclass(frozen=True)
+class Showtime:
+    session_id: int
+    movie_id: int
+    # Local cinema time, "YYYY-MM-DD HH:MM".
+    starts_at: str
+    room: str | None = None
+    format: str | None = None
+
+
+@dataclass(frozen=True)
+class ShowtimePage:
+    """A movie's FilmTheaterPage and the validators of its last fetch."""
+    movie_id: int
+    url: str
+    state: FetchState
+
+
 class Database:
+    # Files whose schema is known to be current in this process.
+    _schema_ready: set[str] = set()
+    _schema_lock = threading.Lock()
+
     def __init__(self, db_path: str = os.environ.get("DB_PATH", "notifier.db")) -> None:
         self.db_path = db_path
-        self._create_tables()
+        self.pool = ConnectionPool.for_path(db_path)
+        self._ensure_schema()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Return this thread's persistent connection; use it as a transaction context manager."""
+        return self.pool.acquire()
+
+    def close(self) -> None:
+        """Release the calling thread's connection back to the pool."""
+        self.pool.release()
+
+    @property
+    def subscriptions(self) -> SubscriptionIndex:
+        """Process-wide inverted index of subscription filters, loaded on first access.
+
+        Reloaded first if another process changed the filters since.
+        """
+        conn = self._get_connection()
+        index = SubscriptionIndex.for_path(self.db_path, conn)
+        index.refresh(conn)
+        return index
 
-    def _get_connection(self):
-        return sqlite3.connect(self.db_path)
+    def _index_add(self, telegram_id: int, filter_type: str, values: list[str]) -> None:
+        index = SubscriptionIndex.loaded_for(self.db_path)
+        if index is not None:
+            index.add(telegram_id, filter_type, values)
+
+    def _index_discard(self, telegram_id: int, filter_type: str, values: list[str] | None = None) -> None:
+        index = SubscriptionIndex.loaded_for(self.db_path)
+        if index is not None:
+            index.discard(telegram_id, filter_type, values)
+
+    def _ensure_schema(self) -> None:
+        """Create or migrate the schema once per file and process, and only when its version is behind.
+
+        Constructing further ``Database`` objects for the same file costs a set
+        lookup; a fresh process on an up-to-date file reads one pragma.
+        """
+        key = os.path.abspath(self.db_path)
+        if key in Database._schema_ready:
+            return
+        with Database._schema_lock:
+            if key in Database._schema_ready:
+                return
+            conn = self._get_connection()
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self._create_tables()
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            Database._schema_ready.add(key)
 
     def _create_tables(self) -> None:
         with self._get_connection() as conn:
+            had_movie_sources = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'movie_sources'"
+            ).fetchone()
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS movies (
                     id         INTEGER PRIMARY KEY,
@@ -26,6 +303,8 @@ class Database:
                     genre      TEXT,
                     format     TEXT,
                     poster_url TEXT,
+                    ticket_url TEXT,
+                    source     TEXT,
                     is_active  INTEGER DEFAULT 1,
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 );
@@ -52,6 +331,30 @@ class Database:
                 CREATE INDEX IF NOT EXISTS idx_sf_type_value
                     ON subscription_filters (filter_type, filter_value);
 
+                -- Bumped on every change to subscription_filters, by any process, so
+                -- in-memory subscription indexes can tell when they are stale.
+                CREATE TABLE IF NOT EXISTS subscription_version (
+                    id      INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                );
+
+                INSERT OR IGNORE INTO subscription_version (id, version) VALUES (1, 0);
+
+                CREATE TRIGGER IF NOT EXISTS trg_sf_insert AFTER INSERT ON subscription_filters
+                BEGIN
+                    UPDATE subscription_version SET version = version + 1;
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_sf_update AFTER UPDATE ON subscription_filters
+                BEGIN
+                    UPDATE subscription_version SET version = version + 1;
+                END;
+
+                CREATE TRIGGER IF NOT EXISTS trg_sf_delete AFTER DELETE ON subscription_filters
+                BEGIN
+                    UPDATE subscription_version SET version = version + 1;
+                END;
+
                 CREATE TABLE IF NOT EXISTS notification_log (
                     id          INTEGER PRIMARY KEY AUTOINCREMENT,
                     telegram_id INTEGER NOT NULL
@@ -64,32 +367,553 @@ class Database:
 
                 CREATE INDEX IF NOT EXISTS idx_nl_movie
                     ON notification_log (movie_id);
+
+                CREATE TABLE IF NOT EXISTS fetch_state (
+                    url           TEXT PRIMARY KEY,
+                    etag          TEXT,
+                    last_modified TEXT,
+                    content_hash  TEXT,
+                    updated_at    DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+
+                -- One row per (recipient, movie, channel); drained by OutboxWorker.
+                -- status: pending -> sent | dead. Times are unix epoch seconds.
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient       TEXT    NOT NULL,
+                    movie_id        INTEGER NOT NULL
+                                    REFERENCES movies (id) ON DELETE CASCADE,
+                    channel         TEXT    NOT NULL,
+                    status          TEXT    NOT NULL DEFAULT 'pending',
+                    attempts        INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL    NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0),
+                    lease_until     REAL,
+                    last_error      TEXT,
+                    created_at      DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (recipient, movie_id, channel)
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_outbox_due
+                    ON outbox (status, next_attempt_at);
+
+                CREATE TABLE IF NOT EXISTS poster_cache (
+                    poster_url   TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    file_id      TEXT NOT NULL,
+                    updated_at   DATETIME DEFAULT CURRENT_TIMESTAMP
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_pc_hash
+                    ON poster_cache (content_hash);
+
+                CREATE TABLE IF NOT EXISTS billboard_changes (
+                    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                    changed_at REAL NOT NULL
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_bc_changed_at
+                    ON billboard_changes (changed_at);
+
+                -- Upcoming sessions scraped from each movie's FilmTheaterPage.
+                CREATE TABLE IF NOT EXISTS showtimes (
+                    session_id INTEGER PRIMARY KEY,
+                    movie_id   INTEGER NOT NULL
+                               REFERENCES movies (id) ON DELETE CASCADE,
+                    starts_at  TEXT    NOT NULL,
+                    room       TEXT,
+                    format     TEXT
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_showtimes_movie_start
+                    ON showtimes (movie_id, starts_at);
+
+                CREATE INDEX IF NOT EXISTS idx_showtimes_start
+                    ON showtimes (starts_at);
+
+                -- Conditional-request validators and content hash of each movie's
+                -- FilmTheaterPage; checked_at is unix time.
+                CREATE TABLE IF NOT EXISTS showtime_pages (
+                    movie_id      INTEGER PRIMARY KEY
+                                  REFERENCES movies (id) ON DELETE CASCADE,
+                    url           TEXT NOT NULL,
+                    etag          TEXT,
+                    last_modified TEXT,
+                    content_hash  TEXT,
+                    checked_at    REAL NOT NULL
+                );
+
+                -- Movies pruned by retention (see prune_retired_movies). A tombstone
+                -- stands in for the movie's notification_log rows: its subscribers
+                -- were already notified, so it is never announced again.
+                CREATE TABLE IF NOT EXISTS movie_tombstones (
+                    movie_id   INTEGER PRIMARY KEY,
+                    title      TEXT,
+                    retired_at REAL,
+                    pruned_at  REAL NOT NULL,
+                    notified   INTEGER NOT NULL DEFAULT 0
+                );
+
+                -- The sources currently listing each movie. A movie is retired only
+                -- once no source lists it; movies.source names the listing its row
+                -- mirrors.
+                CREATE TABLE IF NOT EXISTS movie_sources (
+                    movie_id INTEGER NOT NULL
+                             REFERENCES movies (id) ON DELETE CASCADE,
+                    source   TEXT    NOT NULL,
+                    PRIMARY KEY (movie_id, source)
+                ) WITHOUT ROWID;
             """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(movies)")}
+            if "ticket_url" not in columns:
+                conn.execute("ALTER TABLE movies ADD COLUMN ticket_url TEXT")
+            if "source" not in columns:
+                conn.execute("ALTER TABLE movies ADD COLUMN source TEXT")
+            if "retired_at" not in columns:
+                conn.execute("ALTER TABLE movies ADD COLUMN retired_at REAL")
+            user_columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+            if "email_failures" not in user_columns:
+                conn.execute("ALTER TABLE users ADD COLUMN email_failures INTEGER NOT NULL DEFAULT 0")
+            if "email_pending" not in user_columns:
+                # users.email only holds confirmed addresses; one waiting for its code is in email_pending.
+                conn.execute("ALTER TABLE users ADD COLUMN email_pending TEXT")
+                conn.execute("ALTER TABLE users ADD COLUMN email_code_hash TEXT")
+                conn.execute("ALTER TABLE users ADD COLUMN email_code_sent_at REAL")
+                conn.execute("ALTER TABLE users ADD COLUMN email_code_attempts INTEGER NOT NULL DEFAULT 0")
+                # Addresses set before confirmation existed were never verified.
+                conn.execute("UPDATE users SET email_pending = email, email = NULL WHERE email IS NOT NULL")
+            if "digest_minutes" not in user_columns:
+                # NULL: one DM per movie; 0: one digest per scrape cycle; N: at most one digest every N minutes.
+                conn.execute("ALTER TABLE users ADD COLUMN digest_minutes INTEGER")
+            if not had_movie_sources:
+                conn.execute("""
+                    INSERT OR IGNORE INTO movie_sources (movie_id, source)
+                    SELECT id, source FROM movies WHERE is_active = 1 AND source IS NOT NULL
+                """)
+
+    def sync_catalog(
+        self,
+        movies: list[Movie],
+        channel_chat_id: str | None = None,
+        sources: Iterable[str] | None = None,
+        email: bool = False,
+    ) -> CatalogSyncResult:
+        """Make the active catalog match ``movies`` in a single transaction.
 
-    def reset_active_status(self):
+        The scraped billboard is loaded into a temp staging table and diffed
+        against ``movies`` with set-based queries: unseen ids are inserted,
+        known ids are reactivated and only rewritten when their content
+        differs, and active ids missing from the billboard are retired.
+        Duplicate ids keep their first occurrence, unless a later one is from
+        the source the movie's row follows (see below).
+
+        Every source listing a movie is recorded in movie_sources, and a movie
+        is retired only once no source lists it. With ``sources``, only those
+        sources' listings are replaced by ``movies``, so a billboard that
+        failed to load or was unchanged this cycle keeps its movies; without,
+        ``movies`` is the whole billboard. A movie's row follows the source
+        that first listed it for as long as that source still does, so two
+        sources listing the same movie don't overwrite each other every cycle.
+
+        New movies are enqueued in the outbox within the same transaction: one
+        DM per subscriber not yet notified (resolved in one batch against the
+        in-memory subscription index), with ``email`` also one email per such
+        subscriber with a working address, and, if ``channel_chat_id`` is
+        given, one channel post. DMs of users in digest mode are queued on the
+        digest channel instead, due now or, with a window, when the user's
+        pending digest is due (starting a new window if there is none).
+        Readers never observe a partially synced catalog, and a crash can no
+        longer lose notifications.
+        """
+        started = time.perf_counter()
         with self._get_connection() as conn:
-            conn.execute("UPDATE movies SET is_active = 0")
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS staging_movies (
+                    id         INTEGER PRIMARY KEY,
+                    position   INTEGER NOT NULL,
+                    title      TEXT    NOT NULL,
+                    genre      TEXT,
+                    format     TEXT,
+                    poster_url TEXT,
+                    ticket_url TEXT,
+                    source     TEXT,
+                    is_new     INTEGER NOT NULL DEFAULT 0,
+                    -- 0 when another source that still lists the movie owns its row.
+                    owns       INTEGER NOT NULL DEFAULT 1
+                )
+            """)
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS staging_sources (name TEXT PRIMARY KEY)")
+            conn.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS staging_listings (
+                    id     INTEGER NOT NULL,
+                    source TEXT    NOT NULL,
+                    PRIMARY KEY (id, source)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM staging_movies")
+            conn.execute("DELETE FROM staging_sources")
+            conn.execute("DELETE FROM staging_listings")
+            conn.executemany(
+                """
+                INSERT INTO staging_movies (id, position, title, genre, format, poster_url, ticket_url, source)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    title      = excluded.title,
+                    genre      = excluded.genre,
+                    format     = excluded.format,
+                    poster_url = excluded.poster_url,
+                    ticket_url = excluded.ticket_url,
+                    source     = excluded.source
+                WHERE excluded.source = (SELECT source FROM movies WHERE id = excluded.id)
+                """,
+                [
+                    (m.id, i, m.title, m.genre, m.format, m.poster_url, m.ticket_url, m.source)
+                    for i, m in enumerate(movies)
+                ],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO staging_listings (id, source) VALUES (?, ?)",
+                [(m.id, m.source) for m in movies if m.source is not None],
+            )
+            # Replace the listings of the synced sources (of every source without ``sources``).
+            if sources is not None:
+                conn.executemany("INSERT OR IGNORE INTO staging_sources (name) VALUES (?)", [(s,) for s in sources])
+                conn.execute("DELETE FROM movie_sources WHERE source IN (SELECT name FROM staging_sources)")
+            else:
+                conn.execute("DELETE FROM movie_sources")
+            conn.execute("""
+                UPDATE staging_movies SET owns = 0
+                WHERE EXISTS (
+                    SELECT 1 FROM movies m
+                    WHERE m.id = staging_movies.id AND m.is_active = 1
+                      AND m.source IS NOT staging_movies.source
+                      AND (m.source IN (SELECT source FROM movie_sources WHERE movie_id = m.id)
+                           OR m.source IN (SELECT source FROM staging_listings WHERE id = m.id))
+                )
+            """)
+            conn.execute("""
+                UPDATE staging_movies SET is_new = 1
+                WHERE id NOT IN (SELECT id FROM movies)
+                  AND id NOT IN (SELECT movie_id FROM movie_tombstones)
+            """)
+
+            new = [row[0] for row in conn.execute(
+                "SELECT id FROM staging_movies WHERE is_new = 1 ORDER BY position"
+            )]
+            # Retired movies, and pruned ones coming back from their tombstone.
+            reappeared = [row[0] for row in conn.execute("""
+                SELECT s.id FROM staging_movies s
+                WHERE s.is_new = 0
+                  AND s.id NOT IN (SELECT id FROM movies WHERE is_active = 1)
+                ORDER BY s.position
+            """)]
+            changed = [row[0] for row in conn.execute("""
+                SELECT s.id FROM staging_movies s
+                JOIN movies m ON m.id = s.id
+                WHERE m.is_active = 1 AND s.owns = 1
+                  AND (m.title IS NOT s.title OR m.genre IS NOT s.genre
+                       OR m.format IS NOT s.format OR m.poster_url IS NOT s.poster_url
+                       OR m.ticket_url IS NOT s.ticket_url)
+                ORDER BY s.position
+            """)]
+            retired = [row[0] for row in conn.execute("""
+                SELECT m.id FROM movies m
+                WHERE m.is_active = 1
+                  AND m.id NOT IN (SELECT id FROM staging_movies)
+                  AND m.id NOT IN (SELECT movie_id FROM movie_sources)
+                ORDER BY m.id
+            """)]
+
+            conn.execute("""
+                INSERT INTO movies (id, title, genre, format, poster_url, ticket_url, source, is_active)
+                SELECT id, title, genre, format, poster_url, ticket_url, source, 1 FROM staging_movies WHERE owns = 1
+                ON CONFLICT(id) DO UPDATE SET
+                    title      = excluded.title,
+                    genre      = excluded.genre,
+                    format     = excluded.format,
+                    poster_url = excluded.poster_url,
+                    ticket_url = excluded.ticket_url,
+                    source     = excluded.source,
+                    is_active  = 1,
+                    retired_at = NULL
+                WHERE movies.is_active = 0
+                   OR movies.title IS NOT excluded.title
+                   OR movies.genre IS NOT excluded.genre
+                   OR movies.format IS NOT excluded.format
+                   OR movies.poster_url IS NOT excluded.poster_url
+                   OR movies.ticket_url IS NOT excluded.ticket_url
+                   OR movies.source IS NOT excluded.source
+            """)
+            conn.execute("INSERT OR IGNORE INTO movie_sources (movie_id, source) SELECT id, source FROM staging_listings")
+            retired_at = time.time()
+            conn.executemany(
+                "UPDATE movies SET is_active = 0, retired_at = ? WHERE id = ?",
+                [(retired_at, movie_id) for movie_id in retired],
+            )
+            conn.execute("DELETE FROM movie_tombstones WHERE movie_id IN (SELECT id FROM staging_movies)")
 
-    def is_new_movie(self, movie_id):
-        query = "SELECT 1 FROM movies WHERE id = ?"
+            enqueued = 0
+            if channel_chat_id:
+                enqueued += conn.execute("""
+                    INSERT OR IGNORE INTO outbox (recipient, movie_id, channel)
+                    SELECT ?, id, ? FROM staging_movies WHERE is_new = 1 ORDER BY position
+                """, (str(channel_chat_id), CHANNEL_POST)).rowcount
+            if new:
+                first_seen: dict[int, Movie] = {}
+                for m in movies:
+                    first_seen.setdefault(m.id, m)
+                notified = set(conn.execute("""
+                    SELECT telegram_id, movie_id FROM notification_log
+                    WHERE movie_id IN (SELECT id FROM staging_movies WHERE is_new = 1)
+                """).fetchall())
+                with MATCH_SECONDS.time():
+                    matches = self.subscriptions.match_many([first_seen[i] for i in new], notified)
+                digest_users = dict(conn.execute(
+                    "SELECT telegram_id, digest_minutes FROM users WHERE digest_minutes IS NOT NULL"
+                ).fetchall())
+                enqueued += conn.executemany(
+                    "INSERT OR IGNORE INTO outbox (recipient, movie_id, channel) VALUES (?, ?, ?)",
+                    [
+                        (tg_id, movie_id, CHANNEL_DM)
+                        for movie_id, users in matches.items() for tg_id in users if tg_id not in digest_users
+                    ],
+                ).rowcount
+                if digest_users:
+                    # Releases of later cycles join the digest still waiting for its window.
+                    windows = {int(row[0]): row[1] for row in conn.execute("""
+                        SELECT recipient, MIN(next_attempt_at) FROM outbox
+                        WHERE channel = ? AND status = 'pending' AND attempts = 0
+                        GROUP BY recipient
+                    """, (CHANNEL_DIGEST,))}
+                    now = time.time()
+                    due = {
+                        tg_id: windows.get(tg_id, now + minutes * 60) if minutes else now
+                        for tg_id, minutes in digest_users.items()
+                    }
+                    enqueued += conn.executemany(
+                        "INSERT OR IGNORE INTO outbox (recipient, movie_id, channel, next_attempt_at) VALUES (?, ?, ?, ?)",
+                        [
+                            (tg_id, movie_id, CHANNEL_DIGEST, due[tg_id])
+                            for movie_id, users in matches.items() for tg_id in users if tg_id in digest_users
+                        ],
+                    ).rowcount
+                if email:
+                    email_users = {row[0] for row in conn.execute(
+                        "SELECT telegram_id FROM users WHERE email IS NOT NULL AND email_failures < ?",
+                        (EMAIL_MAX_FAILURES,),
+                    )}
+                    enqueued += conn.executemany(
+                        "INSERT OR IGNORE INTO outbox (recipient, movie_id, channel) VALUES (?, ?, ?)",
+                        [
+                            (tg_id, movie_id, CHANNEL_EMAIL)
+                            for movie_id, users in matches.items() for tg_id in users if tg_id in email_users
+                        ],
+                    ).rowcount
+            conn.execute("DELETE FROM staging_movies")
+            conn.execute("DELETE FROM staging_sources")
+            conn.execute("DELETE FROM staging_listings")
+
+        CATALOG_SYNC_SECONDS.observe(time.perf_counter() - started)
+        return CatalogSyncResult(
+            new=new, reappeared=reappeared, changed=changed, retired=retired, enqueued=enqueued,
+        )
+
+    def get_catalog(self) -> list[tuple[Movie, str]]:
+        """Active movies with the UTC time each was first added ("YYYY-MM-DD HH:MM:SS"), newest first."""
         with self._get_connection() as conn:
-            cursor = conn.execute(query, (movie_id,))
-            return cursor.fetchone() is None
+            rows = conn.execute("""
+                SELECT id, title, genre, format, poster_url, ticket_url, source, created_at
+                FROM movies WHERE is_active = 1
+                ORDER BY created_at DESC, id DESC
+            """).fetchall()
+        return [(Movie(*row[:7]), row[7]) for row in rows]
+
+    def delete_inactive_movies(self) -> int:
+        """Prune every retired movie now; see :meth:`prune_retired_movies`. Returns the number pruned."""
+        total = 0
+        while pruned := self.prune_retired_movies(retired_before=time.time() + 1).movies:
+            total += pruned
+        return total
 
-    def update_or_add_movie(self, movie_id, title, genre, format, poster_url):
-        """Adds or updates a movie including its poster URL."""
+    def prune_retired_movies(
+        self, retired_before: float, limit: int = 50, archive_path: str | None = None,
+    ) -> PruneResult:
+        """Replace up to ``limit`` movies retired before ``retired_before`` (unix time) by tombstones.
+
+        The movie row, its notification_log rows and its finished outbox rows
+        are deleted; the tombstone keeps the movie from being announced again
+        if it comes back, so the log rows are no longer needed for
+        idempotency. Movies with pending outbox rows are kept until those are
+        delivered. With ``archive_path``, the deleted movie and log rows are
+        first copied into that SQLite file.
+
+        Retired movies from before retirement times were recorded count as
+        retired now.
+        """
+        now = time.time()
+        conn = self._get_connection()
+        if archive_path:
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS prune_ids (id INTEGER PRIMARY KEY)")
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM prune_ids")
+                conn.execute("UPDATE movies SET retired_at = ? WHERE is_active = 0 AND retired_at IS NULL", (now,))
+                conn.execute("""
+                    INSERT INTO prune_ids (id)
+                    SELECT m.id FROM movies m
+                    WHERE m.is_active = 0
+                      AND m.retired_at < ?
+                      AND NOT EXISTS (SELECT 1 FROM outbox o WHERE o.movie_id = m.id AND o.status = 'pending')
+                    ORDER BY m.retired_at
+                    LIMIT ?
+                """, (retired_before, limit))
+                if archive_path:
+                    conn.execute("CREATE TABLE IF NOT EXISTS archive.movies AS SELECT * FROM main.movies WHERE 0")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS archive.notification_log AS SELECT * FROM main.notification_log WHERE 0"
+                    )
+                    conn.execute("INSERT INTO archive.movies SELECT * FROM main.movies WHERE id IN (SELECT id FROM prune_ids)")
+                    conn.execute("""
+                        INSERT INTO archive.notification_log
+                        SELECT * FROM main.notification_log WHERE movie_id IN (SELECT id FROM prune_ids)
+                    """)
+                conn.execute("""
+                    INSERT OR REPLACE INTO movie_tombstones (movie_id, title, retired_at, pruned_at, notified)
+                    SELECT m.id, m.title, m.retired_at, ?,
+                           (SELECT COUNT(*) FROM notification_log nl WHERE nl.movie_id = m.id)
+                    FROM movies m WHERE m.id IN (SELECT id FROM prune_ids)
+                """, (now,))
+                notifications = conn.execute(
+                    "DELETE FROM notification_log WHERE movie_id IN (SELECT id FROM prune_ids)"
+                ).rowcount
+                outbox = conn.execute("DELETE FROM outbox WHERE movie_id IN (SELECT id FROM prune_ids)").rowcount
+                movies = conn.execute("DELETE FROM movies WHERE id IN (SELECT id FROM prune_ids)").rowcount
+                conn.execute("DELETE FROM prune_ids")
+        finally:
+            if archive_path:
+                conn.execute("DETACH DATABASE archive")
+        return PruneResult(movies=movies, notifications=notifications, outbox=outbox)
+
+    def prune_outbox(self, finished_before: float, limit: int = 5000) -> int:
+        """Delete up to ``limit`` sent or dead-lettered outbox rows last scheduled before ``finished_before``."""
         with self._get_connection() as conn:
+            return conn.execute("""
+                DELETE FROM outbox WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE status IN ('sent', 'dead') AND next_attempt_at < ?
+                    LIMIT ?
+                )
+            """, (finished_before, limit)).rowcount
+
+    def get_showtime_pages_due(
+        self, checked_before: float, movie_ids: Iterable[int] = (), limit: int | None = None,
+    ) -> list[ShowtimePage]:
+        """Active movies whose FilmTheaterPage should be fetched.
+
+        Due are movies never fetched, whose ticket URL changed, last checked
+        before ``checked_before``, or listed in ``movie_ids``. The stored
+        validators come along so the fetch can be conditional; they are
+        dropped when the URL changed.
+        """
+        with self._get_connection() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS due_ids (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM due_ids")
+            conn.executemany("INSERT OR IGNORE INTO due_ids (id) VALUES (?)", [(i,) for i in movie_ids])
+            rows = conn.execute("""
+                SELECT m.id, m.ticket_url, p.url, p.etag, p.last_modified, p.content_hash
+                FROM movies m
+                LEFT JOIN showtime_pages p ON p.movie_id = m.id
+                WHERE m.is_active = 1 AND m.ticket_url IS NOT NULL
+                  AND (p.movie_id IS NULL OR p.url IS NOT m.ticket_url OR p.checked_at < ?
+                       OR m.id IN (SELECT id FROM due_ids))
+                ORDER BY p.checked_at IS NOT NULL, p.checked_at, m.id
+                LIMIT ?
+            """, (checked_before, -1 if limit is None else limit)).fetchall()
+            conn.execute("DELETE FROM due_ids")
+        pages = []
+        for movie_id, url, fetched_url, etag, last_modified, content_hash in rows:
+            if fetched_url == url:
+                state = FetchState(url=url, etag=etag, last_modified=last_modified, content_hash=content_hash)
+            else:
+                state = FetchState(url=url)
+            pages.append(ShowtimePage(movie_id, url, state))
+        return pages
+
+    def save_showtimes(
+        self, page: ShowtimePage, state: FetchState, showtimes: list[Showtime] | None, checked_at: float,
+    ) -> None:
+        """Record a page check; with ``showtimes``, atomically replace the movie's sessions with them."""
+        with self._get_connection() as conn:
+            if showtimes is not None:
+                conn.execute("DELETE FROM showtimes WHERE movie_id = ?", (page.movie_id,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO showtimes (session_id, movie_id, starts_at, room, format) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(s.session_id, page.movie_id, s.starts_at, s.room, s.format) for s in showtimes],
+                )
             conn.execute("""
-                INSERT INTO movies (id, title, genre, format, poster_url, is_active)
-                VALUES (?, ?, ?, ?, ?, 1)
-                ON CONFLICT(id) DO UPDATE SET 
-                    is_active = 1,
-                    poster_url = excluded.poster_url
-            """, (movie_id, title, genre, format, poster_url))
+                INSERT INTO showtime_pages (movie_id, url, etag, last_modified, content_hash, checked_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(movie_id) DO UPDATE SET
+                    url           = excluded.url,
+                    etag          = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash  = excluded.content_hash,
+                    checked_at    = excluded.checked_at
+            """, (page.movie_id, state.url, state.etag, state.last_modified, state.content_hash, checked_at))
+
+    def get_upcoming_showtimes(self, movie_id: int, after: str, limit: int = 10) -> list[Showtime]:
+        """Sessions of a movie starting at or after ``after`` ("YYYY-MM-DD HH:MM", cinema time), soonest first."""
+        with self._get_connection() as conn:
+            rows = conn.execute("""
+                SELECT session_id, movie_id, starts_at, room, format FROM showtimes
+                WHERE movie_id = ? AND starts_at >= ?
+                ORDER BY starts_at
+                LIMIT ?
+            """, (movie_id, after, limit)).fetchall()
+        return [Showtime(*row) for row in rows]
 
-    def delete_inactive_movies(self):
+    def prune_showtimes(self, before: str) -> int:
+        """Delete sessions that started before ``before`` ("YYYY-MM-DD HH:MM", cinema time)."""
         with self._get_connection() as conn:
-            conn.execute("DELETE FROM movies WHERE is_active = 0")
+            return conn.execute("DELETE FROM showtimes WHERE starts_at < ?", (before,)).rowcount
+
+    def prune_billboard_changes(self, before: float) -> int:
+        """Delete billboard change records older than ``before`` (unix time)."""
+        with self._get_connection() as conn:
+            return conn.execute("DELETE FROM billboard_changes WHERE changed_at < ?", (before,)).rowcount
+
+    def compact(self, max_pages: int | None = None) -> CompactResult:
+        """Return free pages to the filesystem, refresh planner statistics and truncate the WAL.
+
+        Databases created before incremental auto-vacuum was enabled are
+        converted first with a one-off full ``VACUUM``. After that at most
+        ``max_pages`` free pages are released per call (all of them if None),
+        so a call never rewrites the whole file.
+        """
+        conn = self._get_connection()
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        converted = conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        if converted:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            conn.execute(f"PRAGMA incremental_vacuum({int(max_pages) if max_pages is not None else 0})").fetchall()
+        # Bounded sampling keeps ANALYZE cheap on large tables.
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        return CompactResult(
+            freed_pages=max(0, free_before - free_after),
+            size_bytes=page_count * page_size,
+            converted=converted,
+        )
 
     def upsert_user(self, user: TelegramUser) -> None:
         """Insert the user or update first_name/username on subsequent /start calls."""
@@ -107,6 +931,142 @@ class Database:
                 "username":    user.username,
             })
 
+    def set_user_email(self, telegram_id: int, email: str | None) -> None:
+        """Set (or with None, clear) the confirmed address a user gets email alerts at, resetting its failure count.
+
+        Any address waiting for confirmation is dropped. Addresses given by
+        users go through :meth:`start_email_verification` instead.
+        """
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE users SET email = ?, email_failures = 0, email_pending = NULL, email_code_hash = NULL,
+                                 email_code_attempts = 0, updated_at = CURRENT_TIMESTAMP
+                WHERE telegram_id = ?
+            """, (email, telegram_id))
+
+    def get_user_email(self, telegram_id: int) -> str | None:
+        """The user's confirmed address."""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT email FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+            return row[0] if row else None
+
+    def get_pending_email(self, telegram_id: int) -> str | None:
+        """The address the user asked for that is still waiting for its confirmation code."""
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT email_pending FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+            return row[0] if row else None
+
+    def start_email_verification(self, telegram_id: int, email: str) -> str | None:
+        """Record ``email`` as the user's unconfirmed address and return a new six-digit code to send to it.
+
+        Only a hash of the code is stored. Returns None, changing nothing, if
+        the user was sent a code less than EMAIL_CODE_INTERVAL seconds ago.
+        The confirmed address, if any, keeps getting alerts until the new
+        one is confirmed.
+        """
+        code = f"{secrets.randbelow(10 ** 6):06d}"
+        now = time.time()
+        with self._get_connection() as conn:
+            updated = conn.execute("""
+                UPDATE users SET email_pending = ?, email_code_hash = ?, email_code_sent_at = ?,
+                                 email_code_attempts = 0, updated_at = CURRENT_TIMESTAMP
+                WHERE telegram_id = ? AND (email_code_sent_at IS NULL OR email_code_sent_at <= ?)
+            """, (email, _hash_code(code), now, telegram_id, now - EMAIL_CODE_INTERVAL)).rowcount
+        return code if updated else None
+
+    def cancel_email_verification(self, telegram_id: int) -> None:
+        """Forget the pending address and its code, e.g. when the code could not be sent."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE users SET email_pending = NULL, email_code_hash = NULL, email_code_sent_at = NULL,
+                                 email_code_attempts = 0
+                WHERE telegram_id = ?
+            """, (telegram_id,))
+
+    def confirm_email(self, telegram_id: int, code: str) -> str | None:
+        """Make the pending address the user's email address if ``code`` is its code. Returns the address.
+
+        A code expires after EMAIL_CODE_TTL seconds or EMAIL_CODE_MAX_ATTEMPTS
+        wrong tries; returns None for a wrong or expired code.
+        """
+        with self._get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("""
+                SELECT email_pending, email_code_hash, email_code_sent_at, email_code_attempts
+                FROM users WHERE telegram_id = ?
+            """, (telegram_id,)).fetchone()
+            if row is None or row[0] is None or row[1] is None:
+                return None
+            pending, code_hash, sent_at, attempts = row
+            if attempts >= EMAIL_CODE_MAX_ATTEMPTS or sent_at + EMAIL_CODE_TTL < time.time():
+                return None
+            if not hmac.compare_digest(code_hash, _hash_code(code)):
+                conn.execute(
+                    "UPDATE users SET email_code_attempts = email_code_attempts + 1 WHERE telegram_id = ?",
+                    (telegram_id,),
+                )
+                return None
+            conn.execute("""
+                UPDATE users SET email = email_pending, email_failures = 0, email_pending = NULL,
+                                 email_code_hash = NULL, email_code_attempts = 0, updated_at = CURRENT_TIMESTAMP
+                WHERE telegram_id = ?
+            """, (telegram_id,))
+            return pending
+
+    def get_user_emails(self, telegram_ids: Iterable[int]) -> dict[int, str]:
+        """Map each of the given users that has an email address to it."""
+        ids = list(telegram_ids)
+        emails: dict[int, str] = {}
+        with self._get_connection() as conn:
+            # Stay well below SQLite's limit on bound parameters.
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                emails.update(conn.execute(
+                    f"SELECT telegram_id, email FROM users "
+                    f"WHERE email IS NOT NULL AND telegram_id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall())
+        return emails
+
+    def record_email_results(self, delivered: Iterable[int], rejected: Iterable[int]) -> None:
+        """Reset the failure count of users whose email was accepted and count a permanent rejection for the others.
+
+        Users reaching ``EMAIL_MAX_FAILURES`` consecutive rejections are no longer sent email.
+        """
+        with self._get_connection() as conn:
+            conn.executemany(
+                "UPDATE users SET email_failures = 0 WHERE telegram_id = ? AND email_failures != 0",
+                [(telegram_id,) for telegram_id in delivered],
+            )
+            conn.executemany(
+                "UPDATE users SET email_failures = email_failures + 1 WHERE telegram_id = ?",
+                [(telegram_id,) for telegram_id in rejected],
+            )
+
+    def set_user_digest(self, telegram_id: int, minutes: int | None) -> None:
+        """Set how a user's subscriber DMs are delivered: ``None`` one per movie, ``0`` one digest per
+        scrape cycle, ``N`` at most one digest every ``N`` minutes.
+
+        A digest already waiting for its window is sent right away.
+        """
+        if minutes is not None and minutes < 0:
+            raise ValueError(f"digest window must be >= 0 minutes, got {minutes}")
+        with self._get_connection() as conn:
+            conn.execute(
+                "UPDATE users SET digest_minutes = ?, updated_at = CURRENT_TIMESTAMP WHERE telegram_id = ?",
+                (minutes, telegram_id),
+            )
+            conn.execute(
+                "UPDATE outbox SET next_attempt_at = ? "
+                "WHERE recipient = ? AND channel = ? AND status = 'pending' AND next_attempt_at > ?",
+                (time.time(), str(telegram_id), CHANNEL_DIGEST, time.time()),
+            )
+
+    def get_user_digest(self, telegram_id: int) -> int | None:
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT digest_minutes FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone()
+            return row[0] if row else None
+
     def get_user_filters(self, telegram_id: int) -> set[tuple[str, str]]:
         """Return the active subscription filters for a user as a set of (filter_type, filter_value) tuples."""
         with self._get_connection() as conn:
@@ -116,42 +1076,77 @@ class Database:
             ).fetchall()
             return {(row[0], row[1]) for row in rows}
 
-    def toggle_filter(self, telegram_id: int, filter_type: str, filter_value: str) -> bool:
-        """Toggle a subscription filter. Returns True if the filter is now active, False if removed."""
+    def apply_filter_changes(self, changes: list[FilterChange]) -> list[bool]:
+        """Apply filter edits in order within a single transaction (one commit for the batch).
+
+        Returns, per change, whether its values are now active: the new state
+        for a toggle, True for "add" and False for "remove".
+        """
+        results: list[bool] = []
         with self._get_connection() as conn:
-            existing = conn.execute(
-                "SELECT 1 FROM subscription_filters WHERE telegram_id = ? AND filter_type = ? AND filter_value = ?",
-                (telegram_id, filter_type, filter_value),
-            ).fetchone()
+            # Taking the write lock first makes the version read here the one
+            # these changes start from.
+            conn.execute("BEGIN IMMEDIATE")
+            before = read_version(conn)
+            for change in changes:
+                if change.action == "toggle":
+                    (value,) = change.values
+                    removed = conn.execute(
+                        "DELETE FROM subscription_filters WHERE telegram_id = ? AND filter_type = ? AND filter_value = ?",
+                        (change.telegram_id, change.filter_type, value),
+                    ).rowcount
+                    if not removed:
+                        conn.execute(
+                            "INSERT INTO subscription_filters (telegram_id, filter_type, filter_value) VALUES (?, ?, ?)",
+                            (change.telegram_id, change.filter_type, value),
+                        )
+                    results.append(not removed)
+                elif change.action == "add":
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO subscription_filters (telegram_id, filter_type, filter_value) "
+                        "VALUES (?, ?, ?)",
+                        [(change.telegram_id, change.filter_type, v) for v in change.values],
+                    )
+                    results.append(True)
+                elif change.action == "remove":
+                    if change.values:
+                        conn.executemany(
+                            "DELETE FROM subscription_filters "
+                            "WHERE telegram_id = ? AND filter_type = ? AND filter_value = ?",
+                            [(change.telegram_id, change.filter_type, v) for v in change.values],
+                        )
+                    else:
+                        conn.execute(
+                            "DELETE FROM subscription_filters WHERE telegram_id = ? AND filter_type = ?",
+                            (change.telegram_id, change.filter_type),
+                        )
+                    results.append(False)
+                else:
+                    raise ValueError(f"Unknown filter change action: {change.action!r}")
+            after = read_version(conn)
 
-            if existing:
-                conn.execute(
-                    "DELETE FROM subscription_filters WHERE telegram_id = ? AND filter_type = ? AND filter_value = ?",
-                    (telegram_id, filter_type, filter_value),
-                )
-                return False
+        # Keep the in-memory index in step once the changes are committed.
+        for change, active in zip(changes, results):
+            if active:
+                self._index_add(change.telegram_id, change.filter_type, list(change.values))
+            else:
+                self._index_discard(change.telegram_id, change.filter_type, list(change.values) or None)
+        index = SubscriptionIndex.loaded_for(self.db_path)
+        if index is not None:
+            index.advance(before, after)
+        return results
 
-            conn.execute(
-                "INSERT INTO subscription_filters (telegram_id, filter_type, filter_value) VALUES (?, ?, ?)",
-                (telegram_id, filter_type, filter_value),
-            )
-            return True
+    def toggle_filter(self, telegram_id: int, filter_type: str, filter_value: str) -> bool:
+        """Toggle a subscription filter. Returns True if the filter is now active, False if removed."""
+        return self.apply_filter_changes([FilterChange("toggle", telegram_id, filter_type, (filter_value,))])[0]
 
     def set_all_filters(self, telegram_id: int, filter_type: str, values: list[str]) -> None:
         """Activate all given filter values for a filter type (idempotent)."""
-        with self._get_connection() as conn:
-            conn.executemany(
-                "INSERT OR IGNORE INTO subscription_filters (telegram_id, filter_type, filter_value) VALUES (?, ?, ?)",
-                [(telegram_id, filter_type, v) for v in values],
-            )
+        self.apply_filter_changes([FilterChange("add", telegram_id, filter_type, tuple(values))])
 
     def remove_all_filters(self, telegram_id: int, filter_type: str) -> None:
         """Remove all filter values for a given filter type."""
-        with self._get_connection() as conn:
-            conn.execute(
-                "DELETE FROM subscription_filters WHERE telegram_id = ? AND filter_type = ?",
-                (telegram_id, filter_type),
-            )
+        self.apply_filter_changes([FilterChange("remove", telegram_id, filter_type)])
 
     def get_matching_subscribers(self, movie_id: int, format_type: str, genre: str) -> list[int]:
         """Return telegram_ids of users whose filters match the given movie attributes.
@@ -181,4 +1176,176 @@ class Database:
             conn.execute(
                 "INSERT OR IGNORE INTO notification_log (telegram_id, movie_id) VALUES (?, ?)",
                 (telegram_id, movie_id),
-            )
\ No newline at end of file
+            )
+
+    def get_fetch_state(self, url: str) -> FetchState:
+        """Return the stored HTTP validators and payload hash for a URL (empty state if never fetched)."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified, content_hash FROM fetch_state WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return FetchState(url=url)
+            return FetchState(url=url, etag=row[0], last_modified=row[1], content_hash=row[2])
+
+    def save_fetch_state(self, state: FetchState) -> None:
+        """Persist the HTTP validators and payload hash of the last processed fetch."""
+        with self._get_connection() as conn:
+            conn.execute("""
+                INSERT INTO fetch_state (url, etag, last_modified, content_hash)
+                VALUES (:url, :etag, :last_modified, :content_hash)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag          = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash  = excluded.content_hash,
+                    updated_at    = CURRENT_TIMESTAMP
+            """, {
+                "url":           state.url,
+                "etag":          state.etag,
+                "last_modified": state.last_modified,
+                "content_hash":  state.content_hash,
+            })
+
+    def record_billboard_change(self, changed_at: float) -> None:
+        """Record when (unix time) the billboard was seen to change; feeds the scrape scheduler."""
+        with self._get_connection() as conn:
+            conn.execute("INSERT INTO billboard_changes (changed_at) VALUES (?)", (changed_at,))
+
+    def get_billboard_changes(self, since: float) -> list[float]:
+        """Return the unix times of billboard changes recorded at or after ``since``."""
+        with self._get_connection() as conn:
+            rows = conn.execute(
+                "SELECT changed_at FROM billboard_changes WHERE changed_at >= ? ORDER BY changed_at",
+                (since,),
+            ).fetchall()
+            return [row[0] for row in rows]
+
+    def lease_outbox(self, limit: int, lease_seconds: float) -> list[OutboxItem]:
+        """Claim up to ``limit`` due outbox rows for ``lease_seconds``.
+
+        Leased rows are invisible to other workers until the lease expires, so a
+        worker that dies mid-send has its rows picked up again (at-least-once).
+
+        Every due digest row of a recipient in the batch is leased with it,
+        even past ``limit``, so a digest is never split across batches.
+        """
+        now = time.time()
+        query = """
+            SELECT o.id, o.recipient, o.channel, o.attempts,
+                   m.id, m.title, m.genre, m.format, m.poster_url, m.ticket_url
+            FROM outbox o
+            JOIN movies m ON m.id = o.movie_id
+            WHERE o.status = 'pending'
+              AND o.next_attempt_at <= ?
+              AND (o.lease_until IS NULL OR o.lease_until <= ?)
+        """
+        with self._get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                f"{query} ORDER BY o.next_attempt_at, o.id LIMIT ?", (now, now, limit),
+            ).fetchall()
+            digest_recipients = sorted({row[1] for row in rows if row[2] == CHANNEL_DIGEST})
+            leased = {row[0] for row in rows}
+            for start in range(0, len(digest_recipients), 500):
+                chunk = digest_recipients[start:start + 500]
+                rows += [
+                    row for row in conn.execute(
+                        f"{query} AND o.channel = ? AND o.recipient IN ({', '.join('?' * len(chunk))}) ORDER BY o.id",
+                        (now, now, CHANNEL_DIGEST, *chunk),
+                    )
+                    if row[0] not in leased
+                ]
+            conn.executemany(
+                "UPDATE outbox SET lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now + lease_seconds, row[0]) for row in rows],
+            )
+        return [
+            OutboxItem(
+                id=row[0], recipient=row[1], channel=row[2], attempts=row[3] + 1,
+                movie=Movie(*row[4:]),
+            )
+            for row in rows
+        ]
+
+    def complete_outbox(self, items: list[OutboxItem]) -> None:
+        """Mark items as delivered and record DMs and emails in notification_log, atomically."""
+        with self._get_connection() as conn:
+            conn.executemany(
+                "UPDATE outbox SET status = 'sent', lease_until = NULL, last_error = NULL WHERE id = ?",
+                [(item.id,) for item in items],
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO notification_log (telegram_id, movie_id) VALUES (?, ?)",
+                [
+                    (int(item.recipient), item.movie.id)
+                    for item in items if item.channel in (CHANNEL_DM, CHANNEL_DIGEST, CHANNEL_EMAIL)
+                ],
+            )
+
+    def fail_outbox(
+        self,
+        item: OutboxItem,
+        error: str | None,
+        max_attempts: int,
+        base_delay: float = 30,
+        max_delay: float = 3600,
+        permanent: bool = False,
+    ) -> bool:
+        """Schedule a retry with jittered exponential backoff, or dead-letter the item.
+
+        Returns True if the item was dead-lettered.
+        """
+        dead = permanent or item.attempts >= max_attempts
+        delay = min(max_delay, base_delay * 2 ** (item.attempts - 1)) * random.uniform(0.5, 1.0)
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE outbox SET
+                    status          = :status,
+                    next_attempt_at = :next_attempt_at,
+                    lease_until     = NULL,
+                    last_error      = :error
+                WHERE id = :id
+            """, {
+                "status":          "dead" if dead else "pending",
+                "next_attempt_at": time.time() + delay,
+                "error":           error,
+                "id":              item.id,
+            })
+        return dead
+
+    def get_poster_file_id(self, poster_url: str) -> str | None:
+        """Return the Telegram file_id stored for a poster URL."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT file_id FROM poster_cache WHERE poster_url = ?", (poster_url,),
+            ).fetchone()
+            return row[0] if row else None
+
+    def get_poster_file_id_by_hash(self, content_hash: str) -> str | None:
+        """Return a Telegram file_id already uploaded for identical poster bytes."""
+        with self._get_connection() as conn:
+            row = conn.execute(
+                "SELECT file_id FROM poster_cache WHERE content_hash = ? ORDER BY updated_at DESC LIMIT 1",
+                (content_hash,),
+            ).fetchone()
+            return row[0] if row else None
+
+    def save_poster_file_id(self, poster_url: str, content_hash: str | None, file_id: str) -> None:
+        with self._get_connection() as conn:
+            conn.execute("""
+                INSERT INTO poster_cache (poster_url, content_hash, file_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT(poster_url) DO UPDATE SET
+                    content_hash = COALESCE(excluded.content_hash, poster_cache.content_hash),
+                    file_id      = excluded.file_id,
+                    updated_at   = CURRENT_TIMESTAMP
+            """, (poster_url, content_hash, file_id))
+
+    def delete_poster_file_id(self, poster_url: str) -> None:
+        with self._get_connection() as conn:
+            # The same file_id may be shared by URLs with identical content.
+            conn.execute(
+                "DELETE FROM poster_cache WHERE file_id IN (SELECT file_id FROM poster_cache WHERE poster_url = ?)",
+                (poster_url,),
+            )
@@ -0,0 +1,213 @@
+"""
+Concurrent, rate-limit-aware delivery of Telegram Bot API calls.
+
+Messages are sent concurrently over one HTTP/1.1 connection pool while staying
+inside Telegram's limits: a global token bucket caps messages per second for
+the whole bot, and each chat gets at most one message per
+``per_chat_interval`` seconds. A 429 answer pauses every sender for the
+``retry_after`` the API asks for and the message is retried. The limits live
+on the dispatcher, so they hold across :meth:`TelegramDispatcher.dispatch`
+calls, each of which runs its own event loop.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import httpx
+
+from metrics import histogram
+
+logger = logging.getLogger("illa_notifier.dispatcher")
+
+# Telegram allows ~30 messages/s overall and ~1 message/s to the same chat.
+DEFAULT_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", "30"))
+DEFAULT_PER_CHAT_INTERVAL = float(os.environ.get("TELEGRAM_PER_CHAT_INTERVAL", "1.0"))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("TELEGRAM_MAX_CONCURRENCY", "32"))
+
+TELEGRAM_REQUEST_SECONDS = histogram(
+    "illa_telegram_request_seconds",
+    "Duration of each Bot API request attempt, by method and outcome (ok, 429, 4xx, 5xx, error).",
+    ["method", "outcome"],
+)
+
+
+def request_outcome(status_code: int | None, ok: bool = True) -> str:
+    """Metric label for the outcome of one Bot API request; ``None`` means it never got an answer."""
+    if status_code is None:
+        return "error"
+    if status_code == 429:
+        return "429"
+    if 200 <= status_code < 300 and ok:
+        return "ok"
+    return "5xx" if status_code >= 500 else "4xx"
+
+
+@dataclass(frozen=True)
+class SendRequest:
+    chat_id: int | str
+    method: str
+    payload: dict
+    files: dict | None = None
+
+
+@dataclass(frozen=True)
+class SendResult:
+    chat_id: int | str
+    ok: bool
+    status_code: int | None = None
+    error: str | None = None
+    attempts: int = 1
+    response: dict | None = None
+
+
+class TokenBucket:
+    """Token bucket for asyncio senders: ``rate`` tokens per second, bursts up to ``capacity``.
+
+    Senders reserve a token and sleep until it is due, so the bucket holds no
+    asyncio primitives and can be shared by several event loops (and threads).
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        # Token balance as of ``_updated``; negative while reservations are outstanding.
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._pauses = 0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds`` (used on 429 flood control)."""
+        with self._lock:
+            self._updated = max(self._updated, time.monotonic() + seconds)
+            self._tokens = 0
+            self._pauses += 1
+
+    def _reserve(self) -> tuple[float, int]:
+        """Take a token and return when it may be used, plus the pause count it was taken under."""
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            return self._updated + max(0.0, -self._tokens) / self.rate, self._pauses
+
+    async def acquire(self) -> None:
+        while True:
+            ready_at, pauses = self._reserve()
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if pauses == self._pauses:
+                return
+            # Flood control paused the bucket while this sender waited: queue again behind the pause.
+
+
+class TelegramDispatcher:
+    def __init__(
+        self,
+        api_url: str,
+        global_rate: float = DEFAULT_GLOBAL_RATE,
+        per_chat_interval: float = DEFAULT_PER_CHAT_INTERVAL,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_attempts: int = 4,
+        timeout: float = 30,
+    ) -> None:
+        self.api_url = api_url
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._bucket = TokenBucket(global_rate)
+        # Earliest time each chat may get its next message.
+        self._next_slot: dict[int | str, float] = {}
+        self._slot_lock = threading.Lock()
+
+    def _forget_idle_chats(self) -> None:
+        now = time.monotonic()
+        with self._slot_lock:
+            self._next_slot = {chat_id: slot for chat_id, slot in self._next_slot.items() if slot > now}
+
+    async def _wait_for_chat(self, chat_id: int | str) -> None:
+        with self._slot_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(chat_id, 0.0))
+            self._next_slot[chat_id] = slot + self.per_chat_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _send_one(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        request: SendRequest,
+    ) -> SendResult:
+        error = None
+        status_code = None
+        for attempt in range(1, self.max_attempts + 1):
+            await self._wait_for_chat(request.chat_id)
+            await self._bucket.acquire()
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        f"{self.api_url}{request.method}", data=request.payload, files=request.files,
+                    )
+                except httpx.HTTPError as e:
+                    TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, outcome="error")
+                    error, status_code = str(e) or type(e).__name__, None
+                    await asyncio.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.0))
+                    continue
+
+            status_code = response.status_code
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+            TELEGRAM_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                outcome=request_outcome(status_code, body.get("ok", True)),
+            )
+
+            if response.is_success and body.get("ok", True):
+                return SendResult(request.chat_id, True, status_code, attempts=attempt, response=body)
+
+            error = body.get("description") or response.reason_phrase
+            if status_code == 429:
+                retry_after = float((body.get("parameters") or {}).get("retry_after", 1))
+                logger.warning("Flood control hit; pausing sends for %.1fs", retry_after)
+                self._bucket.pause(retry_after)
+                continue
+            if status_code >= 500:
+                await asyncio.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.0))
+                continue
+            # Other 4xx (blocked bot, chat not found, bad request) will not succeed on retry.
+            return SendResult(request.chat_id, False, status_code, error, attempt, body)
+
+        return SendResult(request.chat_id, False, status_code, error, self.max_attempts)
+
+    async def send_many(self, requests: Iterable[SendRequest]) -> list[SendResult]:
+        """Send all requests concurrently and return one result per request, in order."""
+        requests = list(requests)
+        if not requests:
+            return []
+        self._forget_idle_chats()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            return list(await asyncio.gather(*(
+                self._send_one(client, semaphore, request)
+                for request in requests
+            )))
+
+    def dispatch(self, requests: Iterable[SendRequest]) -> list[SendResult]:
+        """Blocking wrapper around :meth:`send_many` for synchronous callers."""
+        return asyncio.run(self.send_many(requests))
@@ -0,0 +1,373 @@
+"""
+Email delivery of movie alerts over a pool of persistent SMTP connections.
+
+Each movie's alert is rendered and serialised once; subscribers are then sent
+the same bytes in envelope batches (one ``MAIL``, up to ``SMTP_BATCH_SIZE``
+``RCPT``s, one ``DATA``). When the server offers PIPELINING (RFC 2920) a whole
+envelope goes out in a single write, so a batch costs two round trips instead
+of one per recipient. Batches are sent concurrently over at most
+``SMTP_POOL_SIZE`` connections that stay open between batches and outbox
+drains, and a limiter keeps the rate at ``SMTP_RATE`` recipients per second.
+
+The server's answer to each ``RCPT`` is reported per recipient, so one bad
+address neither fails nor re-sends the rest of its batch.
+"""
+import logging
+import os
+import re
+import smtplib
+import ssl
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import formatdate, make_msgid
+from functools import lru_cache
+from html import escape
+from typing import Optional
+
+from database import EMAIL_CODE_TTL
+from dispatcher import SendResult
+from messages import DM_TEMPLATE, TEMPLATES
+from metrics import counter, histogram
+
+logger = logging.getLogger("illa_notifier.emailer")
+
+SECURITY_MODES = ("starttls", "ssl", "none")
+# A pooled connection idle for longer is checked with NOOP before reuse.
+IDLE_CHECK_SECONDS = 30
+
+SMTP_CONNECTIONS = counter("illa_smtp_connections_total", "SMTP connections opened by the email sender.")
+EMAIL_TRANSACTION_SECONDS = histogram(
+    "illa_email_transaction_seconds",
+    "Duration of one SMTP envelope (MAIL, RCPTs, DATA) by outcome (ok, partial, failed, error).",
+    ["outcome"],
+)
+
+
+@dataclass(frozen=True)
+class SMTPConfig:
+    host: str
+    sender: str
+    port: int = 587
+    username: str = ""
+    password: str = ""
+    security: str = "starttls"
+    pool_size: int = 4
+    # Recipients per envelope; most relays accept at least 100.
+    batch_size: int = 50
+    # Recipients per second across all connections; 0 disables the limit.
+    rate: float = 30.0
+    timeout: float = 30.0
+
+    def __post_init__(self) -> None:
+        if self.security not in SECURITY_MODES:
+            raise ValueError(f"SMTP_SECURITY must be one of {', '.join(SECURITY_MODES)}, got {self.security!r}")
+        if "@" not in self.sender:
+            raise ValueError("EMAIL_FROM must be set to the sender's email address")
+        if self.pool_size < 1 or self.batch_size < 1:
+            raise ValueError("SMTP_POOL_SIZE and SMTP_BATCH_SIZE must be at least 1")
+
+    @classmethod
+    def from_env(cls) -> Optional["SMTPConfig"]:
+        """The configuration from the environment, or None when ``SMTP_HOST`` is not set (email disabled)."""
+        host = os.environ.get("SMTP_HOST", "")
+        if not host:
+            return None
+        security = os.environ.get("SMTP_SECURITY", "starttls").lower()
+        return cls(
+            host=host,
+            sender=os.environ.get("EMAIL_FROM", ""),
+            port=int(os.environ.get("SMTP_PORT", "465" if security == "ssl" else "587")),
+            username=os.environ.get("SMTP_USERNAME", ""),
+            password=os.environ.get("SMTP_PASSWORD", ""),
+            security=security,
+            pool_size=int(os.environ.get("SMTP_POOL_SIZE", "4")),
+            batch_size=int(os.environ.get("SMTP_BATCH_SIZE", "50")),
+            rate=float(os.environ.get("SMTP_RATE", "30")),
+            timeout=float(os.environ.get("SMTP_TIMEOUT", "30")),
+        )
+
+
+@dataclass(frozen=True)
+class RenderedEmail:
+    """Recipient-independent alert; recipients only appear in the envelope."""
+    subject: str
+    text: str
+    html: str
+
+    def as_bytes(self, sender: str) -> bytes:
+        """The complete message, CRLF-terminated and ready for ``DATA``."""
+        message = EmailMessage()
+        message["Subject"] = self.subject
+        message["From"] = sender
+        # Recipients are only in the envelope, as with Bcc.
+        message["To"] = sender
+        message["Date"] = formatdate(localtime=True)
+        message["Message-ID"] = make_msgid(domain=sender.rpartition("@")[2])
+        message.set_content(self.text)
+        message.add_alternative(self.html, subtype="html")
+        return message.as_bytes(policy=SMTP_POLICY)
+
+
+@lru_cache(maxsize=512)
+def render_email(
+    title: str,
+    genre: Optional[str],
+    format_type: Optional[str],
+    poster_url: Optional[str] = None,
+    ticket_url: Optional[str] = None,
+) -> RenderedEmail:
+    """Render (and memoise) the email version of a subscriber alert."""
+    tpl = TEMPLATES[(DM_TEMPLATE, "es")]
+    # The Telegram header is Markdown; email gets it without the markup.
+    header = tpl.header.replace("*", "")
+    fields = [(tpl.title_label, title), (tpl.genre_label, genre), (tpl.language_label, format_type)]
+    footer = "Para dejar de recibir estos correos, envía /email off al bot."
+
+    text = f"{header}\n\n" + "".join(f"{label}: {value}\n" for label, value in fields)
+    if ticket_url:
+        text += f"\n{tpl.button_text}: {ticket_url}\n"
+    text += f"\n--\n{footer}\n"
+
+    html = [f"<h2>{escape(header)}</h2>"]
+    if poster_url:
+        html.append(f'<p><img src="{escape(poster_url)}" alt="{escape(title)}" width="240"></p>')
+    html.append("<ul>" + "".join(f"<li><b>{escape(label)}:</b> {escape(str(value))}</li>" for label, value in fields) + "</ul>")
+    if ticket_url:
+        html.append(f'<p><a href="{escape(ticket_url)}">{escape(tpl.button_text)}</a></p>')
+    html.append(f'<p style="color:#888;font-size:small">{escape(footer)}</p>')
+
+    return RenderedEmail(subject=f"{header}: {title}", text=text, html="\n".join(html))
+
+
+def render_confirmation(code: str) -> RenderedEmail:
+    """The message carrying the code that confirms an address given with /email."""
+    hours = max(1, EMAIL_CODE_TTL // 3600)
+    subject = "Confirma tu correo para las alertas de Cinemes Illa"
+    instructions = (
+        f"Envíalo al bot con /email {code} para recibir tus alertas también por correo. "
+        f"Caduca en {hours} hora{'s' if hours != 1 else ''}."
+    )
+    ignore = "Si no lo has pedido tú, ignora este mensaje: no te enviaremos nada más."
+    text = f"Tu código de confirmación es: {code}\n\n{instructions}\n\n{ignore}\n"
+    html = (
+        f"<p>Tu código de confirmación es: <b>{escape(code)}</b></p>\n"
+        f"<p>{escape(instructions)}</p>\n"
+        f'<p style="color:#888;font-size:small">{escape(ignore)}</p>'
+    )
+    return RenderedEmail(subject=subject, text=text, html=html)
+
+
+class RateLimiter:
+    """Spaces out ``rate`` units per second across threads; 0 disables it."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, units: int = 1) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + units * self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _close(conn: smtplib.SMTP) -> None:
+    try:
+        conn.quit()
+    except (smtplib.SMTPException, OSError):
+        conn.close()
+
+
+class SMTPPool:
+    """At most ``pool_size`` authenticated connections, kept open between uses."""
+
+    def __init__(self, config: SMTPConfig) -> None:
+        self.config = config
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._slots = threading.BoundedSemaphore(config.pool_size)
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        config = self.config
+        if config.security == "ssl":
+            conn = smtplib.SMTP_SSL(config.host, config.port, timeout=config.timeout, context=ssl.create_default_context())
+        else:
+            conn = smtplib.SMTP(config.host, config.port, timeout=config.timeout)
+        try:
+            conn.ehlo()
+            if config.security == "starttls":
+                conn.starttls(context=ssl.create_default_context())
+                conn.ehlo()
+            if config.username:
+                conn.login(config.username, config.password)
+        except BaseException:
+            conn.close()
+            raise
+        SMTP_CONNECTIONS.inc()
+        return conn
+
+    def _take_idle(self) -> smtplib.SMTP | None:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                conn, last_used = self._idle.pop()
+            if time.monotonic() - last_used < IDLE_CHECK_SECONDS:
+                return conn
+            # Servers drop idle sessions after a few minutes.
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        """Borrow a connection, opening one if none is idle; it is closed rather than returned if the block raises."""
+        with self._slots:
+            conn = self._take_idle() or self._connect()
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            _close(conn)
+
+
+Refused = dict[str, tuple[int, bytes]]
+
+
+def _dot_stuff(data: bytes) -> bytes:
+    data = re.sub(rb"(?m)^\.", b"..", data)
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+def send_envelope(conn: smtplib.SMTP, sender: str, recipients: list[str], data: bytes) -> Refused:
+    """Send ``data`` to ``recipients`` in one transaction. Returns the recipients not accepted, with the server's reply.
+
+    Protocol errors raise ``smtplib.SMTPException``/``OSError`` and leave the
+    connection unusable.
+    """
+    if not conn.has_extn("pipelining"):
+        try:
+            return conn.sendmail(sender, recipients, data)
+        except smtplib.SMTPRecipientsRefused as e:
+            return e.recipients
+        except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+            return {recipient: (e.smtp_code, e.smtp_error) for recipient in recipients}
+
+    # MAIL, every RCPT and DATA in one write; the replies arrive in the same order.
+    conn.send("".join([f"MAIL FROM:<{sender}>\r\n", *(f"RCPT TO:<{r}>\r\n" for r in recipients), "DATA\r\n"]))
+    mail_reply = conn.getreply()
+    rcpt_replies = [conn.getreply() for _ in recipients]
+    data_reply = conn.getreply()
+    if mail_reply[0] != 250:
+        conn.rset()
+        return {recipient: mail_reply for recipient in recipients}
+    refused = {r: reply for r, reply in zip(recipients, rcpt_replies) if reply[0] not in (250, 251)}
+    if data_reply[0] != 354:
+        # No recipient was accepted (or the server refused DATA): nothing was sent.
+        conn.rset()
+        return {recipient: refused.get(recipient, data_reply) for recipient in recipients}
+    conn.send(_dot_stuff(data))
+    reply = conn.getreply()
+    if reply[0] != 250:
+        return {recipient: refused.get(recipient, reply) for recipient in recipients}
+    return refused
+
+
+class EmailNotifier:
+    def __init__(self, config: SMTPConfig) -> None:
+        self.config = config
+        self.pool = SMTPPool(config)
+        self.limiter = RateLimiter(config.rate)
+        self._executor = ThreadPoolExecutor(max_workers=config.pool_size, thread_name_prefix="smtp")
+
+    @classmethod
+    def from_env(cls) -> Optional["EmailNotifier"]:
+        config = SMTPConfig.from_env()
+        return cls(config) if config is not None else None
+
+    def _send_batch(self, batch: list[tuple[int, str]], data: bytes) -> list[SendResult]:
+        self.limiter.acquire(len(batch))
+        addresses = [address for _, address in batch]
+        started = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                with self.pool.connection() as conn:
+                    refused = send_envelope(conn, self.config.sender, addresses, data)
+                break
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                # Most likely a pooled connection the server had closed; retry once on a new one.
+                if attempt == 1:
+                    continue
+                error = f"{type(e).__name__}: {e}"
+            except (smtplib.SMTPException, OSError) as e:
+                error = f"{type(e).__name__}: {e}"
+            EMAIL_TRANSACTION_SECONDS.observe(time.perf_counter() - started, outcome="error")
+            logger.warning("Email batch of %d recipient(s) failed: %s", len(batch), error)
+            return [SendResult(telegram_id, False, error=error) for telegram_id, _ in batch]
+
+        outcome = "ok" if not refused else "failed" if len(refused) == len(addresses) else "partial"
+        EMAIL_TRANSACTION_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        results = []
+        for telegram_id, address in batch:
+            reply = refused.get(address)
+            if reply is None:
+                results.append(SendResult(telegram_id, True, 250))
+            else:
+                code, message = reply
+                results.append(SendResult(telegram_id, False, code, message.decode("utf-8", "replace")))
+        return results
+
+    def send_emails(
+        self,
+        recipients: list[tuple[int, str]],
+        title: str,
+        genre: str,
+        format_type: str,
+        poster_url: Optional[str],
+        ticket_url: Optional[str] = None,
+    ) -> list[SendResult]:
+        """Email the same movie alert to ``(telegram_id, address)`` recipients.
+
+        Returns one result per recipient, in order, with ``chat_id`` set to the
+        telegram id and ``status_code`` to the SMTP reply code (None when the
+        connection failed).
+        """
+        if not recipients:
+            return []
+        data = render_email(title, genre, format_type, poster_url, ticket_url).as_bytes(self.config.sender)
+        size = self.config.batch_size
+        batches = [recipients[i:i + size] for i in range(0, len(recipients), size)]
+        return [result for results in self._executor.map(lambda b: self._send_batch(b, data), batches) for result in results]
+
+    def send_confirmation(self, telegram_id: int, address: str, code: str) -> SendResult:
+        """Email a confirmation code to an address a user gave, from the calling thread."""
+        data = render_confirmation(code).as_bytes(self.config.sender)
+        return self._send_batch([(telegram_id, address)], data)[0]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.pool.close()
@@ -0,0 +1,165 @@
+"""
+Targeted extraction of the ``<cinemaindexpage>`` Vue component payload.
+
+The homepage embeds the whole billboard as html-escaped JSON in the attributes
+of a single ``<Cinemaindexpage>`` tag. Instead of building a full parse tree of
+the page, the fast path scans the (streamed) response for that opening tag,
+reads its attributes and stops. BeautifulSoup is kept as a fallback in case the
+markup changes and the scanner can no longer locate the component.
+"""
+import html
+import json
+import logging
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+logger = logging.getLogger("illa_notifier.extractor")
+
+COMPONENT_TAG = "cinemaindexpage"
+POSTERS_ATTR = ":postersurl"
+TITLES_ATTR = ":onlytitlesinfo"
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_TAG_START_RE = re.compile(rf"<{COMPONENT_TAG}\b", re.IGNORECASE)
+_ATTR_STEP_RE = re.compile(r"\s+([^\s=>/]+)(?:\s*=\s*(?:'([^']*)'|\"([^\"]*)\"|([^\s'\">]+)))?")
+_TAG_END_RE = re.compile(r"\s*/?>")
+_NON_SPACE_RE = re.compile(r"\S")
+_OPEN_VALUE_RE = re.compile(r"\s+[^\s=>/]+\s*=\s*(['\"])")
+
+
+class ExtractionError(RuntimeError):
+    """Raised when the billboard component cannot be found in the page."""
+
+
+@dataclass(frozen=True)
+class BillboardPayload:
+    poster_base_url: str
+    movies: list[dict]
+    titles_json: str
+
+
+def scan_component_attrs(
+    chunks: Iterable[str],
+    names: Iterable[str] = (POSTERS_ATTR, TITLES_ATTR),
+) -> tuple[dict[str, str] | None, str]:
+    """Scan text chunks for the component's opening tag and return the wanted attributes.
+
+    The tag is tokenised incrementally as chunks arrive and ``chunks`` stops
+    being consumed once every attribute in ``names`` has been read or the tag
+    is closed. Only those attributes are html-unescaped. Returns the attributes
+    (or None if the opening tag was not found complete) and the text buffered
+    so far, so callers can fall back to a full parse.
+    """
+    wanted = {name.lower() for name in names}
+    attrs: dict[str, str] = {}
+    buf = ""
+    pos = -1
+    open_quote = ""
+    for chunk in chunks:
+        if open_quote and open_quote not in chunk:
+            # Still inside a quoted value: nothing new to tokenise yet.
+            buf += chunk
+            continue
+        search_from = max(len(buf) - len(COMPONENT_TAG) - 1, 0)
+        buf += chunk
+        if pos < 0:
+            found = _TAG_START_RE.search(buf, search_from)
+            if found is None:
+                continue
+            pos = found.end()
+        while True:
+            step = _ATTR_STEP_RE.match(buf, pos)
+            # A token touching the end of the buffer may still be truncated, and
+            # a bare name followed by '=' means its quoted value is incomplete.
+            following = _NON_SPACE_RE.search(buf, step.end()) if step is not None else None
+            if following is not None and (step.lastindex > 1 or following.group() != "="):
+                name = step.group(1).lower()
+                if name in wanted and name not in attrs:
+                    value = next((v for v in step.group(2, 3, 4) if v is not None), "")
+                    attrs[name] = html.unescape(value)
+                    if len(attrs) == len(wanted):
+                        return attrs, buf
+                pos = step.end()
+                continue
+            if _TAG_END_RE.match(buf, pos) is not None:
+                return attrs, buf
+            pending = _OPEN_VALUE_RE.match(buf, pos)
+            open_quote = pending.group(1) if pending is not None else ""
+            break
+    return None, buf
+
+
+def _soup_component_attrs(text: str) -> dict[str, str] | None:
+    """Full-parse fallback: locate the component with BeautifulSoup."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(text, "html.parser")
+    vue_component = soup.find(COMPONENT_TAG)
+    if not vue_component:
+        return None
+    return {name: value for name, value in vue_component.attrs.items() if isinstance(value, str)}
+
+
+def _decode_payload(attrs: dict[str, str]) -> BillboardPayload:
+    titles_json = attrs.get(TITLES_ATTR, "[]")
+    return BillboardPayload(
+        poster_base_url=json.loads(attrs.get(POSTERS_ATTR, '""')),
+        movies=json.loads(titles_json),
+        titles_json=titles_json,
+    )
+
+
+def _extract(chunks: Iterable[str], remainder: Iterable[str] = ()) -> BillboardPayload:
+    attrs, buf = scan_component_attrs(chunks)
+    if attrs is None:
+        logger.warning("Fast scan could not locate <%s>; falling back to full parse", COMPONENT_TAG)
+        attrs = _soup_component_attrs(buf + "".join(remainder))
+        if attrs is None:
+            raise ExtractionError(f"Component <{COMPONENT_TAG}> not found.")
+    return _decode_payload(attrs)
+
+
+def extract_billboard(text: str) -> BillboardPayload:
+    """Extract the billboard payload from an already downloaded page."""
+    return _extract((text[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(text), STREAM_CHUNK_SIZE)))
+
+
+def extract_billboard_from_response(response) -> BillboardPayload:
+    """Extract the billboard payload from a ``requests`` response opened with ``stream=True``.
+
+    Reading stops once the component's opening tag has been received, so the
+    rest of the page is never downloaded or decoded.
+    """
+    if response.encoding is None:
+        response.encoding = "utf-8"
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE, decode_unicode=True)
+    return _extract(chunks, remainder=chunks)
+
+
+# Any Vue prop (``:name='...'``) of any component, for pages whose component
+# name is not known in advance.
+_PROP_RE = re.compile(r"""\s:[\w-]+\s*=\s*(?:'([^']*)'|"([^"]*)")""")
+SESSION_KEY = "ID_Pase"
+
+
+def extract_sessions(text: str) -> list[dict]:
+    """Return the session records (dicts with an ``ID_Pase``) embedded in any component prop of the page.
+
+    Used for the per-movie ``FilmTheaterPage``; the homepage's
+    ``:fullsessionsinfo`` prop has the same records. Props that are not JSON
+    lists of session records are skipped without being decoded.
+    """
+    sessions: list[dict] = []
+    for match in _PROP_RE.finditer(text):
+        raw = match.group(1) if match.group(1) is not None else match.group(2)
+        if SESSION_KEY not in raw:
+            continue
+        try:
+            value = json.loads(html.unescape(raw))
+        except ValueError:
+            continue
+        if isinstance(value, list):
+            sessions.extend(item for item in value if isinstance(item, dict) and SESSION_KEY in item)
+    return sessions
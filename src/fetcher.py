@@ -0,0 +1,108 @@
+"""
+Conditional fetching of the cinema homepage.
+
+Keeps the ETag/Last-Modified validators and a hash of the extracted billboard
+in the database so that a cycle can be skipped when the server answers
+``304 Not Modified`` or the billboard content has not changed.
+"""
+import hashlib
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass, replace
+
+import requests
+
+from database import Database, FetchState
+from extractor import BillboardPayload, extract_billboard_from_response
+
+logger = logging.getLogger("illa_notifier.fetcher")
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+}
+
+
+@dataclass(frozen=True)
+class FetchResult:
+    state: FetchState
+    payload: BillboardPayload | None
+    changed: bool
+
+
+def payload_hash(payload: BillboardPayload) -> str:
+    """Stable hash of the parts of the payload the pipeline depends on."""
+    digest = hashlib.sha256()
+    digest.update(payload.poster_base_url.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(payload.titles_json.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class BillboardFetcher:
+    def __init__(
+        self,
+        db: Database,
+        url: str,
+        headers: dict[str, str] | None = None,
+        timeout: float = 20,
+        session: requests.Session | None = None,
+        extract: Callable[[requests.Response], BillboardPayload] = extract_billboard_from_response,
+    ) -> None:
+        self.db = db
+        self.url = url
+        self.headers = headers or DEFAULT_HEADERS
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.extract = extract
+
+    def fetch(self) -> FetchResult:
+        """Fetch the billboard, sending the stored validators as a conditional request.
+
+        ``changed`` is False when the server answered 304 or the extracted
+        payload hashes to the value stored by the last committed cycle.
+        """
+        previous = self.db.get_fetch_state(self.url)
+        result = self.fetch_from(previous)
+        self.refresh_validators(previous, result)
+        return result
+
+    def fetch_from(self, previous: FetchState) -> FetchResult:
+        """The network half of :meth:`fetch`: it does not touch the database, so it can run on any thread."""
+        headers = dict(self.headers)
+        if previous.etag:
+            headers["If-None-Match"] = previous.etag
+        if previous.last_modified:
+            headers["If-Modified-Since"] = previous.last_modified
+
+        with self.session.get(self.url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == requests.codes.not_modified:
+                logger.info("%s not modified (304)", self.url)
+                return FetchResult(state=previous, payload=None, changed=False)
+            response.raise_for_status()
+            payload = self.extract(response)
+            state = replace(
+                previous,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                content_hash=payload_hash(payload),
+            )
+
+        if state.content_hash == previous.content_hash:
+            logger.info("%s content hash unchanged", self.url)
+            return FetchResult(state=state, payload=payload, changed=False)
+        return FetchResult(state=state, payload=payload, changed=True)
+
+    def refresh_validators(self, previous: FetchState, result: FetchResult) -> None:
+        """Store new validators of an unchanged billboard so the next request can be answered with a 304."""
+        if result.changed:
+            return
+        if (result.state.etag, result.state.last_modified) != (previous.etag, previous.last_modified):
+            self.db.save_fetch_state(result.state)
+
+    def commit(self, result: FetchResult) -> None:
+        """Persist the validators and hash once the cycle has been fully processed.
+
+        Committing only after processing means a crashed cycle is retried on the
+        next poll instead of being skipped as unchanged.
+        """
+        self.db.save_fetch_state(result.state)
@@ -0,0 +1,93 @@
+"""
+Write-through cache of users' subscription filters for the bot.
+
+Button taps in /alertas read the user's filters to redraw the keyboard right
+after changing them. Keeping the filter set in memory and applying each change
+locally after the database write means a tap costs a single DB write.
+"""
+import threading
+from collections import OrderedDict
+
+from database import Database, FilterChange
+
+DEFAULT_MAX_USERS = 10_000
+
+
+class UserFilterCache:
+    def __init__(self, db: Database, max_users: int = DEFAULT_MAX_USERS) -> None:
+        self.db = db
+        self.max_users = max_users
+        self._filters: OrderedDict[int, frozenset[tuple[str, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, telegram_id: int, filters: frozenset[tuple[str, str]]) -> frozenset[tuple[str, str]]:
+        with self._lock:
+            self._filters[telegram_id] = filters
+            self._filters.move_to_end(telegram_id)
+            while len(self._filters) > self.max_users:
+                self._filters.popitem(last=False)
+        return filters
+
+    def peek(self, telegram_id: int) -> frozenset[tuple[str, str]] | None:
+        """Return the cached filters without touching the database, or None on a miss."""
+        with self._lock:
+            return self._filters.get(telegram_id)
+
+    def get(self, telegram_id: int) -> frozenset[tuple[str, str]]:
+        """Return the user's filters, loading them from the database on a miss."""
+        with self._lock:
+            filters = self._filters.get(telegram_id)
+            if filters is not None:
+                self._filters.move_to_end(telegram_id)
+                return filters
+        return self._put(telegram_id, frozenset(self.db.get_user_filters(telegram_id)))
+
+    @staticmethod
+    def _after(filters: frozenset[tuple[str, str]], change: FilterChange, active: bool) -> frozenset[tuple[str, str]]:
+        if active:
+            return filters | {(change.filter_type, v) for v in change.values}
+        if change.values:
+            return filters - {(change.filter_type, v) for v in change.values}
+        return frozenset(f for f in filters if f[0] != change.filter_type)
+
+    def apply(self, changes: list[FilterChange]) -> list[tuple[bool, frozenset[tuple[str, str]]]]:
+        """Apply a batch of changes in one database transaction.
+
+        Besides the ``Database.apply_filter_changes`` actions, a "toggle_all"
+        change selects every given value, or clears the filter type if they are
+        all active at that point in the batch. Returns, per change, whether its
+        values are now active and the user's filter set right after it.
+        """
+        predicted = {tid: self.get(tid) for tid in {c.telegram_id for c in changes}}
+        resolved = []
+        for change in changes:
+            current = predicted[change.telegram_id]
+            if change.action == "toggle_all":
+                if all((change.filter_type, v) in current for v in change.values):
+                    change = FilterChange("remove", change.telegram_id, change.filter_type)
+                else:
+                    change = FilterChange("add", change.telegram_id, change.filter_type, change.values)
+            expected = change.action == "add" or (
+                change.action == "toggle" and (change.filter_type, change.values[0]) not in current
+            )
+            predicted[change.telegram_id] = self._after(current, change, expected)
+            resolved.append(change)
+
+        results = []
+        states = {tid: self.get(tid) for tid in predicted}
+        for change, active in zip(resolved, self.db.apply_filter_changes(resolved)):
+            states[change.telegram_id] = self._after(states[change.telegram_id], change, active)
+            results.append((active, states[change.telegram_id]))
+        for telegram_id, filters in states.items():
+            self._put(telegram_id, filters)
+        return results
+
+    def toggle(self, telegram_id: int, filter_type: str, filter_value: str) -> tuple[bool, frozenset[tuple[str, str]]]:
+        """Toggle a filter; returns whether it is now active and the updated filter set."""
+        return self.apply([FilterChange("toggle", telegram_id, filter_type, (filter_value,))])[0]
+
+    def set_all(self, telegram_id: int, filter_type: str, values: list[str]) -> frozenset[tuple[str, str]]:
+        return self.apply([FilterChange("add", telegram_id, filter_type, tuple(values))])[0][1]
+
+    def remove_all(self, telegram_id: int, filter_type: str) -> frozenset[tuple[str, str]]:
+        return self.apply([FilterChange("remove", telegram_id, filter_type)])[0][1]
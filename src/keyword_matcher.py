@@ -0,0 +1,132 @@
+"""
+Aho-Corasick matching of subscribers' title keywords.
+
+Every user's watchlist keywords ("dune", "pixar", "star wars") go into one
+automaton, so a movie title is matched against all of them in a single pass
+over its characters, however many users and keywords there are.
+
+Keywords and titles are normalised the same way (case, accents and
+punctuation folded, see :func:`normalize_keyword`) and match on whole words:
+"dune" matches "DUNE: PARTE DOS" but not "DUNES".
+
+The automaton changes only when the set of distinct keywords does: a new
+keyword is inserted into the existing trie, and a removed one just loses its
+output, with the trie compacted once removed keywords outnumber live ones.
+Failure links are recomputed lazily, once, on the next match after a change,
+so a burst of edits costs a single relink.
+"""
+import re
+import unicodedata
+from collections import deque
+from collections.abc import Iterable
+
+_NON_WORD_RE = re.compile(r"[^0-9a-z]+")
+
+# Compact the trie only past this many removed keywords.
+MIN_COMPACT = 64
+
+
+def normalize_keyword(text: str) -> str:
+    """Fold case, accents and punctuation: ``"¡Spider-Man: Cruzando!"`` -> ``"spider man cruzando"``."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    ascii_text = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(" ", ascii_text).strip()
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over normalised keywords. Not thread-safe; callers lock."""
+
+    def __init__(self, keywords: Iterable[str] = ()) -> None:
+        self._reset()
+        for keyword in keywords:
+            self.add(keyword)
+
+    def _reset(self) -> None:
+        # Node 0 is the root. Per node: transitions, failure link, the keyword
+        # ending there (if any) and the nearest node on its failure chain that
+        # ends a keyword (0 for none).
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[str | None] = [None]
+        self._output_link: list[int] = [0]
+        self._terminal: dict[str, int] = {}
+        self._removed = 0
+        self._stale = False
+
+    def __len__(self) -> int:
+        return len(self._terminal)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._terminal
+
+    def add(self, keyword: str) -> None:
+        """Add a normalised keyword; adding one already present does nothing."""
+        if not keyword or keyword in self._terminal:
+            return
+        node = 0
+        # Padding with spaces makes every match a whole-word match.
+        for ch in f" {keyword} ":
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._output_link.append(0)
+                self._goto[node][ch] = nxt
+            node = nxt
+        self._output[node] = keyword
+        self._terminal[keyword] = node
+        self._stale = True
+
+    def remove(self, keyword: str) -> None:
+        node = self._terminal.pop(keyword, None)
+        if node is None:
+            return
+        self._output[node] = None
+        self._removed += 1
+        self._stale = True
+        if self._removed > max(MIN_COMPACT, len(self._terminal)):
+            live = list(self._terminal)
+            self._reset()
+            for kw in live:
+                self.add(kw)
+
+    def _link(self) -> None:
+        """Recompute failure and output links breadth-first over the whole trie."""
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            output_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                output_link[child] = fail[child] if output[fail[child]] is not None else output_link[fail[child]]
+                queue.append(child)
+        self._stale = False
+
+    def find(self, text: str) -> set[str]:
+        """Keywords occurring as whole words in ``text`` (normalised here)."""
+        if not self._terminal:
+            return set()
+        if self._stale:
+            self._link()
+        goto, fail, output, output_link = self._goto, self._fail, self._output, self._output_link
+        found: set[str] = set()
+        state = 0
+        for ch in f" {normalize_keyword(text)} ":
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if output[state] is not None else output_link[state]
+            while hit:
+                found.add(output[hit])
+                hit = output_link[hit]
+        return found
@@ -1,15 +1,29 @@
-import html
-import json
+"""
+Entry points of the notifier.
+
+    python src/main.py [all]       scraper loop, outbox worker, retention, catalog API and the bot (default)
+    python src/main.py supervise   the same, as separately supervised processes (see supervisor.py)
+    python src/main.py scrape-once one scrape cycle, then exit (1 if it failed); for cron
+    python src/main.py scrape-loop scraper loop, outbox worker, retention and catalog API, without the bot
+                                   (--no-send: without the outbox worker either)
+    python src/main.py send        only the outbox worker
+    python src/main.py bot         only the Telegram bot
+
+Each command imports only what it runs: ``bot`` never loads the scraper's HTTP
+stack, and the scrape commands never load ``telegram``. The long-running
+commands stop cleanly on SIGTERM or SIGINT.
+"""
+import argparse
 import logging
+import os
+import signal
+import sys
 import threading
 import time
-from urllib.parse import quote
+from functools import lru_cache
 
-import requests
-from bs4 import BeautifulSoup
-from bot import run_bot
 from database import Database
-from notifier import Notifier
+from metrics import histogram
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,91 +31,202 @@ logging.basicConfig(
 )
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
-def main():
+CYCLE_SECONDS = histogram(
+    "illa_cycle_seconds", "Duration of a scrape cycle by outcome (changed, unchanged, error).", ["outcome"],
+)
+
+@lru_cache(maxsize=None)
+def scrape_context():
+    """The configured sources and the HTTP session they share, created on the first cycle.
+
+    The session is kept across cycles and sources so connections to the cinemas' servers stay alive.
+    """
+    from showtimes import DEFAULT_CONCURRENCY as SHOWTIME_CONCURRENCY
+    from sources import make_session, parse_sources
+
+    sources = parse_sources()
+    return sources, make_session(pool_size=max(len(sources), SHOWTIME_CONCURRENCY))
+
+def main() -> bool:
+    """Run one scrape cycle. Returns True if any billboard changed; errors are re-raised for the scheduler."""
+    from dotenv import load_dotenv
+
+    from catalog_api import refresh_catalog_api
+    from showtimes import ingest_showtimes
+    from sources import fetch_all
+
+    load_dotenv()
     db = Database()
-    notifier = Notifier()
-    url = "https://cinemesilla.com/" 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-
-    print(f"Connecting to: {url}...")
-    
+    sources, http_session = scrape_context()
+
+    print(f"Connecting to {len(sources)} source(s): {', '.join(s.url for s in sources)}...")
+    started = time.perf_counter()
+    result = "error"
+
     try:
-        response = requests.get(url, headers=headers, timeout=20)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        vue_component = soup.find('cinemaindexpage')
-        if not vue_component:
-            print("Error: Component <cinemaindexpage> not found.")
-            return
-
-        # Get base URL for posters and the movies JSON
-        base_poster_url = json.loads(html.unescape(vue_component.get(':postersurl', '""')))
-        movies_list = json.loads(html.unescape(vue_component.get(':onlytitlesinfo', '[]')))
-
-        db.reset_active_status()
-        new_movies_count = 0
-
-        for movie in movies_list:
-            movie_id = movie.get('ID_Espectaculo')
-            title = str(movie.get('Titulo', 'Unknown')).strip()
-            genre = movie.get('NombreGenero', 'Unknown')
-            format_type = movie.get('NombreFormato', 'Unknown')
-            cinema_id = movie.get('ID_Centro', '')
-            cinema_name = movie.get('CinemaName', '')
-
-            poster_filename = movie.get('Cartel', '')
-            full_poster_url = f"{base_poster_url}{poster_filename}" if poster_filename else None
-
-            # Build ticket purchase URL
-            # Pattern: /FilmTheaterPage/{id}/{title_encoded}/{cinema_id}/{cinema_name_encoded}
-            ticket_url = (
-                f"https://cinemesilla.com/FilmTheaterPage"
-                f"/{movie_id}"
-                f"/{quote(title)}"
-                f"/{cinema_id}"
-                f"/{quote(cinema_name)}"
-            )
-
-            # Check if it's new BEFORE updating the DB
-            if db.is_new_movie(movie_id):
-                print(f"[*] NEW MOVIE DETECTED: {title}")
-                # Send global notification to the channel
-                notifier.send_movie_alert(title, genre, format_type, full_poster_url, ticket_url)
-                new_movies_count += 1
-
-                # Send personal DMs to matching subscribers
-                subscribers = db.get_matching_subscribers(movie_id, format_type, genre)
-                for tg_id in subscribers:
-                    success = notifier.send_dm(tg_id, title, genre, format_type, full_poster_url, ticket_url)
-                    if success:
-                        db.log_notification(tg_id, movie_id)
-                        print(f"    -> DM sent to subscriber {tg_id}")
-                    else:
-                        print(f"    -> DM failed for subscriber {tg_id}")
-            
-            # Update or add to DB
-            db.update_or_add_movie(movie_id, title, genre, format_type, full_poster_url)
-
-        print(f"\nProcessing finished. {new_movies_count} channel notifications sent.")
-            
+        outcomes = fetch_all(sources, db, http_session)
+        for outcome in outcomes:
+            if outcome.error:
+                print(f"Error in source {outcome.source.name}: {outcome.error}")
+        if all(outcome.error for outcome in outcomes):
+            raise RuntimeError("Every billboard source failed")
+
+        fresh = [outcome for outcome in outcomes if outcome.changed]
+        if not fresh:
+            print("Billboard unchanged since last check. Cycle skipped.")
+            # Sessions are added daily even when the billboard is unchanged.
+            ingest_showtimes(db, http_session)
+            result = "unchanged"
+            return False
+
+        # Diff the billboards that changed and enqueue channel posts and
+        # subscriber DMs for new movies in one transaction; the outbox worker
+        # delivers them. Movies of unchanged or failed sources are left as is.
+        movies = [movie for outcome in fresh for movie in outcome.movies]
+        titles = {movie.id: movie.title for movie in movies}
+        sync = db.sync_catalog(
+            movies,
+            channel_chat_id=os.getenv("TELEGRAM_CHAT_ID"),
+            sources=[outcome.source.name for outcome in fresh],
+            email=bool(os.getenv("SMTP_HOST")),
+        )
+        for movie_id in sync.new:
+            print(f"[*] NEW MOVIE DETECTED: {titles[movie_id]}")
+
+        for outcome in fresh:
+            outcome.fetcher.commit(outcome.result)
+        # Serve the new billboard from the read-only API, if this process runs it.
+        refresh_catalog_api(db)
+        showtimes = ingest_showtimes(db, http_session, sync.new + sync.changed + sync.reappeared)
+        print(
+            f"\nProcessing finished. {len(sync.new)} new, {len(sync.reappeared)} reappeared, "
+            f"{len(sync.changed)} changed, {len(sync.retired)} retired; "
+            f"{sync.enqueued} notifications queued; showtimes updated for {showtimes.updated} movie(s)."
+        )
+        result = "changed"
+        return True
+
     except Exception as e:
         print(f"An error occurred: {e}")
+        raise
+    finally:
+        CYCLE_SECONDS.observe(time.perf_counter() - started, outcome=result)
+
+def run_cycle() -> bool:
+    """``main()`` under the on-demand profiler and the slow-cycle watchdog."""
+    from profiling import CYCLE_PROFILER, SLOW_CYCLE_WATCHDOG
+
+    with SLOW_CYCLE_WATCHDOG.watch("cycle"), CYCLE_PROFILER.profile("cycle"):
+        return main()
+
+def _start_thread(target, name: str, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
+
+def _stop_event() -> threading.Event:
+    """An event set by SIGTERM or SIGINT, so the command finishes what it is doing and exits."""
+    from supervisor import watch_supervisor
+
+    stop = threading.Event()
+
+    def handle(signum, frame) -> None:
+        print(f"Received {signal.Signals(signum).name}, shutting down...")
+        stop.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handle)
+    watch_supervisor(stop)
+    return stop
+
+def _start_services() -> None:
+    from metrics import start_metrics_server
+    from profiling import install_signal_handlers
+
+    # Prometheus-compatible /metrics for the scraper, the outbox worker and the bot.
+    start_metrics_server()
+    # SIGUSR1/SIGUSR2 profile the next scrape cycle(s)/bot handlers.
+    install_signal_handlers()
+
+def scrape_loop(stop: threading.Event, send: bool = True) -> None:
+    from catalog_api import start_catalog_api
+    from outbox import run_outbox_worker
+    from retention import run_retention_worker
+    from scheduler import AdaptiveScheduler
+
+    threads = []
+    if send:
+        # Deliver queued notifications independently of the scrape cycle.
+        threads.append(_start_thread(run_outbox_worker, "outbox-worker", stop))
+    # Prune retired movies, old log/outbox rows and compact the database daily.
+    threads.append(_start_thread(run_retention_worker, "retention", stop))
+    # Read-only billboard API for other services, republished after every catalog sync.
+    catalog_api = start_catalog_api(Database())
+
+    # Check more often when the billboard usually changes and less overnight,
+    # keeping the average to about one request per hour.
+    AdaptiveScheduler(Database()).run(run_cycle, stop)
+    if catalog_api is not None:
+        catalog_api.stop()
+    for thread in threads:
+        thread.join()
+
+def cmd_all(args: argparse.Namespace) -> None:
+    from bot import run_bot
+
+    stop = _stop_event()
+    _start_services()
+    # The bot listener runs in a background thread so it doesn't block the scraping loop.
+    bot_thread = _start_thread(run_bot, "telegram-bot", stop)
+    scrape_loop(stop)
+    bot_thread.join()
+
+def cmd_scrape_once(args: argparse.Namespace) -> int:
+    try:
+        run_cycle()
+    except Exception:
+        return 1
+    return 0
+
+def cmd_scrape_loop(args: argparse.Namespace) -> None:
+    stop = _stop_event()
+    _start_services()
+    scrape_loop(stop, send=not args.no_send)
+
+def cmd_send(args: argparse.Namespace) -> None:
+    from outbox import run_outbox_worker
+
+    stop = _stop_event()
+    _start_services()
+    run_outbox_worker(stop)
+
+def cmd_bot(args: argparse.Namespace) -> None:
+    from bot import run_bot
+
+    stop = _stop_event()
+    _start_services()
+    run_bot(stop)
+
+def cmd_supervise(args: argparse.Namespace) -> None:
+    from metrics import start_metrics_server
+    from supervisor import run_supervisor
+
+    stop = _stop_event()
+    start_metrics_server()
+    run_supervisor(stop)
+
+COMMANDS = {
+    "all": cmd_all,
+    "supervise": cmd_supervise,
+    "scrape-once": cmd_scrape_once,
+    "scrape-loop": cmd_scrape_loop,
+    "send": cmd_send,
+    "bot": cmd_bot,
+}
 
 if __name__ == "__main__":
-    # Start the bot listener (handles /start and future commands) in a
-    # background daemon thread so it doesn't block the scraping loop.
-    bot_thread = threading.Thread(target=run_bot, name="telegram-bot", daemon=True)
-    bot_thread.start()
-
-    while True:
-        try:
-            main()
-        except Exception as e:
-            print(f"Critical error in loop: {e}")
-
-        # 3600 seconds = 1 hour
-        print("Waiting 1 hour for the next check...")
-        time.sleep(3600)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Illa cinema billboard notifier.")
+    parser.add_argument("command", nargs="?", default="all", choices=COMMANDS)
+    parser.add_argument("--no-send", action="store_true", help="scrape-loop: leave the outbox to a separate sender")
+    args = parser.parse_args()
+    sys.exit(COMMANDS[args.command](args))
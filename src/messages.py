@@ -0,0 +1,155 @@
+"""
+Rendering of movie alert messages.
+
+A message is rendered once per (movie, template, locale) into an immutable
+payload template: caption, parse mode and the serialised inline keyboard. The
+channel post and every subscriber DM then only stamp in their ``chat_id`` and
+poster reference, so fan-out does no per-recipient formatting or JSON work.
+"""
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from dispatcher import SendRequest
+
+PARSE_MODE = "Markdown"
+
+# Characters with meaning in Telegram's legacy Markdown parse mode.
+_MARKDOWN_SPECIAL_RE = re.compile(r"([_*`\[])")
+
+
+def escape_markdown(text: object) -> str:
+    """Escape user/scraped text for ``parse_mode="Markdown"``."""
+    return _MARKDOWN_SPECIAL_RE.sub(r"\\\1", str(text))
+
+
+@dataclass(frozen=True)
+class MessageTemplate:
+    header: str
+    title_label: str
+    genre_label: str
+    language_label: str
+    button_text: str
+
+
+CHANNEL_TEMPLATE = "new_movie_channel"
+DM_TEMPLATE = "new_movie_dm"
+DIGEST_TEMPLATE = "new_movies_digest"
+
+# Movies listed in one digest message; longer digests are split. Keeps the
+# text well under Telegram's 4096 characters and the keyboard readable.
+DIGEST_MAX_MOVIES = 10
+
+TEMPLATES: dict[tuple[str, str], MessageTemplate] = {
+    (CHANNEL_TEMPLATE, "en"): MessageTemplate(
+        header="🎬 *NEW MOVIE DETECTED*",
+        title_label="Title",
+        genre_label="Genre",
+        language_label="Language",
+        button_text="🎟️ Get tickets",
+    ),
+    (DM_TEMPLATE, "es"): MessageTemplate(
+        header="🔔 *Nueva película que encaja con tus alertas*",
+        title_label="Título",
+        genre_label="Género",
+        language_label="Idioma",
+        button_text="🎟️ Comprar entradas",
+    ),
+    (DIGEST_TEMPLATE, "es"): MessageTemplate(
+        header="🔔 *Novedades que encajan con tus alertas*",
+        title_label="Título",
+        genre_label="Género",
+        language_label="Idioma",
+        button_text="🎟️",
+    ),
+}
+
+
+@dataclass(frozen=True)
+class RenderedMessage:
+    """Recipient-independent payload; ``request()`` stamps in the chat."""
+    photo_payload: Mapping[str, str]
+    text_payload: Mapping[str, str]
+
+    def request(
+        self,
+        chat_id: int | str,
+        photo: Optional[str] = None,
+        files: Optional[dict] = None,
+    ) -> SendRequest:
+        """Build the Bot API call for one chat.
+
+        ``photo`` is a file_id or URL; ``files`` carries an upload. With neither
+        the message is sent as text.
+        """
+        if photo is None and files is None:
+            return SendRequest(chat_id=chat_id, method="sendMessage", payload={**self.text_payload, "chat_id": chat_id})
+        payload = {**self.photo_payload, "chat_id": chat_id}
+        if files is None:
+            payload["photo"] = photo
+        return SendRequest(chat_id=chat_id, method="sendPhoto", payload=payload, files=files)
+
+
+@lru_cache(maxsize=512)
+def render_movie(
+    template: str,
+    locale: str,
+    title: str,
+    genre: Optional[str],
+    format_type: Optional[str],
+    ticket_url: Optional[str] = None,
+) -> RenderedMessage:
+    """Render (and memoise) a movie alert for the given template and locale."""
+    tpl = TEMPLATES[(template, locale)]
+    body = (
+        f"{tpl.header}\n\n"
+        f"🍿 *{tpl.title_label}:* {escape_markdown(title)}\n"
+        f"🎭 *{tpl.genre_label}:* {escape_markdown(genre)}\n"
+        f"💬 *{tpl.language_label}:* {escape_markdown(format_type)}\n"
+    )
+
+    common: dict[str, str] = {"parse_mode": PARSE_MODE}
+    if ticket_url:
+        common["reply_markup"] = json.dumps({
+            "inline_keyboard": [
+                [{"text": tpl.button_text, "url": ticket_url}]
+            ]
+        })
+
+    return RenderedMessage(
+        photo_payload=MappingProxyType({"caption": body, **common}),
+        text_payload=MappingProxyType({"text": body, **common}),
+    )
+
+
+@lru_cache(maxsize=512)
+def render_digest(
+    template: str,
+    locale: str,
+    movies: tuple[tuple[str, Optional[str], Optional[str], Optional[str]], ...],
+) -> RenderedMessage:
+    """Render (and memoise) a text digest of ``(title, genre, format_type, ticket_url)`` movies.
+
+    Each movie is one line of the list and, if it has a ticket URL, one
+    button. Subscribers with the same filters get the same digest, so it is
+    rendered once per distinct movie list.
+    """
+    tpl = TEMPLATES[(template, locale)]
+    lines = [
+        f"🍿 {escape_markdown(title)}\n      {escape_markdown(genre)} · {escape_markdown(format_type)}"
+        for title, genre, format_type, _ in movies
+    ]
+    body = f"{tpl.header}\n\n" + "\n".join(lines) + "\n"
+
+    payload: dict[str, str] = {"text": body, "parse_mode": PARSE_MODE}
+    buttons = [
+        [{"text": f"{tpl.button_text} {title}", "url": ticket_url}]
+        for title, _, _, ticket_url in movies if ticket_url
+    ]
+    if buttons:
+        payload["reply_markup"] = json.dumps({"inline_keyboard": buttons})
+
+    return RenderedMessage(photo_payload=MappingProxyType({}), text_payload=MappingProxyType(payload))
@@ -1,18 +1,69 @@
 import os
-import json
+import time
 from typing import Optional
 
 import requests
 from dotenv import load_dotenv
 
+from database import Database, Movie
+from dispatcher import TELEGRAM_REQUEST_SECONDS, SendResult, TelegramDispatcher, request_outcome
+from messages import CHANNEL_TEMPLATE, DIGEST_TEMPLATE, DM_TEMPLATE, RenderedMessage, render_digest, render_movie
+from poster_cache import PosterCache
+
 # Load environment variables
 load_dotenv()
 
+
+def _is_rejected_file_id(status_code: int | None, description: str | None) -> bool:
+    """Telegram answers 400 "wrong file identifier" for file_ids it no longer accepts."""
+    return status_code == 400 and "file" in (description or "").lower()
+
+
 class Notifier:
-    def __init__(self):
+    def __init__(self, db: Optional[Database] = None):
         self.token = os.getenv("TELEGRAM_TOKEN")
         self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
-        self.api_url = f"https://api.telegram.org/bot{self.token}/"
+        # A local Bot API server (or the benchmark stub) can stand in for api.telegram.org.
+        api_base = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+        self.api_url = f"{api_base}/bot{self.token}/"
+        self.dispatcher = TelegramDispatcher(self.api_url)
+        # Without a database posters are always sent by URL.
+        self.posters = PosterCache(db) if db is not None else None
+
+    def _post(self, method: str, payload: dict, files: Optional[dict] = None) -> requests.Response:
+        """Blocking Bot API call, recorded in the same request metrics as the dispatcher's."""
+        started = time.perf_counter()
+        try:
+            response = requests.post(f"{self.api_url}{method}", data=payload, files=files)
+        except requests.RequestException:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, outcome="error")
+            raise
+        TELEGRAM_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=method, outcome=request_outcome(response.status_code),
+        )
+        return response
+
+    def _photo_source(self, poster_url: str) -> tuple[Optional[str], Optional[dict], Optional[str]]:
+        """Resolve how to attach a poster: ``(photo field, multipart files, content hash)``.
+
+        Prefers a cached ``file_id``; otherwise downloads the image once so it
+        can be uploaded (or matched by hash to an earlier upload). Falls back
+        to letting Telegram fetch the URL when the download fails.
+        """
+        if self.posters is None:
+            return poster_url, None, None
+        file_id = self.posters.lookup(poster_url)
+        if file_id is not None:
+            return file_id, None, None
+        downloaded = self.posters.download(poster_url)
+        if downloaded is None:
+            return poster_url, None, None
+        content, content_hash = downloaded
+        file_id = self.posters.lookup_by_hash(poster_url, content_hash)
+        if file_id is not None:
+            return file_id, None, None
+        filename = poster_url.rsplit("/", 1)[-1] or "poster.jpg"
+        return None, {"photo": (filename, content)}, content_hash
 
     def send_movie_alert(
         self,
@@ -22,49 +73,40 @@ class Notifier:
         poster_url: Optional[str],
         ticket_url: Optional[str] = None,
     ) -> bool:
-        caption = (
-            f"🎬 *NEW MOVIE DETECTED*\n\n"
-            f"🍿 *Title:* {title}\n"
-            f"🎭 *Genre:* {genre}\n"
-            f"💬 *Language:* {format_type}\n"
-        )
+        message = render_movie(CHANNEL_TEMPLATE, "en", title, genre, format_type, ticket_url)
 
-        reply_markup: Optional[dict] = None
-        if ticket_url:
-            reply_markup = {
-                "inline_keyboard": [
-                    [{"text": "🎟️ Get tickets", "url": ticket_url}]
-                ]
-            }
-        
         # If we have a poster URL, we send a photo. Otherwise, just text.
+        files = None
+        content_hash = None
+        cached = False
         if poster_url:
-            endpoint = f"{self.api_url}sendPhoto"
-            payload = {
-                "chat_id": self.chat_id,
-                "photo": poster_url,
-                "caption": caption,
-                "parse_mode": "Markdown",
-            }
+            photo, files, content_hash = self._photo_source(poster_url)
+            request = message.request(self.chat_id, photo, files)
+            cached = photo not in (None, poster_url)
         else:
-            endpoint = f"{self.api_url}sendMessage"
-            payload = {
-                "chat_id": self.chat_id,
-                "text": caption,
-                "parse_mode": "Markdown",
-            }
-
-        if reply_markup:
-            payload["reply_markup"] = json.dumps(reply_markup)
+            request = message.request(self.chat_id)
 
         try:
-            response = requests.post(endpoint, data=payload)
+            response = self._post(request.method, request.payload, files)
+            if cached and response.status_code == 400 and _is_rejected_file_id(
+                response.status_code, response.json().get("description"),
+            ):
+                self.posters.forget(poster_url)
+                cached = False
+                request = message.request(self.chat_id, poster_url)
+                response = self._post(request.method, request.payload)
             response.raise_for_status()
+            if poster_url and self.posters is not None and not cached:
+                self.posters.remember(poster_url, content_hash, response.json())
             return True
         except Exception as e:
             print(f"Error sending Telegram notification: {e}")
             return False
 
+    @staticmethod
+    def _dm_message(title: str, genre: str, format_type: str, ticket_url: Optional[str]) -> RenderedMessage:
+        return render_movie(DM_TEMPLATE, "es", title, genre, format_type, ticket_url)
+
     def send_dm(
         self,
         telegram_id: int,
@@ -75,44 +117,81 @@ class Notifier:
         ticket_url: Optional[str] = None,
     ) -> bool:
         """Send a personal movie alert to a specific user via DM."""
-        caption = (
-            f"🔔 *Nueva película que encaja con tus alertas*\n\n"
-            f"🍿 *Título:* {title}\n"
-            f"🎭 *Género:* {genre}\n"
-            f"💬 *Idioma:* {format_type}\n"
-        )
-
-        reply_markup: Optional[dict] = None
-        if ticket_url:
-            reply_markup = {
-                "inline_keyboard": [
-                    [{"text": "🎟️ Comprar entradas", "url": ticket_url}]
-                ]
-            }
-
-        if poster_url:
-            endpoint = f"{self.api_url}sendPhoto"
-            payload: dict = {
-                "chat_id": telegram_id,
-                "photo": poster_url,
-                "caption": caption,
-                "parse_mode": "Markdown",
-            }
-        else:
-            endpoint = f"{self.api_url}sendMessage"
-            payload = {
-                "chat_id": telegram_id,
-                "text": caption,
-                "parse_mode": "Markdown",
-            }
-
-        if reply_markup:
-            payload["reply_markup"] = json.dumps(reply_markup)
-
+        request = self._dm_message(title, genre, format_type, ticket_url).request(telegram_id, poster_url)
         try:
-            response = requests.post(endpoint, data=payload)
+            response = self._post(request.method, request.payload)
             response.raise_for_status()
             return True
         except Exception as e:
             print(f"Error sending DM to {telegram_id}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def send_dms(
+        self,
+        telegram_ids: list[int],
+        title: str,
+        genre: str,
+        format_type: str,
+        poster_url: Optional[str],
+        ticket_url: Optional[str] = None,
+    ) -> list[SendResult]:
+        """Send the same movie alert to many users concurrently, within Telegram's rate limits.
+
+        Returns one result per recipient, in the order of ``telegram_ids``.
+        The message is rendered once; each recipient only gets its chat_id
+        stamped in. With a poster cache, an uncached poster is uploaded with
+        the first DM and every other recipient gets the returned ``file_id``.
+        """
+        message = self._dm_message(title, genre, format_type, ticket_url)
+
+        def build(tg_ids, photo=None, files=None):
+            return [message.request(tg_id, photo, files) for tg_id in tg_ids]
+
+        if not poster_url or self.posters is None or not telegram_ids:
+            results = self.dispatcher.dispatch(build(telegram_ids, poster_url))
+        else:
+            photo, files, content_hash = self._photo_source(poster_url)
+            results = []
+            remaining = list(telegram_ids)
+            if photo in (None, poster_url):
+                # Not cached yet: the first send uploads the poster and yields its file_id.
+                first = self.dispatcher.dispatch(build(remaining[:1], photo, files))
+                results += first
+                remaining = remaining[1:]
+                file_id = self.posters.remember(poster_url, content_hash, first[0].response) if first[0].ok else None
+                photo = file_id or poster_url
+            results += self.dispatcher.dispatch(build(remaining, photo))
+
+            rejected = [i for i, r in enumerate(results) if _is_rejected_file_id(r.status_code, r.error)]
+            if rejected and photo != poster_url:
+                self.posters.forget(poster_url)
+                retried = self.dispatcher.dispatch(build([telegram_ids[i] for i in rejected], poster_url))
+                for i, result in zip(rejected, retried):
+                    results[i] = result
+                delivered = next((r for r in retried if r.ok), None)
+                if delivered is not None:
+                    self.posters.remember(poster_url, None, delivered.response)
+
+        for result in results:
+            if not result.ok:
+                print(f"Error sending DM to {result.chat_id}: {result.status_code} {result.error}")
+        return results
+
+    def send_digests(self, digests: list[tuple[int, list[Movie]]]) -> list[SendResult]:
+        """Send each user one message listing their movies, concurrently and within Telegram's rate limits.
+
+        ``digests`` holds ``(telegram_id, movies)`` pairs; callers keep each
+        list within ``DIGEST_MAX_MOVIES``. Returns one result per pair, in order.
+        """
+        batch = [
+            render_digest(
+                DIGEST_TEMPLATE, "es",
+                tuple((movie.title, movie.genre, movie.format, movie.ticket_url) for movie in movies),
+            ).request(telegram_id)
+            for telegram_id, movies in digests
+        ]
+        results = self.dispatcher.dispatch(batch)
+        for result in results:
+            if not result.ok:
+                print(f"Error sending digest to {result.chat_id}: {result.status_code} {result.error}")
+        return results
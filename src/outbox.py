@@ -0,0 +1,196 @@
+"""
+Background worker that drains the notification outbox.
+
+The scrape cycle only enqueues notifications (see ``Database.sync_catalog``);
+this worker leases due rows, delivers them through the ``Notifier`` (or the
+``EmailNotifier`` for emails) and marks them sent, retries them with backoff,
+or dead-letters them. Digest rows are grouped per recipient and sent as one
+message listing the movies.
+"""
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from database import CHANNEL_DIGEST, CHANNEL_DM, CHANNEL_EMAIL, CHANNEL_POST, Database, OutboxItem
+from emailer import EmailNotifier
+from messages import DIGEST_MAX_MOVIES
+from metrics import counter
+from notifier import Notifier
+
+logger = logging.getLogger("illa_notifier.outbox")
+
+# Telegram answers these for chats we can never reach (blocked bot, unknown chat).
+PERMANENT_STATUS_CODES = {400, 403}
+
+NOTIFICATIONS = counter(
+    "illa_notifications_total",
+    "Outbox deliveries by channel and outcome (sent, retry, dead).",
+    ["channel", "outcome"],
+)
+
+
+class OutboxWorker:
+    def __init__(
+        self,
+        db: Database,
+        notifier: Notifier,
+        emailer: EmailNotifier | None = None,
+        batch_size: int = int(os.environ.get("OUTBOX_BATCH_SIZE", "500")),
+        lease_seconds: float = float(os.environ.get("OUTBOX_LEASE_SECONDS", "300")),
+        max_attempts: int = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6")),
+        poll_interval: float = float(os.environ.get("OUTBOX_POLL_INTERVAL", "5")),
+    ) -> None:
+        self.db = db
+        self.notifier = notifier
+        self.emailer = emailer
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+    def _fail(self, item: OutboxItem, error: str | None, permanent: bool = False) -> None:
+        dead = self.db.fail_outbox(item, error, self.max_attempts, permanent=permanent)
+        NOTIFICATIONS.inc(channel=item.channel, outcome="dead" if dead else "retry")
+        if dead:
+            logger.error(
+                "Dead-lettered %s to %s for movie %s after %d attempt(s): %s",
+                item.channel, item.recipient, item.movie.id, item.attempts, error,
+            )
+        else:
+            logger.warning(
+                "Delivery of %s to %s for movie %s failed (attempt %d), will retry: %s",
+                item.channel, item.recipient, item.movie.id, item.attempts, error,
+            )
+
+    def _deliver_posts(self, items: list[OutboxItem]) -> list[OutboxItem]:
+        sent = []
+        for item in items:
+            movie = item.movie
+            if self.notifier.send_movie_alert(movie.title, movie.genre, movie.format, movie.poster_url, movie.ticket_url):
+                sent.append(item)
+            else:
+                self._fail(item, "channel post failed")
+        return sent
+
+    def _deliver_dms(self, items: list[OutboxItem]) -> list[OutboxItem]:
+        sent = []
+        by_movie: dict[int, list[OutboxItem]] = defaultdict(list)
+        for item in items:
+            by_movie[item.movie.id].append(item)
+        for group in by_movie.values():
+            movie = group[0].movie
+            results = self.notifier.send_dms(
+                [int(item.recipient) for item in group],
+                movie.title, movie.genre, movie.format, movie.poster_url, movie.ticket_url,
+            )
+            for item, result in zip(group, results):
+                if result.ok:
+                    sent.append(item)
+                else:
+                    self._fail(item, result.error, permanent=result.status_code in PERMANENT_STATUS_CODES)
+        return sent
+
+    def _deliver_digests(self, items: list[OutboxItem]) -> list[OutboxItem]:
+        by_recipient: dict[str, list[OutboxItem]] = defaultdict(list)
+        for item in sorted(items, key=lambda item: item.id):
+            by_recipient[item.recipient].append(item)
+        # A single movie needs no list: it goes out as the usual DM, poster included.
+        sent = self._deliver_dms([group[0] for group in by_recipient.values() if len(group) == 1])
+        chunks = [
+            group[start:start + DIGEST_MAX_MOVIES]
+            for group in by_recipient.values() if len(group) > 1
+            for start in range(0, len(group), DIGEST_MAX_MOVIES)
+        ]
+        if not chunks:
+            return sent
+        results = self.notifier.send_digests(
+            [(int(chunk[0].recipient), [item.movie for item in chunk]) for chunk in chunks]
+        )
+        for chunk, result in zip(chunks, results):
+            if result.ok:
+                sent += chunk
+                continue
+            for item in chunk:
+                self._fail(item, result.error, permanent=result.status_code in PERMANENT_STATUS_CODES)
+        return sent
+
+    def _deliver_emails(self, items: list[OutboxItem]) -> list[OutboxItem]:
+        if not items:
+            return []
+        if self.emailer is None:
+            for item in items:
+                self._fail(item, "email is not configured (SMTP_HOST)", permanent=True)
+            return []
+        sent = []
+        delivered: list[int] = []
+        rejected: list[int] = []
+        addresses = self.db.get_user_emails(int(item.recipient) for item in items)
+        by_movie: dict[int, list[OutboxItem]] = defaultdict(list)
+        for item in items:
+            if int(item.recipient) in addresses:
+                by_movie[item.movie.id].append(item)
+            else:
+                # The user removed their address after the email was queued.
+                self._fail(item, "no email address", permanent=True)
+        for group in by_movie.values():
+            movie = group[0].movie
+            results = self.emailer.send_emails(
+                [(int(item.recipient), addresses[int(item.recipient)]) for item in group],
+                movie.title, movie.genre, movie.format, movie.poster_url, movie.ticket_url,
+            )
+            for item, result in zip(group, results):
+                if result.ok:
+                    sent.append(item)
+                    delivered.append(int(item.recipient))
+                    continue
+                # SMTP 5xx replies (unknown mailbox, rejected address) are permanent.
+                permanent = result.status_code is not None and result.status_code >= 500
+                if permanent:
+                    rejected.append(int(item.recipient))
+                self._fail(item, f"{result.status_code} {result.error}", permanent=permanent)
+        self.db.record_email_results(delivered, rejected)
+        return sent
+
+    def drain_once(self) -> int:
+        """Lease and deliver one batch of due items. Returns the number of items leased."""
+        items = self.db.lease_outbox(self.batch_size, self.lease_seconds)
+        if not items:
+            return 0
+
+        sent = self._deliver_posts([i for i in items if i.channel == CHANNEL_POST])
+        sent += self._deliver_dms([i for i in items if i.channel == CHANNEL_DM])
+        sent += self._deliver_digests([i for i in items if i.channel == CHANNEL_DIGEST])
+        sent += self._deliver_emails([i for i in items if i.channel == CHANNEL_EMAIL])
+        for item in items:
+            if item.channel not in (CHANNEL_POST, CHANNEL_DM, CHANNEL_DIGEST, CHANNEL_EMAIL):
+                self._fail(item, f"unknown channel {item.channel!r}", permanent=True)
+
+        self.db.complete_outbox(sent)
+        for item in sent:
+            NOTIFICATIONS.inc(channel=item.channel, outcome="sent")
+        logger.info("Outbox batch: %d leased, %d delivered", len(items), len(sent))
+        return len(items)
+
+    def run_forever(self, stop: threading.Event | None = None) -> None:
+        """Drain continuously, sleeping ``poll_interval`` whenever the outbox is empty."""
+        stop = stop or threading.Event()
+        logger.info("Outbox worker started")
+        while not stop.is_set():
+            try:
+                if self.drain_once() >= self.batch_size:
+                    continue
+            except Exception:
+                logger.exception("Outbox drain failed")
+            stop.wait(self.poll_interval)
+
+
+def run_outbox_worker(stop: threading.Event | None = None) -> None:
+    """Entry point for the delivery thread or process."""
+    db = Database()
+    emailer = EmailNotifier.from_env()
+    try:
+        OutboxWorker(db, Notifier(db), emailer).run_forever(stop)
+    finally:
+        if emailer is not None:
+            emailer.close()
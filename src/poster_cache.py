@@ -0,0 +1,76 @@
+"""
+Cache of Telegram ``file_id``s for movie posters.
+
+The first send of a poster uploads the image bytes (downloaded once from the
+cinema's server) and stores the ``file_id`` Telegram returns; every later send
+of that poster references the id, so Telegram never re-fetches the image. The
+content hash lets identical images published under different URLs share an id.
+"""
+import hashlib
+import logging
+import threading
+
+import requests
+
+from database import Database
+
+logger = logging.getLogger("illa_notifier.poster_cache")
+
+
+class PosterCache:
+    def __init__(self, db: Database, session: requests.Session | None = None, timeout: float = 20) -> None:
+        self.db = db
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self._file_ids: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, poster_url: str) -> str | None:
+        """Return the cached ``file_id`` for a poster URL, if any."""
+        with self._lock:
+            file_id = self._file_ids.get(poster_url)
+        if file_id is None:
+            file_id = self.db.get_poster_file_id(poster_url)
+            if file_id is not None:
+                with self._lock:
+                    self._file_ids[poster_url] = file_id
+        return file_id
+
+    def download(self, poster_url: str) -> tuple[bytes, str] | None:
+        """Download a poster and return its bytes and SHA-256, or None if the download fails."""
+        try:
+            response = self.session.get(poster_url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning("Could not download poster %s: %s", poster_url, e)
+            return None
+        return response.content, hashlib.sha256(response.content).hexdigest()
+
+    def lookup_by_hash(self, poster_url: str, content_hash: str) -> str | None:
+        """Reuse the ``file_id`` of an identical image cached under another URL."""
+        file_id = self.db.get_poster_file_id_by_hash(content_hash)
+        if file_id is not None:
+            self.store(poster_url, content_hash, file_id)
+        return file_id
+
+    def store(self, poster_url: str, content_hash: str | None, file_id: str) -> None:
+        self.db.save_poster_file_id(poster_url, content_hash, file_id)
+        with self._lock:
+            self._file_ids[poster_url] = file_id
+
+    def remember(self, poster_url: str, content_hash: str | None, response_body: dict | None) -> str | None:
+        """Store the ``file_id`` from a successful sendPhoto response and return it."""
+        photos = ((response_body or {}).get("result") or {}).get("photo") or []
+        if not photos:
+            return None
+        # Telegram returns every generated size; the last one is the original.
+        file_id = photos[-1]["file_id"]
+        self.store(poster_url, content_hash, file_id)
+        return file_id
+
+    def forget(self, poster_url: str) -> None:
+        """Drop a ``file_id`` Telegram rejected so the next send uploads again."""
+        logger.warning("Cached file_id for %s was rejected; falling back to the URL", poster_url)
+        self.db.delete_poster_file_id(poster_url)
+        with self._lock:
+            self._file_ids.pop(poster_url, None)
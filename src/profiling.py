@@ -0,0 +1,226 @@
+"""
+On-demand profiling of scrape cycles and bot handlers, and stack dumps of slow cycles.
+
+A profiler is armed for the next N runs, either at startup (``PROFILE_CYCLES``,
+``PROFILE_HANDLERS``) or at runtime with a signal (``SIGUSR1`` for cycles,
+``SIGUSR2`` for handlers, e.g. ``docker kill -s USR1 illa-notifier``). Each
+armed run is wrapped in cProfile and tracemalloc, and leaves two files in
+``PROFILE_DIR`` (by default ``profiles/`` next to the database, so inside the
+mounted data volume):
+
+  ``<kind>-<time>-<label>.prof``  pstats data, for ``snakeviz``/``pstats``
+  ``<kind>-<time>-<label>.txt``   top functions by cumulative time and top allocations
+
+When nothing is armed, wrapping a run costs one attribute check.
+
+Independently, :class:`SlowCallWatchdog` dumps the stacks of every thread if a
+cycle is still running after ``SLOW_CYCLE_SECONDS``, and again every further
+``SLOW_CYCLE_SECONDS`` until it finishes, so a hung or slow cycle shows where
+it is stuck without having been armed beforehand.
+"""
+import io
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger("illa_notifier.profiling")
+
+DEFAULT_PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(os.environ.get("DB_PATH", "notifier.db"))), "profiles",
+)
+# Seconds before a running cycle's stacks are dumped; 0 disables the watchdog.
+DEFAULT_SLOW_CYCLE_SECONDS = float(os.environ.get("SLOW_CYCLE_SECONDS", "120"))
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 10
+
+# cProfile (sys.monitoring on 3.12+) and tracemalloc are process-wide, so only
+# one profiled run can be active at a time.
+_session_lock = threading.Lock()
+
+
+def _report_path(output_dir: str, kind: str, label: str, suffix: str) -> str:
+    now = datetime.now()
+    stamp = f"{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}"
+    label = re.sub(r"[^A-Za-z0-9_.-]+", "_", label) or kind
+    return os.path.join(output_dir, f"{kind}-{stamp}-{label}{suffix}")
+
+
+class OnDemandProfiler:
+    """Profiles the next ``armed`` runs wrapped in :meth:`profile`."""
+
+    def __init__(self, kind: str, output_dir: str = DEFAULT_PROFILE_DIR, armed: int = 0) -> None:
+        self.kind = kind
+        self.output_dir = output_dir
+        # Plain int so arm() is safe to call from a signal handler.
+        self._remaining = armed
+
+    @property
+    def armed(self) -> int:
+        return self._remaining
+
+    def arm(self, count: int) -> None:
+        """Profile the next ``count`` runs (replacing any previous request)."""
+        self._remaining = max(0, count)
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """Profile the block if armed and no other profile is running; otherwise just run it.
+
+        For a coroutine the block spans its awaits, so work of other tasks on
+        the same event loop interleaved with it shows up in the profile too.
+        """
+        if not self._remaining or not _session_lock.acquire(blocking=False):
+            yield
+            return
+        try:
+            if not self._remaining:
+                yield
+                return
+            self._remaining -= 1
+            # Imported on first use so that unarmed processes never load them.
+            import cProfile
+            import tracemalloc
+            owns_tracemalloc = not tracemalloc.is_tracing()
+            if owns_tracemalloc:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - started
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if owns_tracemalloc:
+                    tracemalloc.stop()
+                try:
+                    self._write_report(label, profiler, snapshot, elapsed, peak)
+                except OSError:
+                    logger.exception("Could not write the %s profile for %s", self.kind, label)
+        finally:
+            _session_lock.release()
+
+    def _write_report(
+        self, label: str, profiler: "cProfile.Profile", snapshot: "tracemalloc.Snapshot", elapsed: float, peak: int,
+    ) -> None:
+        import cProfile
+        import pstats
+        import tracemalloc
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        prof_path = _report_path(self.output_dir, self.kind, label, ".prof")
+        profiler.dump_stats(prof_path)
+
+        out = io.StringIO()
+        out.write(f"{self.kind} {label}: {elapsed:.3f}s wall, peak traced memory {peak / 1024:.0f} KiB\n\n")
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+        out.write(f"Top {TOP_ALLOCATIONS} allocations by line (still allocated at the end):\n")
+        for stat in snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+        ]).statistics("lineno")[:TOP_ALLOCATIONS]:
+            out.write(f"  {stat}\n")
+        txt_path = prof_path[: -len(".prof")] + ".txt"
+        with open(txt_path, "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+        logger.info("Wrote %s profile of %s (%.3fs) to %s", self.kind, label, elapsed, txt_path)
+
+
+def dump_stacks(file) -> None:
+    """Write the current stack of every other thread to ``file``."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():
+        if ident == threading.get_ident():
+            continue
+        file.write(f"\nThread {names.get(ident, '?')} ({ident}):\n")
+        file.writelines(traceback.format_stack(frame))
+
+
+class SlowCallWatchdog:
+    """Dumps all thread stacks while a watched call runs longer than ``threshold`` seconds."""
+
+    def __init__(
+        self,
+        kind: str = "slow-cycle",
+        threshold: float = DEFAULT_SLOW_CYCLE_SECONDS,
+        output_dir: str = DEFAULT_PROFILE_DIR,
+        max_dumps: int = 5,
+    ) -> None:
+        self.kind = kind
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self.max_dumps = max_dumps
+
+    @contextmanager
+    def watch(self, label: str) -> Iterator[None]:
+        if self.threshold <= 0:
+            yield
+            return
+        done = threading.Event()
+        watcher = threading.Thread(
+            target=self._watch, args=(label, done, time.monotonic()), name=f"{self.kind}-watchdog", daemon=True,
+        )
+        watcher.start()
+        try:
+            yield
+        finally:
+            done.set()
+
+    def _watch(self, label: str, done: threading.Event, started: float) -> None:
+        path = None
+        for _ in range(self.max_dumps):
+            if done.wait(self.threshold):
+                break
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = path or _report_path(self.output_dir, self.kind, label, ".txt")
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(f"=== {label} still running after {time.monotonic() - started:.1f}s ===\n")
+                    dump_stacks(f)
+                    f.write("\n")
+            except OSError:
+                logger.exception("Could not write the stack dump of %s", label)
+                return
+            logger.warning("%s has been running for over %gs; stacks dumped to %s", label, self.threshold, path)
+        if path is not None:
+            done.wait()
+            logger.warning("%s finished after %.1fs", label, time.monotonic() - started)
+
+
+CYCLE_PROFILER = OnDemandProfiler("cycle", armed=int(os.environ.get("PROFILE_CYCLES", "0")))
+HANDLER_PROFILER = OnDemandProfiler("handler", armed=int(os.environ.get("PROFILE_HANDLERS", "0")))
+SLOW_CYCLE_WATCHDOG = SlowCallWatchdog()
+
+
+def install_signal_handlers(
+    cycles: int = int(os.environ.get("PROFILE_SIGNAL_CYCLES", "1")),
+    handlers: int = int(os.environ.get("PROFILE_SIGNAL_HANDLERS", "20")),
+) -> None:
+    """SIGUSR1 arms the next ``cycles`` scrape cycles, SIGUSR2 the next ``handlers`` bot handlers.
+
+    Must be called from the main thread. Does nothing on platforms without these signals.
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        return
+
+    def on_usr1(signum, frame) -> None:
+        CYCLE_PROFILER.arm(cycles)
+
+    def on_usr2(signum, frame) -> None:
+        HANDLER_PROFILER.arm(handlers)
+
+    signal.signal(signal.SIGUSR1, on_usr1)
+    signal.signal(signal.SIGUSR2, on_usr2)
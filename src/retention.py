@@ -0,0 +1,146 @@
+"""
+Retention and compaction of the database.
+
+Without it ``notification_log`` grows by one row per DM and ``movies`` by
+every title ever shown. Once a day (``RETENTION_INTERVAL``) the worker:
+
+  - replaces movies retired more than ``RETENTION_MOVIE_DAYS`` ago, with their
+    notification_log and finished outbox rows, by a one-row tombstone that
+    keeps them from being announced again (optionally archiving the deleted
+    rows into ``RETENTION_ARCHIVE_PATH``);
+  - deletes sent and dead outbox rows older than ``RETENTION_OUTBOX_DAYS``;
+  - deletes billboard change records older than ``RETENTION_CHANGE_DAYS``
+    and showtimes that started more than a day ago;
+  - releases free pages (incremental vacuum), runs ``ANALYZE`` and truncates
+    the WAL.
+
+Deletes run in small transactions so the scraper and the bot are never
+locked out for long. A retention period of 0 keeps those rows forever.
+"""
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+
+from database import Database
+from metrics import counter, histogram
+from scheduler import DEFAULT_HISTORY_DAYS
+
+logger = logging.getLogger("illa_notifier.retention")
+
+DAY = 86400
+
+DEFAULT_MOVIE_DAYS = float(os.environ.get("RETENTION_MOVIE_DAYS", "90"))
+DEFAULT_OUTBOX_DAYS = float(os.environ.get("RETENTION_OUTBOX_DAYS", "30"))
+# The scheduler learns from this history, so keep at least what it reads.
+DEFAULT_CHANGE_DAYS = float(os.environ.get("RETENTION_CHANGE_DAYS", str(max(365.0, DEFAULT_HISTORY_DAYS))))
+DEFAULT_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", str(DAY)))
+DEFAULT_ARCHIVE_PATH = os.environ.get("RETENTION_ARCHIVE_PATH") or None
+DEFAULT_VACUUM_PAGES = int(os.environ.get("RETENTION_VACUUM_PAGES", "5000"))
+# Movies per prune transaction; each takes all of its notification_log rows with it.
+MOVIE_BATCH = 50
+OUTBOX_BATCH = 5000
+
+ROWS_DELETED = counter("illa_retention_rows_deleted_total", "Rows deleted by retention, by table.", ["table"])
+RETENTION_SECONDS = histogram("illa_retention_seconds", "Duration of a retention and compaction run.")
+
+
+@dataclass(frozen=True)
+class RetentionReport:
+    movies: int = 0
+    notifications: int = 0
+    outbox: int = 0
+    changes: int = 0
+    showtimes: int = 0
+    freed_pages: int = 0
+    size_bytes: int = 0
+    elapsed: float = 0.0
+
+
+class RetentionWorker:
+    def __init__(
+        self,
+        db: Database,
+        movie_days: float = DEFAULT_MOVIE_DAYS,
+        outbox_days: float = DEFAULT_OUTBOX_DAYS,
+        change_days: float = DEFAULT_CHANGE_DAYS,
+        interval: float = DEFAULT_INTERVAL,
+        archive_path: str | None = DEFAULT_ARCHIVE_PATH,
+        vacuum_pages: int = DEFAULT_VACUUM_PAGES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.db = db
+        self.movie_days = movie_days
+        self.outbox_days = outbox_days
+        self.change_days = change_days
+        self.interval = interval
+        self.archive_path = archive_path
+        self.vacuum_pages = vacuum_pages
+        self.clock = clock
+
+    def run_once(self) -> RetentionReport:
+        started = time.perf_counter()
+        now = self.clock()
+        movies = notifications = outbox = changes = 0
+
+        if self.movie_days > 0:
+            while True:
+                pruned = self.db.prune_retired_movies(
+                    now - self.movie_days * DAY, limit=MOVIE_BATCH, archive_path=self.archive_path,
+                )
+                movies += pruned.movies
+                notifications += pruned.notifications
+                outbox += pruned.outbox
+                if pruned.movies < MOVIE_BATCH:
+                    break
+
+        if self.outbox_days > 0:
+            while (deleted := self.db.prune_outbox(now - self.outbox_days * DAY, limit=OUTBOX_BATCH)):
+                outbox += deleted
+                if deleted < OUTBOX_BATCH:
+                    break
+
+        if self.change_days > 0:
+            changes = self.db.prune_billboard_changes(now - self.change_days * DAY)
+        # Showtimes are in cinema-local time; a day of margin covers the time zone offset.
+        showtimes = self.db.prune_showtimes(datetime.fromtimestamp(now - DAY).strftime("%Y-%m-%d %H:%M"))
+
+        compacted = self.db.compact(self.vacuum_pages)
+        if compacted.converted:
+            logger.info("Converted the database to incremental auto-vacuum")
+
+        elapsed = time.perf_counter() - started
+        RETENTION_SECONDS.observe(elapsed)
+        for table, rows in (("movies", movies), ("notification_log", notifications),
+                            ("outbox", outbox), ("billboard_changes", changes), ("showtimes", showtimes)):
+            if rows:
+                ROWS_DELETED.inc(rows, table=table)
+        report = RetentionReport(
+            movies=movies, notifications=notifications, outbox=outbox, changes=changes, showtimes=showtimes,
+            freed_pages=compacted.freed_pages, size_bytes=compacted.size_bytes, elapsed=elapsed,
+        )
+        logger.info(
+            "Retention: pruned %d movie(s), %d log row(s), %d outbox row(s), %d change record(s), %d showtime(s); "
+            "freed %d page(s), database is %.1f MiB (%.2fs)",
+            movies, notifications, outbox, changes, showtimes,
+            compacted.freed_pages, compacted.size_bytes / 2 ** 20, elapsed,
+        )
+        return report
+
+    def run_forever(self, stop: threading.Event | None = None) -> None:
+        """Run once at start-up and then every ``interval`` seconds."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Retention run failed")
+            stop.wait(self.interval)
+
+
+def run_retention_worker(stop: threading.Event | None = None) -> None:
+    """Entry point for the maintenance thread."""
+    RetentionWorker(Database()).run_forever(stop)
@@ -0,0 +1,177 @@
+"""
+Adaptive scheduling of billboard checks.
+
+Rather than checking on a fixed hourly timer, the scheduler learns from past
+billboard changes when in the week they tend to happen and spends the same
+average number of requests accordingly. Each hour of the week gets a check
+rate proportional to the square root of its share of (time-decayed, smoothed)
+past changes, which minimises the expected delay before a change is noticed
+for a given request budget. Rates are clamped to ``min_interval`` and
+``max_interval``.
+
+Checks are timed fixed-rate, from the start of the previous check rather than
+from when its work finished. Failed checks are retried with exponential
+backoff and jitter.
+"""
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from database import Database
+
+logger = logging.getLogger("illa_notifier.scheduler")
+
+HOURS_PER_WEEK = 7 * 24
+# Pseudo-count of changes per hour of the week, so that hours without history
+# still get checked and a short history does not dominate the profile.
+PRIOR_WEIGHT = 0.1
+
+DEFAULT_REQUESTS_PER_HOUR = float(os.environ.get("SCHEDULER_REQUESTS_PER_HOUR", "1"))
+DEFAULT_MIN_INTERVAL = float(os.environ.get("SCHEDULER_MIN_INTERVAL", "300"))
+DEFAULT_MAX_INTERVAL = float(os.environ.get("SCHEDULER_MAX_INTERVAL", "10800"))
+DEFAULT_BACKOFF_BASE = float(os.environ.get("SCHEDULER_BACKOFF_BASE", "60"))
+DEFAULT_BACKOFF_MAX = float(os.environ.get("SCHEDULER_BACKOFF_MAX", "3600"))
+DEFAULT_HALF_LIFE_DAYS = float(os.environ.get("SCHEDULER_HALF_LIFE_DAYS", "56"))
+DEFAULT_HISTORY_DAYS = float(os.environ.get("SCHEDULER_HISTORY_DAYS", "182"))
+DEFAULT_TIMEZONE = os.environ.get("SCHEDULER_TZ", "Europe/Andorra")
+
+
+def _load_timezone(name: str):
+    try:
+        return ZoneInfo(name)
+    except ZoneInfoNotFoundError:
+        logger.warning("Time zone %s not available; using the system local time", name)
+        return None
+
+
+class AdaptiveScheduler:
+    def __init__(
+        self,
+        db: Database,
+        requests_per_hour: float = DEFAULT_REQUESTS_PER_HOUR,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        half_life_days: float = DEFAULT_HALF_LIFE_DAYS,
+        history_days: float = DEFAULT_HISTORY_DAYS,
+        timezone: str = DEFAULT_TIMEZONE,
+        clock: Callable[[], float] = time.time,
+        rng: random.Random | None = None,
+    ) -> None:
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Scheduler intervals must satisfy 0 < min_interval <= max_interval")
+        self.db = db
+        self.requests_per_hour = requests_per_hour
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.half_life_days = half_life_days
+        self.history_days = history_days
+        self.tz = _load_timezone(timezone)
+        self.clock = clock
+        self.rng = rng or random.Random()
+        # Checks per hour for each hour of the week (Monday 00h = 0).
+        self.rates = self._allocate([1.0] * HOURS_PER_WEEK)
+        self._failures = 0
+        self._last_success: float | None = None
+
+    def _hour_of_week(self, ts: float) -> int:
+        dt = datetime.fromtimestamp(ts, self.tz)
+        return dt.weekday() * 24 + dt.hour
+
+    def _allocate(self, weights: list[float]) -> list[float]:
+        """Split the weekly request budget over the hours in proportion to sqrt(weight), within the clamps."""
+        low, high = 3600 / self.max_interval, 3600 / self.min_interval
+        roots = [math.sqrt(w) for w in weights]
+        rates = [0.0] * HOURS_PER_WEEK
+        remaining = self.requests_per_hour * HOURS_PER_WEEK
+        free = set(range(HOURS_PER_WEEK))
+        # Water-filling: pin hours whose share falls outside the clamps and
+        # redistribute what is left among the others.
+        while free:
+            total = sum(roots[i] for i in free)
+            proposal = {i: max(remaining, 0.0) * roots[i] / total for i in free}
+            pinned = {i: min(max(r, low), high) for i, r in proposal.items() if not low <= r <= high}
+            if not pinned:
+                for i, r in proposal.items():
+                    rates[i] = r
+                break
+            for i, r in pinned.items():
+                rates[i] = r
+                free.discard(i)
+                remaining -= r
+        return rates
+
+    def refresh(self, now: float | None = None) -> None:
+        """Rebuild the weekly rate profile from the recorded billboard changes."""
+        now = self.clock() if now is None else now
+        decay = math.log(2) / (self.half_life_days * 86400)
+        weights = [PRIOR_WEIGHT] * HOURS_PER_WEEK
+        changes = self.db.get_billboard_changes(now - self.history_days * 86400)
+        for changed_at in changes:
+            weights[self._hour_of_week(changed_at)] += math.exp(-max(now - changed_at, 0.0) * decay)
+        self.rates = self._allocate(weights)
+        logger.info(
+            "Check profile rebuilt from %d change(s): %.1f-%.1f checks/hour",
+            len(changes), min(self.rates), max(self.rates),
+        )
+
+    def next_check_after(self, start: float) -> float:
+        """Time of the next check, so that the expected number of checks since ``start`` is one."""
+        t, needed = start, 1.0
+        while True:
+            rate = self.rates[self._hour_of_week(t)] / 3600
+            # Hour boundaries are taken on UTC hours, which coincide with local
+            # ones for whole-hour offsets.
+            span = (t - t % 3600 + 3600) - t
+            if rate * span >= needed:
+                return t + needed / rate
+            needed -= rate * span
+            t += span
+
+    def on_success(self, started: float, changed: bool) -> float:
+        """Record a completed check; returns when the next one is due."""
+        self._failures = 0
+        if changed:
+            # The change happened some time since the previous check.
+            observed = started if self._last_success is None else (self._last_success + started) / 2
+            self.db.record_billboard_change(observed)
+            self.refresh(started)
+        self._last_success = started
+        return self.next_check_after(started)
+
+    def on_failure(self, started: float) -> float:
+        """Record a failed check; returns when to retry (backoff with jitter, never later than the normal slot)."""
+        self._failures += 1
+        backoff = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+        retry_at = started + self.rng.uniform(backoff / 2, backoff)
+        return min(retry_at, self.next_check_after(started))
+
+    def run(self, check: Callable[[], bool], stop: threading.Event | None = None) -> None:
+        """Run ``check`` (returning whether the billboard changed) on the adaptive schedule until stopped."""
+        stop = stop or threading.Event()
+        self.refresh()
+        while not stop.is_set():
+            started = self.clock()
+            try:
+                changed = check()
+            except Exception:
+                logger.exception("Billboard check failed (%d consecutive failure(s))", self._failures + 1)
+                next_at = self.on_failure(started)
+            else:
+                next_at = self.on_success(started, changed)
+
+            delay = next_at - self.clock()
+            if delay <= 0:
+                logger.warning("Check overran its slot by %.0fs; running the next one now", -delay)
+                continue
+            logger.info("Next check in %.1f minutes", delay / 60)
+            stop.wait(delay)
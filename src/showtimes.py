@@ -0,0 +1,157 @@
+"""
+Incremental ingestion of session times from each movie's ``FilmTheaterPage``.
+
+After a catalog sync, the pages of movies that are new or changed, never
+fetched, or last checked more than ``SHOWTIME_REFRESH`` seconds ago are
+fetched concurrently (``SHOWTIME_CONCURRENCY`` at a time) over the shared
+HTTP session. Requests are conditional on the stored ETag/Last-Modified, and
+sessions are only rewritten when the hash of the extracted sessions changed,
+so a steady-state cycle costs a few 304s and no writes.
+
+As with the billboard sources, the database is only touched on the calling
+thread; the workers just do network and extraction.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+
+from database import Database, FetchState, Showtime, ShowtimePage
+from extractor import extract_sessions
+from fetcher import DEFAULT_HEADERS
+from metrics import histogram
+
+logger = logging.getLogger("illa_notifier.showtimes")
+
+DEFAULT_CONCURRENCY = int(os.environ.get("SHOWTIME_CONCURRENCY", "4"))
+# Sessions are added day by day, so pages are rechecked even when the billboard is unchanged.
+DEFAULT_REFRESH = float(os.environ.get("SHOWTIME_REFRESH", "21600"))
+DEFAULT_TIMEOUT = float(os.environ.get("SHOWTIME_TIMEOUT", "20"))
+# Upper bound on pages fetched per cycle, so a large billboard is caught up over several cycles.
+DEFAULT_MAX_PAGES = int(os.environ.get("SHOWTIME_MAX_PAGES", "200"))
+
+FETCH_SECONDS = histogram(
+    "illa_showtime_fetch_seconds",
+    "Duration of a FilmTheaterPage fetch by outcome (changed, unchanged, not_modified, error).",
+    ["outcome"],
+)
+
+
+@dataclass(frozen=True)
+class PageResult:
+    page: ShowtimePage
+    state: FetchState | None = None
+    # None when the sessions did not change (304 or same hash).
+    showtimes: list[Showtime] | None = None
+    error: str | None = None
+
+
+def parse_showtimes(movie_id: int, sessions: list[dict]) -> list[Showtime]:
+    """Normalise the page's session records for ``movie_id``, ordered by start time, one per session id."""
+    showtimes: dict[int, Showtime] = {}
+    for session in sessions:
+        try:
+            if int(session.get("ID_Espectaculo", movie_id)) != movie_id:
+                continue
+            session_id = int(session["ID_Pase"])
+        except (TypeError, ValueError, KeyError):
+            continue
+        starts_at = str(session.get("HoraCine") or session.get("HoraReal") or "")[:16]
+        if len(starts_at) < 16 or session_id in showtimes:
+            continue
+        showtimes[session_id] = Showtime(
+            session_id, movie_id, starts_at, session.get("NombreSala") or None, session.get("NombreFormato") or None,
+        )
+    return sorted(showtimes.values(), key=lambda s: (s.starts_at, s.session_id))
+
+
+def showtimes_hash(showtimes: list[Showtime]) -> str:
+    rows = [[s.session_id, s.starts_at, s.room, s.format] for s in showtimes]
+    return hashlib.sha256(json.dumps(rows, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def fetch_page(session: requests.Session, page: ShowtimePage, timeout: float = DEFAULT_TIMEOUT) -> PageResult:
+    """Conditionally fetch one FilmTheaterPage. Does not touch the database."""
+    previous = page.state
+    headers = dict(DEFAULT_HEADERS)
+    if previous.etag:
+        headers["If-None-Match"] = previous.etag
+    if previous.last_modified:
+        headers["If-Modified-Since"] = previous.last_modified
+
+    with FETCH_SECONDS.time(outcome="error") as labels:
+        response = session.get(page.url, headers=headers, timeout=timeout)
+        if response.status_code == requests.codes.not_modified:
+            labels["outcome"] = "not_modified"
+            return PageResult(page, previous)
+        response.raise_for_status()
+        if response.encoding is None:
+            response.encoding = "utf-8"
+        showtimes = parse_showtimes(page.movie_id, extract_sessions(response.text))
+        state = FetchState(
+            url=page.url,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            content_hash=showtimes_hash(showtimes),
+        )
+        changed = state.content_hash != previous.content_hash
+        labels["outcome"] = "changed" if changed else "unchanged"
+    return PageResult(page, state, showtimes if changed else None)
+
+
+def _safe_fetch(session: requests.Session, page: ShowtimePage, timeout: float) -> PageResult:
+    try:
+        return fetch_page(session, page, timeout)
+    except Exception as e:
+        return PageResult(page, error=f"{type(e).__name__}: {e}")
+
+
+@dataclass(frozen=True)
+class IngestResult:
+    checked: int = 0
+    updated: int = 0
+    failed: int = 0
+    showtimes: int = 0
+
+
+def ingest_showtimes(
+    db: Database,
+    session: requests.Session,
+    movie_ids: list[int] | tuple[int, ...] = (),
+    concurrency: int = DEFAULT_CONCURRENCY,
+    refresh: float = DEFAULT_REFRESH,
+    max_pages: int = DEFAULT_MAX_PAGES,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> IngestResult:
+    """Fetch the due FilmTheaterPages (plus those of ``movie_ids``) and store their sessions.
+
+    Failed pages keep their previous sessions and are retried next cycle.
+    """
+    started = time.monotonic()
+    now = time.time()
+    pages = db.get_showtime_pages_due(now - refresh, movie_ids, limit=max_pages)
+    if not pages:
+        return IngestResult()
+
+    updated = failed = stored = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(pages))), thread_name_prefix="showtimes") as pool:
+        for result in pool.map(lambda page: _safe_fetch(session, page, timeout), pages):
+            if result.error:
+                failed += 1
+                logger.warning("Showtimes of movie %s (%s) failed: %s", result.page.movie_id, result.page.url, result.error)
+                continue
+            db.save_showtimes(result.page, result.state, result.showtimes, now)
+            if result.showtimes is not None:
+                updated += 1
+                stored += len(result.showtimes)
+
+    logger.info(
+        "Showtimes: checked %d page(s), %d updated (%d sessions), %d failed in %.2fs",
+        len(pages), updated, stored, failed, time.monotonic() - started,
+    )
+    return IngestResult(checked=len(pages), updated=updated, failed=failed, showtimes=stored)
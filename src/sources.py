@@ -0,0 +1,211 @@
+"""
+Billboard sources and the concurrent fetch of all of them.
+
+A source knows how to fetch one cinema's billboard and turn it into
+``Movie`` records. Source kinds register themselves in ``SOURCE_KINDS``; the
+configured sources (``BILLBOARD_SOURCES``) are fetched concurrently over one
+shared HTTP connection pool. Each source has its own deadline, and a source
+that fails or times out is reported without affecting the others, so a cycle
+takes about as long as its slowest source rather than the sum of all of them.
+"""
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from urllib.parse import quote, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import Database, FetchState, Movie
+from extractor import BillboardPayload, extract_billboard_from_response
+from fetcher import BillboardFetcher, FetchResult
+from metrics import counter, histogram
+
+logger = logging.getLogger("illa_notifier.sources")
+
+DEFAULT_SOURCES = os.environ.get("BILLBOARD_SOURCES", "illa=cinemesilla")
+DEFAULT_SOURCE_TIMEOUT = float(os.environ.get("SOURCE_TIMEOUT", "20"))
+
+FETCH_SECONDS = histogram(
+    "illa_source_fetch_seconds",
+    "Duration of a billboard fetch including extraction, by source and outcome (changed, unchanged, error).",
+    ["source", "outcome"],
+)
+EXTRACT_SECONDS = histogram(
+    "illa_source_extract_seconds",
+    "Time spent extracting the billboard from a response, including reading the streamed body.",
+    ["source"],
+)
+SOURCE_FAILURES = counter(
+    "illa_source_failures_total", "Sources that failed or timed out in a cycle.", ["source"],
+)
+
+
+class Source(ABC):
+    """One cinema billboard. Subclasses set ``kind`` and implement ``to_movies``."""
+    kind: str = ""
+    default_url: str = ""
+
+    def __init__(self, name: str, url: str | None = None, timeout: float = DEFAULT_SOURCE_TIMEOUT) -> None:
+        self.name = name
+        self.url = url or self.default_url
+        if not self.url:
+            raise ValueError(f"Source {name!r} of kind {self.kind!r} needs a URL")
+        self.timeout = timeout
+
+    def extract(self, response: requests.Response) -> BillboardPayload:
+        return extract_billboard_from_response(response)
+
+    @abstractmethod
+    def to_movies(self, payload: BillboardPayload) -> list[Movie]:
+        """Turn an extracted billboard into this source's movies."""
+
+    def fetcher(self, db: Database, session: requests.Session) -> BillboardFetcher:
+        return BillboardFetcher(db, self.url, timeout=self.timeout, session=session, extract=self._timed_extract)
+
+    def _timed_extract(self, response: requests.Response) -> BillboardPayload:
+        with EXTRACT_SECONDS.time(source=self.name):
+            return self.extract(response)
+
+
+SOURCE_KINDS: dict[str, type[Source]] = {}
+
+
+def register_source(cls: type[Source]) -> type[Source]:
+    """Class decorator adding a source kind to the registry."""
+    if not cls.kind:
+        raise ValueError(f"{cls.__name__} must define a kind")
+    SOURCE_KINDS[cls.kind] = cls
+    return cls
+
+
+@register_source
+class CinemesIllaSource(Source):
+    """Cinema sites embedding the billboard in a ``<cinemaindexpage>`` component (cinemesilla.com)."""
+    kind = "cinemesilla"
+    default_url = "https://cinemesilla.com/"
+
+    def to_movies(self, payload: BillboardPayload) -> list[Movie]:
+        movies: dict[int, Movie] = {}
+        for movie in payload.movies:
+            movie_id = movie.get('ID_Espectaculo')
+            if movie_id in movies:
+                continue
+            title = str(movie.get('Titulo', 'Unknown')).strip()
+            cinema_id = movie.get('ID_Centro', '')
+            cinema_name = movie.get('CinemaName', '')
+
+            poster_filename = movie.get('Cartel', '')
+            full_poster_url = f"{payload.poster_base_url}{poster_filename}" if poster_filename else None
+
+            # Pattern: /FilmTheaterPage/{id}/{title_encoded}/{cinema_id}/{cinema_name_encoded}
+            ticket_url = urljoin(
+                self.url,
+                f"/FilmTheaterPage/{movie_id}/{quote(title)}/{cinema_id}/{quote(cinema_name)}",
+            )
+            movies[movie_id] = Movie(
+                movie_id,
+                title,
+                movie.get('NombreGenero', 'Unknown'),
+                movie.get('NombreFormato', 'Unknown'),
+                full_poster_url,
+                ticket_url,
+                source=self.name,
+            )
+        return list(movies.values())
+
+
+def parse_sources(spec: str = DEFAULT_SOURCES) -> list[Source]:
+    """Build sources from a comma-separated list of ``[name=]kind[@url]`` entries."""
+    sources: list[Source] = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, rest = entry.partition("=")
+        if not sep:
+            name, rest = "", entry
+        kind, _, url = rest.partition("@")
+        if kind not in SOURCE_KINDS:
+            raise ValueError(f"Unknown source kind {kind!r}; known kinds: {', '.join(sorted(SOURCE_KINDS))}")
+        sources.append(SOURCE_KINDS[kind](name or kind, url or None))
+    names = [source.name for source in sources]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate source names in {spec!r}")
+    return sources
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """A session whose connection pool can serve ``pool_size`` concurrent fetches."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@dataclass(frozen=True)
+class SourceOutcome:
+    source: Source
+    fetcher: BillboardFetcher
+    result: FetchResult | None = None
+    movies: list[Movie] = field(default_factory=list)
+    error: str | None = None
+    elapsed: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return self.result is not None and self.result.changed
+
+
+def _fetch_source(source: Source, fetcher: BillboardFetcher, previous: FetchState) -> SourceOutcome:
+    started = time.monotonic()
+    with FETCH_SECONDS.time(source=source.name, outcome="error") as labels:
+        result = fetcher.fetch_from(previous)
+        movies = source.to_movies(result.payload) if result.changed else []
+        labels["outcome"] = "changed" if result.changed else "unchanged"
+    return SourceOutcome(source, fetcher, result, movies, elapsed=time.monotonic() - started)
+
+
+def fetch_all(sources: list[Source], db: Database, session: requests.Session) -> list[SourceOutcome]:
+    """Fetch every source concurrently; returns one outcome per source, in order.
+
+    A source that raises, or has not finished within its ``timeout``, gets an
+    outcome with ``error`` set. A timed-out fetch is abandoned, not killed:
+    it finishes in the background and its result is dropped.
+
+    Fetch state is read and written on the calling thread only; the worker
+    threads just do network and extraction, so the number of sources is not
+    bounded by the database connection pool.
+    """
+    if not sources:
+        return []
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="source-fetch")
+    fetchers = [source.fetcher(db, session) for source in sources]
+    states = [db.get_fetch_state(fetcher.url) for fetcher in fetchers]
+    futures = [
+        executor.submit(_fetch_source, source, fetcher, previous)
+        for source, fetcher, previous in zip(sources, fetchers, states)
+    ]
+    outcomes = []
+    try:
+        for source, fetcher, previous, future in zip(sources, fetchers, states, futures):
+            try:
+                outcome = future.result(timeout=max(0.0, started + source.timeout - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                outcome = SourceOutcome(source, fetcher, error=f"timed out after {source.timeout:.0f}s")
+            except Exception as e:
+                outcome = SourceOutcome(source, fetcher, error=f"{type(e).__name__}: {e}")
+            if outcome.error:
+                SOURCE_FAILURES.inc(source=source.name)
+                logger.warning("Source %s (%s) failed: %s", source.name, source.url, outcome.error)
+            else:
+                fetcher.refresh_validators(previous, outcome.result)
+            outcomes.append(outcome)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("Fetched %d source(s) in %.2fs", len(sources), time.monotonic() - started)
+    return outcomes
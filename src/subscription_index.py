@@ -0,0 +1,147 @@
+"""
+In-memory inverted index of subscription filters.
+
+Maps ``(filter_type, filter_value)`` to the set of telegram ids subscribed to
+it, so matching a movie is a couple of dict lookups and a set union instead of
+a query over ``subscription_filters`` per movie. Title keywords are matched
+with one Aho-Corasick pass over the title (see ``keyword_matcher``) whose
+hits are then looked up the same way. The index is loaded once per process and
+database file and kept current by the ``Database`` filter methods.
+
+Filters may also be edited by another process (the bot worker under the
+supervisor). Triggers bump ``subscription_version`` on every change to
+``subscription_filters``; the index remembers the version it reflects and
+:meth:`SubscriptionIndex.refresh` reloads it when the stored one differs.
+"""
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+
+from keyword_matcher import KeywordMatcher
+
+# Movie attribute matched by each filter type.
+MATCHED_ATTRIBUTES = {
+    "format_type": "format",
+    "genre": "genre",
+}
+# Filter type whose values are normalised keywords matched against the movie title.
+KEYWORD_FILTER = "keyword"
+
+
+def read_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT version FROM subscription_version").fetchone()[0]
+
+
+class SubscriptionIndex:
+    _registry: dict[str, "SubscriptionIndex"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._postings: dict[tuple[str, str], set[int]] = defaultdict(set)
+        self._keywords = KeywordMatcher()
+        self._lock = threading.Lock()
+        # subscription_version the postings reflect; -1 until loaded.
+        self.version = -1
+
+    @classmethod
+    def for_path(cls, db_path: str, conn: sqlite3.Connection) -> "SubscriptionIndex":
+        """Return the process-wide index for a database file, loading it with ``conn`` on first use."""
+        key = os.path.abspath(db_path)
+        with cls._registry_lock:
+            index = cls._registry.get(key)
+            if index is None:
+                index = cls._registry[key] = cls()
+                index.reload(conn)
+            return index
+
+    @classmethod
+    def loaded_for(cls, db_path: str) -> "SubscriptionIndex | None":
+        """Return the index for a database file only if it has already been loaded."""
+        return cls._registry.get(os.path.abspath(db_path))
+
+    def load(self, rows: Iterable[tuple[int, str, str]], version: int = -1) -> None:
+        postings: dict[tuple[str, str], set[int]] = defaultdict(set)
+        for telegram_id, filter_type, filter_value in rows:
+            postings[(filter_type, filter_value)].add(telegram_id)
+        keywords = KeywordMatcher(value for filter_type, value in postings if filter_type == KEYWORD_FILTER)
+        with self._lock:
+            self._postings = postings
+            self._keywords = keywords
+            self.version = version
+
+    def reload(self, conn: sqlite3.Connection) -> None:
+        # The version is read first: a change committed in between is then
+        # loaded under the older version and only costs another reload.
+        version = read_version(conn)
+        self.load(conn.execute("SELECT telegram_id, filter_type, filter_value FROM subscription_filters"), version)
+
+    def refresh(self, conn: sqlite3.Connection) -> bool:
+        """Reload if the filters were changed by another process (or connection). Returns True if reloaded."""
+        if read_version(conn) == self.version:
+            return False
+        self.reload(conn)
+        return True
+
+    def advance(self, before: int, after: int) -> None:
+        """Record that this process applied the changes taking the version from ``before`` to ``after``.
+
+        Only moves forward from ``before``, so changes made elsewhere in
+        between still trigger a reload.
+        """
+        with self._lock:
+            if self.version == before:
+                self.version = after
+
+    def add(self, telegram_id: int, filter_type: str, values: Iterable[str]) -> None:
+        with self._lock:
+            for value in values:
+                self._postings[(filter_type, value)].add(telegram_id)
+                if filter_type == KEYWORD_FILTER:
+                    self._keywords.add(value)
+
+    def discard(self, telegram_id: int, filter_type: str, values: Iterable[str] | None = None) -> None:
+        """Remove a user from the given values, or from every value of ``filter_type`` if None."""
+        with self._lock:
+            if values is None:
+                keys = [key for key in self._postings if key[0] == filter_type]
+            else:
+                keys = [(filter_type, value) for value in values]
+            for key in keys:
+                users = self._postings.get(key)
+                if users is not None:
+                    users.discard(telegram_id)
+                    if not users:
+                        del self._postings[key]
+                        if filter_type == KEYWORD_FILTER:
+                            self._keywords.remove(key[1])
+
+    def match(self, movie) -> set[int]:
+        """Telegram ids with at least one filter matching the movie's attributes or a keyword in its title."""
+        matched: set[int] = set()
+        with self._lock:
+            for filter_type, attribute in MATCHED_ATTRIBUTES.items():
+                users = self._postings.get((filter_type, getattr(movie, attribute)))
+                if users:
+                    matched |= users
+            if self._keywords and movie.title:
+                for keyword in self._keywords.find(movie.title):
+                    matched |= self._postings.get((KEYWORD_FILTER, keyword), set())
+        return matched
+
+    def match_many(self, movies: Iterable, notified: set[tuple[int, int]] = frozenset()) -> dict[int, list[int]]:
+        """Resolve subscribers for a batch of movies, skipping (telegram_id, movie_id) pairs in ``notified``.
+
+        Returns ``{movie_id: [telegram_id, ...]}`` with ids sorted for stable output.
+        """
+        result: dict[int, list[int]] = {}
+        for movie in movies:
+            users = self.match(movie)
+            if notified:
+                users = {tg_id for tg_id in users if (tg_id, movie.id) not in notified}
+            result[movie.id] = sorted(users)
+        return result
+
+    def __len__(self) -> int:
+        return sum(len(users) for users in self._postings.values())
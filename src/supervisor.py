@@ -0,0 +1,190 @@
+"""
+Supervisor that runs the scraper, the bot and the notification sender as
+separate worker processes.
+
+Each worker is ``python src/main.py <command>`` in its own interpreter, so a
+long parse or a slow send no longer competes with bot callbacks for the GIL,
+and a crash takes down only that worker. The workers share nothing but the
+SQLite database: the scraper enqueues into the outbox, the sender leases from
+it, and filter edits made by the bot reach the scraper's subscription index
+through ``subscription_version``.
+
+A worker that exits is restarted after ``SUPERVISOR_RESTART_DELAY`` seconds,
+doubling up to ``SUPERVISOR_MAX_RESTART_DELAY`` while it keeps crashing; the
+delay resets once it stays up for ``SUPERVISOR_HEALTHY_SECONDS``. On SIGTERM
+or SIGINT every worker gets SIGTERM, finishes what it is doing and exits;
+those still running after ``SUPERVISOR_STOP_TIMEOUT`` seconds are killed.
+SIGUSR1/SIGUSR2 are forwarded to the workers (see ``profiling``).
+
+With ``METRICS_PORT`` set, the supervisor serves its own metrics on that port
+and the workers on the following ones, in the order of ``default_workers``.
+"""
+import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+
+from metrics import DEFAULT_METRICS_PORT, counter
+
+logger = logging.getLogger("illa_notifier.supervisor")
+
+DEFAULT_RESTART_DELAY = float(os.environ.get("SUPERVISOR_RESTART_DELAY", "1"))
+DEFAULT_MAX_RESTART_DELAY = float(os.environ.get("SUPERVISOR_MAX_RESTART_DELAY", "60"))
+DEFAULT_HEALTHY_SECONDS = float(os.environ.get("SUPERVISOR_HEALTHY_SECONDS", "60"))
+# Below Docker's default 10 s stop grace period, so workers are killed here rather than by the runtime.
+DEFAULT_STOP_TIMEOUT = float(os.environ.get("SUPERVISOR_STOP_TIMEOUT", "8"))
+POLL_INTERVAL = 0.5
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# Set in each worker's environment to the supervisor's pid; see watch_supervisor().
+SUPERVISOR_PID_ENV = "ILLA_SUPERVISOR_PID"
+
+WORKER_RESTARTS = counter(
+    "illa_worker_restarts_total", "Worker processes restarted by the supervisor after they exited.", ["worker"],
+)
+
+
+@dataclass(frozen=True)
+class WorkerSpec:
+    name: str
+    argv: tuple[str, ...]
+    # Added to the supervisor's environment.
+    env: dict[str, str] = field(default_factory=dict)
+
+
+def default_workers(metrics_port: int = DEFAULT_METRICS_PORT) -> list[WorkerSpec]:
+    """The scraper (with retention), the outbox sender and the bot."""
+    commands = [("scraper", ("scrape-loop", "--no-send")), ("sender", ("send",)), ("bot", ("bot",))]
+    return [
+        WorkerSpec(
+            name, (sys.executable, MAIN_PATH, *args),
+            {"METRICS_PORT": str(metrics_port + 1 + i if metrics_port else 0)},
+        )
+        for i, (name, args) in enumerate(commands)
+    ]
+
+
+class _Worker:
+    def __init__(self, spec: WorkerSpec, restart_delay: float) -> None:
+        self.spec = spec
+        self.process: subprocess.Popen | None = None
+        self.started_at = 0.0
+        self.delay = restart_delay
+        self.restart_at = 0.0
+
+
+class Supervisor:
+    def __init__(
+        self,
+        specs: Iterable[WorkerSpec],
+        restart_delay: float = DEFAULT_RESTART_DELAY,
+        max_restart_delay: float = DEFAULT_MAX_RESTART_DELAY,
+        healthy_seconds: float = DEFAULT_HEALTHY_SECONDS,
+        stop_timeout: float = DEFAULT_STOP_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.healthy_seconds = healthy_seconds
+        self.stop_timeout = stop_timeout
+        self.clock = clock
+        self.workers = [_Worker(spec, restart_delay) for spec in specs]
+        if len({worker.spec.name for worker in self.workers}) != len(self.workers):
+            raise ValueError("Worker names must be unique")
+
+    def _spawn(self, worker: _Worker) -> None:
+        # A session of its own keeps a Ctrl-C in the terminal from reaching the
+        # workers directly; they are stopped by shutdown(), in order.
+        worker.process = subprocess.Popen(
+            worker.spec.argv,
+            env={**os.environ, **worker.spec.env, SUPERVISOR_PID_ENV: str(os.getpid())},
+            start_new_session=True,
+        )
+        worker.started_at = self.clock()
+        logger.info("Started worker %s (pid %d)", worker.spec.name, worker.process.pid)
+
+    def start(self) -> None:
+        for worker in self.workers:
+            self._spawn(worker)
+
+    def poll_once(self) -> None:
+        """Notice exited workers and restart those whose delay has elapsed."""
+        now = self.clock()
+        for worker in self.workers:
+            if worker.process is None:
+                if now >= worker.restart_at:
+                    WORKER_RESTARTS.inc(worker=worker.spec.name)
+                    self._spawn(worker)
+                continue
+            code = worker.process.poll()
+            if code is None:
+                continue
+            if now - worker.started_at >= self.healthy_seconds:
+                worker.delay = self.restart_delay
+            worker.process = None
+            worker.restart_at = now + worker.delay
+            logger.error(
+                "Worker %s exited with status %d after %.1fs; restarting in %.1fs",
+                worker.spec.name, code, now - worker.started_at, worker.delay,
+            )
+            worker.delay = min(self.max_restart_delay, worker.delay * 2)
+
+    def send_signal(self, signum: int) -> None:
+        for worker in self.workers:
+            if worker.process is not None and worker.process.poll() is None:
+                worker.process.send_signal(signum)
+
+    def shutdown(self) -> None:
+        """SIGTERM every worker, then kill those still running after ``stop_timeout``."""
+        running = [w for w in self.workers if w.process is not None and w.process.poll() is None]
+        for worker in running:
+            worker.process.terminate()
+        deadline = self.clock() + self.stop_timeout
+        for worker in running:
+            try:
+                worker.process.wait(max(0.0, deadline - self.clock()))
+            except subprocess.TimeoutExpired:
+                logger.warning("Worker %s did not stop in %.0fs; killing it", worker.spec.name, self.stop_timeout)
+                worker.process.kill()
+                worker.process.wait()
+        logger.info("All workers stopped")
+
+    def run(self, stop: threading.Event) -> None:
+        """Start the workers and keep them running until ``stop`` is set, then shut them down."""
+        try:
+            self.start()
+            while not stop.wait(POLL_INTERVAL):
+                self.poll_once()
+        finally:
+            self.shutdown()
+
+
+def run_supervisor(stop: threading.Event) -> None:
+    """Entry point for the ``supervise`` command; ``stop`` is set by SIGTERM/SIGINT."""
+    supervisor = Supervisor(default_workers())
+    for signum in (signal.SIGUSR1, signal.SIGUSR2):
+        signal.signal(signum, lambda signum, frame: supervisor.send_signal(signum))
+    supervisor.run(stop)
+
+
+def watch_supervisor(stop: threading.Event, interval: float = 1.0) -> None:
+    """In a worker, set ``stop`` if the supervisor that started it goes away (e.g. it was SIGKILLed).
+
+    Does nothing when not started by a supervisor.
+    """
+    supervisor_pid = os.environ.get(SUPERVISOR_PID_ENV)
+    if not supervisor_pid:
+        return
+
+    def watch() -> None:
+        while not stop.wait(interval):
+            if os.getppid() != int(supervisor_pid):
+                logger.error("Supervisor (pid %s) is gone; stopping", supervisor_pid)
+                stop.set()
+
+    threading.Thread(target=watch, name="supervisor-watch", daemon=True).start()
@@ -0,0 +1,121 @@
+"""
+Integration check for digest delivery: subscribers in digest mode get one
+message per cycle (or per window) listing all their new movies, the others one
+DM per movie. Runs against a local Telegram stub (``benchmarks/telegram_stub.py``).
+Run from the project root:
+    python src/test_digest.py
+
+No network access or real credentials are needed.
+"""
+import os
+import re
+import sys
+import tempfile
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "digest_test.db")
+os.environ["TELEGRAM_PER_CHAT_INTERVAL"] = "0"
+sys.path.insert(0, "src")
+sys.path.insert(0, "benchmarks")
+from database import CHANNEL_DIGEST, Database, Movie, TelegramUser
+from telegram_stub import TelegramStub
+
+USERS = 60
+PER_CYCLE = range(1, 31)   # digest once per scrape cycle
+WINDOWED = range(31, 46)   # digest at most once an hour
+INSTANT = range(46, USERS + 1)
+
+
+def movie(movie_id: int) -> Movie:
+    return Movie(movie_id, f"ESTRENO {movie_id}", "Thriller", "VOSE", None, f"https://example.com/tickets/{movie_id}", "illa")
+
+
+def check_markdown() -> None:
+    """Scraped titles with Markdown characters must render as plain text, never inside an entity."""
+    from messages import DIGEST_TEMPLATE, render_digest
+
+    title = "LOS *OTROS* DE_LA NOCHE"
+    text = render_digest(DIGEST_TEMPLATE, "es", ((title, "Drama", "VOSE", None),)).text_payload["text"]
+    assert "LOS \\*OTROS\\* DE\\_LA NOCHE" in text, text
+    line = next(line for line in text.splitlines() if "OTROS" in line)
+    # Legacy Markdown has no escapes inside entities: the escaped title must sit outside any.
+    assert not re.search(r"(?<!\\)[*_]", line), line
+    unescaped = re.sub(r"\\.", "", text)
+    assert unescaped.count("*") % 2 == 0 and unescaped.count("_") % 2 == 0, text
+    print("Markdown: digest titles with * and _ render escaped, outside bold")
+
+
+def main() -> None:
+    check_markdown()
+    telegram = TelegramStub(latency_ms=1).start()
+    os.environ["TELEGRAM_API_BASE"] = telegram.base_url
+    os.environ["TELEGRAM_TOKEN"] = "123456:STUB"
+
+    from notifier import Notifier
+    from outbox import OutboxWorker
+
+    db = Database()
+    for telegram_id in range(1, USERS + 1):
+        db.upsert_user(TelegramUser(telegram_id, f"user{telegram_id}", None))
+        db.toggle_filter(telegram_id, "genre", "Thriller")
+    for telegram_id in PER_CYCLE:
+        db.set_user_digest(telegram_id, 0)
+    for telegram_id in WINDOWED:
+        db.set_user_digest(telegram_id, 60)
+
+    # A small batch size: digests must still not be split across batches.
+    worker = OutboxWorker(db, Notifier(db), batch_size=7)
+
+    def drain() -> None:
+        while worker.drain_once():
+            pass
+
+    first = [movie(i) for i in range(1, 4)]
+    db.sync_catalog(first)
+    drain()
+    sent = telegram.stats["sendMessage"]
+    assert sent == len(PER_CYCLE) + len(INSTANT) * len(first), dict(telegram.stats)
+    print(f"Cycle 1: {len(first)} new movies, {sent} messages")
+
+    second = [movie(i) for i in range(4, 6)]
+    db.sync_catalog(first + second)
+    before = telegram.stats["sendMessage"]
+    drain()
+    sent = telegram.stats["sendMessage"] - before
+    assert sent == len(PER_CYCLE) + len(INSTANT) * len(second), dict(telegram.stats)
+    print(f"Cycle 2: {len(second)} new movies, {sent} messages")
+
+    with db._get_connection() as conn:
+        windows = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT recipient || ':' || next_attempt_at) FROM outbox "
+            "WHERE channel = ? AND status = 'pending'",
+            (CHANNEL_DIGEST,),
+        ).fetchone()
+        assert windows == (len(WINDOWED) * 5, len(WINDOWED)), windows
+        # Let the hour pass.
+        conn.execute("UPDATE outbox SET next_attempt_at = next_attempt_at - 3600 WHERE status = 'pending'")
+    before = telegram.stats["sendMessage"]
+    drain()
+    sent = telegram.stats["sendMessage"] - before
+    assert sent == len(WINDOWED), dict(telegram.stats)
+    print(f"Window end: {sent} digests of 5 movies")
+
+    # Switching back to instant delivery sends a waiting digest right away.
+    db.sync_catalog(first + second + [movie(6), movie(7)])
+    db.set_user_digest(WINDOWED[0], None)
+    before = telegram.stats["sendMessage"]
+    drain()
+    assert telegram.stats["sendMessage"] - before == len(PER_CYCLE) + 1 + len(INSTANT) * 2, dict(telegram.stats)
+
+    with db._get_connection() as conn:
+        logged = conn.execute("SELECT COUNT(*) FROM notification_log").fetchone()[0]
+        statuses = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    expected = (len(PER_CYCLE) + len(INSTANT)) * 7 + len(WINDOWED) * 5 + 2
+    assert logged == expected, (logged, expected)
+    print(f"Outbox: {statuses}; Telegram stub: {dict(telegram.stats)}")
+
+    telegram.stop()
+    print("✅ Digest subscribers got one message per cycle or window, the others one per movie.")
+
+
+if __name__ == "__main__":
+    main()
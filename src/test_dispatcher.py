@@ -0,0 +1,63 @@
+"""
+Integration check for TelegramDispatcher rate limiting: the per-chat interval
+and the global rate must hold across consecutive ``dispatch()`` calls, not just
+within one batch. Runs against a local Telegram stub (``benchmarks/telegram_stub.py``).
+Run from the project root:
+    python src/test_dispatcher.py
+
+No network access or real credentials are needed.
+"""
+import sys
+import time
+
+sys.path.insert(0, "src")
+sys.path.insert(0, "benchmarks")
+from dispatcher import SendRequest, TelegramDispatcher
+from telegram_stub import TelegramStub
+
+PER_CHAT_INTERVAL = 0.5
+GLOBAL_RATE = 10
+# Slack for sleeps that wake a little early and for request latency differences.
+TOLERANCE = 0.05
+
+
+def message(chat_id: int, text: str) -> SendRequest:
+    return SendRequest(chat_id, "sendMessage", {"chat_id": chat_id, "text": text})
+
+
+def main() -> None:
+    telegram = TelegramStub(latency_ms=1, jitter_ms=0).start()
+    dispatcher = TelegramDispatcher(
+        telegram.api_url(), global_rate=GLOBAL_RATE, per_chat_interval=PER_CHAT_INTERVAL,
+    )
+
+    # Warm up: the first request of the process pays for httpx's one-time setup.
+    dispatcher.dispatch([message(0, "warm-up")])
+
+    # Two calls to the same chat, as Notifier.send_dms makes for one movie.
+    for text in ("first", "second"):
+        results = dispatcher.dispatch([message(1, text)])
+        assert all(result.ok for result in results), results
+    first, second = telegram.chat_times["1"]
+    gap = second - first
+    assert gap >= PER_CHAT_INTERVAL - TOLERANCE, f"same chat messaged {gap:.3f}s apart"
+    print(f"Per-chat: consecutive dispatch() calls {gap:.3f}s apart (interval {PER_CHAT_INTERVAL}s)")
+
+    # Two full bursts to distinct chats: the second one must wait for the bucket to refill.
+    time.sleep(1.0)
+    started = time.monotonic()
+    for batch in range(2):
+        chats = range(100 + batch * GLOBAL_RATE, 100 + (batch + 1) * GLOBAL_RATE)
+        results = dispatcher.dispatch([message(chat_id, "burst") for chat_id in chats])
+        assert all(result.ok for result in results), results
+    elapsed = time.monotonic() - started
+    # The bucket starts full, so the second burst needs a full second of refill.
+    assert elapsed >= 1.0 - TOLERANCE, f"{2 * GLOBAL_RATE} messages sent in {elapsed:.3f}s"
+    print(f"Global: {2 * GLOBAL_RATE} messages over two dispatch() calls took {elapsed:.3f}s (rate {GLOBAL_RATE}/s)")
+
+    telegram.stop()
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Integration check for the email channel: queues a new movie for subscribers
+with email addresses and drains the outbox against a local SMTP stand-in and
+a local Telegram stub (``benchmarks/smtp_stub.py``, ``benchmarks/telegram_stub.py``).
+Run from the project root:
+    python src/test_email.py
+
+No network access or real credentials are needed.
+"""
+import email
+import os
+import sys
+import tempfile
+from email.policy import default as default_policy
+
+os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(), "email_test.db")
+sys.path.insert(0, "src")
+sys.path.insert(0, "benchmarks")
+from database import CHANNEL_EMAIL, EMAIL_MAX_FAILURES, Database, Movie, TelegramUser
+from emailer import EmailNotifier, SMTPConfig
+from smtp_stub import SMTPStub
+from telegram_stub import TelegramStub
+
+USERS = 120
+MOVIE = Movie(13030, "GREENLAND 2", "Thriller", "CASTELLÀ", None, "https://cinemesilla.com/FilmTheaterPage/13030", "illa")
+
+
+def address(telegram_id: int) -> str:
+    # The stand-in refuses "bounce*" with 550 and defers "defer*" with 451.
+    if telegram_id % 40 == 0:
+        return f"bounce{telegram_id}@example.com"
+    if telegram_id % 60 == 1:
+        return f"defer{telegram_id}@example.com"
+    return f"user{telegram_id}@example.com"
+
+
+def main() -> None:
+    smtp = SMTPStub(latency_ms=5).start()
+    telegram = TelegramStub(latency_ms=1).start()
+    os.environ["TELEGRAM_API_BASE"] = telegram.base_url
+    os.environ["TELEGRAM_TOKEN"] = "123456:STUB"
+
+    from notifier import Notifier
+    from outbox import OutboxWorker
+
+    db = Database()
+    for telegram_id in range(1, USERS + 1):
+        db.upsert_user(TelegramUser(telegram_id, f"user{telegram_id}", None))
+        db.toggle_filter(telegram_id, "genre", "Thriller")
+        # One in three subscribers also wants email.
+        if telegram_id % 3 != 2:
+            db.set_user_email(telegram_id, address(telegram_id))
+
+    sync = db.sync_catalog([MOVIE], email=True)
+    with db._get_connection() as conn:
+        queued = conn.execute("SELECT COUNT(*) FROM outbox WHERE channel = ?", (CHANNEL_EMAIL,)).fetchone()[0]
+    with_email = len(db.get_user_emails(range(1, USERS + 1)))
+    assert queued == with_email, (queued, with_email)
+    print(f"Queued {sync.enqueued} notifications, {queued} of them emails")
+
+    config = SMTPConfig(host=smtp.address[0], port=smtp.address[1], sender="alertas@example.com",
+                        security="none", pool_size=2, batch_size=25, rate=0)
+    emailer = EmailNotifier(config)
+    worker = OutboxWorker(db, Notifier(db), emailer)
+    while worker.drain_once():
+        pass
+
+    with db._get_connection() as conn:
+        statuses = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM outbox WHERE channel = ? GROUP BY status", (CHANNEL_EMAIL,),
+        ).fetchall())
+        failures = dict(conn.execute("SELECT telegram_id, email_failures FROM users WHERE email_failures > 0"))
+        logged = conn.execute("SELECT COUNT(*) FROM notification_log WHERE movie_id = ?", (MOVIE.id,)).fetchone()[0]
+    bounced = {tg for tg in range(1, USERS + 1) if tg % 3 != 2 and address(tg).startswith("bounce")}
+    deferred = {tg for tg in range(1, USERS + 1) if tg % 3 != 2 and address(tg).startswith("defer")}
+    print(f"Email outbox: {statuses}; SMTP stand-in: {dict(smtp.stats)}")
+
+    assert statuses.get("sent") == with_email - len(bounced) - len(deferred), statuses
+    assert statuses.get("dead") == len(bounced), statuses
+    assert statuses.get("pending") == len(deferred), statuses
+    assert set(failures) == bounced and all(count == 1 for count in failures.values()), failures
+    assert set(smtp.delivered) == {address(tg) for tg in range(1, USERS + 1) if tg % 3 != 2} - {
+        address(tg) for tg in bounced | deferred
+    }
+    assert smtp.stats["sessions"] <= config.pool_size, smtp.stats
+    assert logged == USERS, logged
+
+    message = email.message_from_bytes(smtp.messages[0], policy=default_policy)
+    assert MOVIE.title in message["Subject"], message["Subject"]
+    assert MOVIE.ticket_url in message.get_body(("plain",)).get_content()
+
+    # An address given in the bot gets alerts only once the emailed code comes back.
+    code = db.start_email_verification(2, "nuevo2@example.com")
+    assert code is not None and db.start_email_verification(2, "otro2@example.com") is None
+    assert emailer.send_confirmation(2, "nuevo2@example.com", code).ok
+    confirmation = email.message_from_bytes(smtp.messages[-1], policy=default_policy)
+    assert code in confirmation.get_body(("plain",)).get_content()
+    assert db.confirm_email(2, f"{(int(code) + 1) % 10 ** 6:06d}") is None
+
+    def queued_emails(movie_id: int) -> set[int]:
+        with db._get_connection() as conn:
+            return {int(row[0]) for row in conn.execute(
+                "SELECT recipient FROM outbox WHERE channel = ? AND movie_id = ?", (CHANNEL_EMAIL, movie_id),
+            )}
+
+    others = [Movie(movie_id, f"OTRA {movie_id}", "Thriller", "VOSE", None, None, "illa") for movie_id in (13031, 13032)]
+
+    # Bounced addresses stop getting email once they reach the limit.
+    for telegram_id in bounced:
+        for _ in range(EMAIL_MAX_FAILURES - 1):
+            db.record_email_results([], [telegram_id])
+    db.sync_catalog([MOVIE, others[0]], email=True)
+    recipients = queued_emails(13031)
+    assert recipients and not recipients & bounced, recipients & bounced
+    assert 2 not in recipients, "an unconfirmed address was queued"
+
+    assert db.confirm_email(2, code) == "nuevo2@example.com"
+    db.sync_catalog([MOVIE, *others], email=True)
+    assert 2 in queued_emails(13032)
+
+    emailer.close()
+    smtp.stop()
+    telegram.stop()
+    print("✅ Email channel delivered, reported per-recipient failures, skipped dead and unconfirmed addresses.")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,14 @@ Sends a single test Telegram notification with a hardcoded movie.
 Run from the project root:
     python src/test_notification.py
 """
-import html
-import json
 import sys
 from urllib.parse import quote
 
 import requests
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 
 sys.path.insert(0, "src")
+from extractor import extract_billboard_from_response
 from notifier import Notifier
 
 
@@ -35,13 +33,9 @@ BASE_URL = "https://cinemesilla.com/"
 def fetch_poster_base_url() -> str:
     """Fetches the poster base URL from the live website, same as main.py."""
     headers = {"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"}
-    response = requests.get(BASE_URL, headers=headers, timeout=20)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.text, "html.parser")
-    vue_component = soup.find("cinemaindexpage")
-    if not vue_component:
-        raise RuntimeError("Could not find <cinemaindexpage> component — website structure may have changed.")
-    return json.loads(html.unescape(vue_component.get(":postersurl", '""')))
+    with requests.get(BASE_URL, headers=headers, timeout=20, stream=True) as response:
+        response.raise_for_status()
+        return extract_billboard_from_response(response).poster_base_url
 
 
 def main() -> None:
@@ -0,0 +1,113 @@
+"""
+Integration check for webhook mode: posts recorded Telegram updates to a local
+webhook server and verifies they reach the bot's update queue.
+Run from the project root:
+    python src/test_webhook.py
+
+No network access or real token is needed; Telegram is never contacted.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import httpx
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(), "webhook_test.db"))
+sys.path.insert(0, "src")
+import bot
+from bot import BotConfig
+
+SECRET = "local-test-secret"
+
+# Update payloads as Telegram delivers them (ids and names anonymised).
+RECORDED_UPDATES = [
+    {
+        "update_id": 912345001,
+        "message": {
+            "message_id": 101,
+            "from": {"id": 555000111, "is_bot": False, "first_name": "Marta", "language_code": "es"},
+            "chat": {"id": 555000111, "first_name": "Marta", "type": "private"},
+            "date": 1760000000,
+            "text": "/start",
+            "entities": [{"offset": 0, "length": 6, "type": "bot_command"}],
+        },
+    },
+    {
+        "update_id": 912345002,
+        "callback_query": {
+            "id": "2385790123456789001",
+            "from": {"id": 555000111, "is_bot": False, "first_name": "Marta", "language_code": "es"},
+            "message": {
+                "message_id": 102,
+                "from": {"id": 123456, "is_bot": True, "first_name": "Illa Notifier", "username": "illa_bot"},
+                "chat": {"id": 555000111, "first_name": "Marta", "type": "private"},
+                "date": 1760000005,
+                "text": "Configura tus alertas",
+            },
+            "chat_instance": "-7301234567890123456",
+            "data": "sub:genre:Thriller",
+        },
+    },
+]
+
+
+def check(condition: bool, message: str) -> None:
+    print(f"{'✅' if condition else '❌'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+async def run() -> None:
+    config = BotConfig(
+        token="123456:TEST-TOKEN",
+        mode="webhook",
+        webhook_url="https://example.invalid/telegram/hook",
+        webhook_secret=SECRET,
+        webhook_listen="127.0.0.1",
+        webhook_port=0,
+    )
+    app = bot.build_application(config)
+    server = bot.build_webhook_server(app, config)
+    await server.start()
+    base = f"http://127.0.0.1:{server.port}"
+    url = f"{base}{config.webhook_path}"
+
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(f"{base}/healthz")
+            check(response.status_code == 200, "health endpoint answers 200")
+
+            response = await client.post(url, json=RECORDED_UPDATES[0])
+            check(response.status_code == 403, "update without secret token is rejected")
+            response = await client.post(
+                url, json=RECORDED_UPDATES[0], headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+            )
+            check(response.status_code == 403, "update with wrong secret token is rejected")
+            check(app.update_queue.empty(), "rejected updates never reach the bot")
+
+            headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+            response = await client.post(url, content=b"{not json", headers=headers)
+            check(response.status_code == 400, "malformed body answers 400")
+            response = await client.post(f"{base}/other", json=RECORDED_UPDATES[0], headers=headers)
+            check(response.status_code == 404, "unknown path answers 404")
+
+            for payload in RECORDED_UPDATES:
+                response = await client.post(
+                    url, content=json.dumps(payload).encode(), headers={**headers, "Content-Type": "application/json"},
+                )
+                check(response.status_code == 200, f"update {payload['update_id']} accepted")
+
+        start = await app.update_queue.get()
+        check(start.update_id == 912345001 and start.message.text == "/start", "/start message decoded into an Update")
+        check(start.effective_user.id == 555000111, "effective user resolved")
+        tap = await app.update_queue.get()
+        check(tap.callback_query.data == "sub:genre:Thriller", "callback query decoded into an Update")
+        check(app.update_queue.empty(), "each update queued exactly once")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
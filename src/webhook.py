@@ -0,0 +1,146 @@
+"""
+Minimal HTTP server for receiving Telegram updates by webhook.
+
+Telegram POSTs every update as JSON to the URL registered with ``setWebhook``
+and includes the secret we chose in the ``X-Telegram-Bot-Api-Secret-Token``
+header. The server checks that header, hands the decoded update to a callback
+and answers right away. ``GET /healthz`` answers 200 for liveness probes.
+
+Only the subset of HTTP/1.1 that Telegram and a reverse proxy use is
+implemented: Content-Length bodies and keep-alive connections.
+"""
+import asyncio
+import hmac
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from http import HTTPStatus
+
+logger = logging.getLogger("illa_notifier.webhook")
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+HEALTH_PATH = "/healthz"
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Idle keep-alive connections are closed after this many seconds.
+IDLE_TIMEOUT = 75
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        on_update: Callable[[dict], Awaitable[None]],
+        secret_token: str,
+        path: str = "/telegram",
+        host: str = "0.0.0.0",
+        port: int = 8443,
+    ) -> None:
+        if not secret_token:
+            raise ValueError("A webhook secret token is required")
+        self.on_update = on_update
+        self.secret_token = secret_token.encode()
+        self.path = path
+        self.host = host
+        self.port = port
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        """Start listening. With ``port=0`` the bound port is written back to ``self.port``."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Webhook server listening on %s:%d%s", self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), IDLE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, keep_alive=False)
+                    return
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, keep_alive=False)
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                body = b""
+                if "content-length" in headers:
+                    try:
+                        length = int(headers["content-length"])
+                    except ValueError:
+                        await self._respond(writer, HTTPStatus.BAD_REQUEST, keep_alive=False)
+                        return
+                    if length > MAX_BODY_BYTES:
+                        await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, keep_alive=False)
+                        return
+                    body = await reader.readexactly(length)
+                elif "transfer-encoding" in headers:
+                    await self._respond(writer, HTTPStatus.LENGTH_REQUIRED, keep_alive=False)
+                    return
+
+                status = await self._dispatch(method, target.split("?", 1)[0], headers, body)
+                await self._respond(writer, status, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, headers: dict, body: bytes) -> HTTPStatus:
+        if path == HEALTH_PATH:
+            return HTTPStatus.OK if method == "GET" else HTTPStatus.METHOD_NOT_ALLOWED
+        if path != self.path:
+            return HTTPStatus.NOT_FOUND
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode(), self.secret_token):
+            logger.warning("Rejected webhook request with a missing or wrong secret token")
+            return HTTPStatus.FORBIDDEN
+        try:
+            update = json.loads(body)
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST
+        if not isinstance(update, dict):
+            return HTTPStatus.BAD_REQUEST
+        try:
+            await self.on_update(update)
+        except Exception:
+            # A non-2xx answer makes Telegram redeliver the update later.
+            logger.exception("Failed to accept webhook update %s", update.get("update_id"))
+            return HTTPStatus.INTERNAL_SERVER_ERROR
+        return HTTPStatus.OK
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: HTTPStatus, keep_alive: bool) -> None:
+        body = json.dumps({"ok": status == HTTPStatus.OK, "status": status.phrase}).encode()
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass